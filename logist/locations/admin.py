@@ -1,47 +1,310 @@
-from django.contrib import admin
+import io
+from django import forms
+from django.contrib import admin, messages
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.contrib.admin.views.main import ORDER_VAR, SEARCH_VAR
+from django.db.models import Case, Count, IntegerField, When
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
 from .models import Country, Region, Location, Group, Company, Site, DefaultHours, SiteException, PublicHoliday
+from .services.calendar_import import CalendarImportError, import_calendar, sniff_format
+from .services.onboarding import ensure_default_hours
+from .services.search import search_index
+
+# Relations each model's __str__ follows, fetched along with it in
+# changelists, filters and FK dropdowns to avoid one query per row
+STR_RELATED = {
+    Region: ("country",),
+    Location: ("region__country",),
+}
+
+
+class SelectRelatedFieldListFilter(admin.RelatedFieldListFilter):
+    """
+    RelatedFieldListFilter whose choices are fetched in one query, together
+    with the relations the related model's __str__ follows.
+    """
+    def field_choices(self, field, request, model_admin):
+        related_model = field.related_model
+        queryset = related_model._default_manager.select_related(*STR_RELATED.get(related_model, ()))
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return [(obj.pk, str(obj)) for obj in queryset]
+
+
+class CachedCountFieldListFilter(SelectRelatedFieldListFilter):
+    """
+    Related filter showing how many rows each choice matches, e.g.
+    "Germany (1234)". The counts come from one GROUP BY query and are cached
+    for FACET_TIMEOUT seconds, so they may briefly lag behind edits.
+    """
+    FACET_TIMEOUT = 300
+
+    def field_choices(self, field, request, model_admin):
+        key = f"locations:facets:{model_admin.model._meta.label_lower}:{self.field_path}"
+        counts = cache.get(key)
+        if counts is None:
+            counts = dict(
+                model_admin.model._default_manager.order_by()
+                .values_list(self.field_path).annotate(count=Count("pk"))
+            )
+            cache.set(key, counts, self.FACET_TIMEOUT)
+        return [
+            (pk, f"{label} ({counts.get(pk, 0)})")
+            for pk, label in super().field_choices(field, request, model_admin)
+        ]
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """
+    Filter on a foreign key rendered as a single autocomplete box that
+    queries the admin's autocomplete view, instead of listing every related
+    row in the sidebar. The related model's admin needs search_fields.
+    """
+    template = "admin/locations/autocomplete_filter.html"
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f"{field_path}__{field.target_field.name}__exact"
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.lookup_val = self.used_parameters.get(self.lookup_kwarg)
+        # The autocomplete view is addressed through the model owning the FK
+        self.source = field.model._meta
+        self.field_name = field.name
+        self.selected = None
+        if self.lookup_val and str(self.lookup_val).isdigit():
+            related_model = field.related_model
+            self.selected = (
+                related_model._default_manager.select_related(*STR_RELATED.get(related_model, ()))
+                .filter(pk=self.lookup_val).first()
+            )
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield {
+            "selected": self.selected is not None,
+            "query_string": changelist.get_query_string(remove=[self.lookup_kwarg]),
+            "display": str(self.selected) if self.selected is not None else "",
+        }
+
+
+class SelectRelatedAdminMixin:
+    """
+    Rows, FK dropdowns and autocomplete results select the relations their
+    __str__ follows (see STR_RELATED).
+    """
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        related = STR_RELATED.get(self.model)
+        return queryset.select_related(*related) if related else queryset
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        related = STR_RELATED.get(db_field.related_model)
+        if related and "queryset" not in kwargs:
+            kwargs["queryset"] = db_field.related_model._default_manager.select_related(*related)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class IndexedSearchAdminMixin:
+    """
+    Changelist search and autocomplete through the in-memory search index
+    (services/search.py) instead of LIKE scans: ranked, typo-tolerant and
+    blind to umlaut spellings. search_fields only enables the search box
+    and autocomplete; at most SEARCH_LIMIT best matches are returned, best
+    first unless the changelist is sorted by a column.
+    """
+    search_kind = None
+    SEARCH_LIMIT = 1000
+
+    def _ranked_ids(self, request, search_term):
+        # the changelist asks for the ordering separately; search only once
+        search_term = search_term.strip()
+        cached = getattr(request, "_search_ranking", None)
+        if cached is None or cached[0] != search_term:
+            cached = (search_term, search_index.search_ids(search_term, self.search_kind, limit=self.SEARCH_LIMIT))
+            if request is not None:
+                request._search_ranking = cached
+        return cached[1]
+
+    @staticmethod
+    def _rank(pks):
+        return Case(*[When(pk=pk, then=position) for position, pk in enumerate(pks)], output_field=IntegerField())
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        pks = self._ranked_ids(request, search_term)
+        queryset = queryset.filter(pk__in=pks)
+        return (queryset.order_by(self._rank(pks)) if pks else queryset), False
+
+    def get_ordering(self, request):
+        search_term = request.GET.get(SEARCH_VAR, "").strip()
+        if search_term and ORDER_VAR not in request.GET:
+            pks = self._ranked_ids(request, search_term)
+            if pks:
+                return [self._rank(pks)]
+        return super().get_ordering(request)
+
+
+class PrefixSearchAdminMixin:
+    """
+    Changelist search and autocomplete by name prefix as a range on the
+    indexed, lower-cased prefix_field, so the database seeks instead of
+    scanning (SQLite's LIKE, being case-insensitive, cannot use a plain
+    index). search_fields only enables the search box and autocomplete.
+    """
+    prefix_field = None
+
+    def get_search_results(self, request, queryset, search_term):
+        prefix = self.model.key_for(search_term.strip())
+        if not prefix:
+            return queryset, False
+        return queryset.filter(**{
+            f"{self.prefix_field}__gte": prefix, f"{self.prefix_field}__lt": prefix + "\U0010ffff",
+        }), False
+
+
+class CalendarImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV or ICS; see the import_calendar command for the CSV columns.")
+
+    def target(self):
+        return {}
+
+
+class ExceptionImportForm(CalendarImportForm):
+    site = forms.IntegerField(required=False, label="Site id", help_text="For rows naming no site, e.g. ICS events.")
+
+    def target(self):
+        return {"site": self.cleaned_data["site"]}
+
+
+class HolidayImportForm(CalendarImportForm):
+    country = forms.ModelChoiceField(
+        Country.objects.all(), required=False, help_text="For rows naming no country, e.g. ICS events.",
+    )
+    region = forms.CharField(required=False, help_text="Region name for ICS events (default: country-wide).")
+
+    def target(self):
+        return {"country": self.cleaned_data["country"], "region": self.cleaned_data["region"] or None}
+
+
+class CalendarImportAdminMixin:
+    """
+    An "Import CSV/ICS" page on the changelist, loading a whole calendar
+    file in one transaction (services/calendar_import.py).
+    """
+    import_kind = None
+    import_form = CalendarImportForm
+    change_list_template = "admin/locations/change_list_import.html"
+
+    def get_urls(self):
+        opts = self.model._meta
+        return [
+            path(
+                "import/", self.admin_site.admin_view(self.import_view),
+                name=f"{opts.app_label}_{opts.model_name}_import",
+            ),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = self.import_form(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            upload = form.cleaned_data["file"]
+            f = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+            file_format = sniff_format(upload.name, f.readline())
+            f.seek(0)
+            try:
+                report = import_calendar(f, self.import_kind, file_format=file_format, **form.target())
+            except CalendarImportError as e:
+                for error in e.errors:
+                    form.add_error(None, error)
+            else:
+                self.message_user(
+                    request, f"Imported {report.written} rows from {report.rows} in {upload.name}.", messages.SUCCESS,
+                )
+                opts = self.model._meta
+                return redirect(reverse(f"admin:{opts.app_label}_{opts.model_name}_changelist"))
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "form": form,
+            "title": f"Import {self.model._meta.verbose_name_plural}",
+        }
+        return TemplateResponse(request, "admin/locations/calendar_import.html", context)
+
+
+class AutocompleteFilterMedia:
+    js = (
+        "admin/js/vendor/jquery/jquery.js",
+        "admin/js/vendor/select2/select2.full.js",
+        "admin/js/jquery.init.js",
+        "admin/js/autocomplete.js",
+        "locations/autocomplete_filter.js",
+    )
+    css = {"screen": ("admin/css/vendor/select2/select2.css", "admin/css/autocomplete.css")}
+
 
 # -----------------------
 # Country admin
 # -----------------------
 @admin.register(Country)
 class CountryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'code', 'emoji_flag')
+    list_display = ('name', 'code', 'emoji_flag', 'time_zone')
     search_fields = ('name', 'code')
 
 # -----------------------
 # Region admin
 # -----------------------
 @admin.register(Region)
-class RegionAdmin(admin.ModelAdmin):
+class RegionAdmin(PrefixSearchAdminMixin, SelectRelatedAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'country')
-    list_filter = ('country',)
+    list_filter = (('country', CachedCountFieldListFilter),)
+    list_select_related = ('country',)
     search_fields = ('name',)
+    prefix_field = 'name_key'
+    autocomplete_fields = ('country',)
 
 # -----------------------
 # Location admin
 # -----------------------
 @admin.register(Location)
-class LocationAdmin(admin.ModelAdmin):
+class LocationAdmin(IndexedSearchAdminMixin, SelectRelatedAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'region')
-    list_filter = ('region',)
+    list_filter = (('region', AutocompleteFilter),)
+    list_select_related = ('region__country',)
     search_fields = ('name',)
+    search_kind = 'location'
+    autocomplete_fields = ('region',)
+    Media = AutocompleteFilterMedia
 
 # -----------------------
 # Group admin
 # -----------------------
 @admin.register(Group)
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(IndexedSearchAdminMixin, admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name',)
+    search_kind = 'group'
 
 # -----------------------
 # Company admin
 # -----------------------
 @admin.register(Company)
-class CompanyAdmin(admin.ModelAdmin):
-    list_display = ('name',)
+class CompanyAdmin(IndexedSearchAdminMixin, admin.ModelAdmin):
+    list_display = ('name', 'group')
+    list_select_related = ('group',)
     search_fields = ('name',)
+    search_kind = 'company'
+    autocomplete_fields = ('group',)
 
 # -----------------------
 # DefaultHours inline
@@ -54,25 +317,25 @@ class DefaultHoursInline(admin.TabularInline):
     max_num = 7
 """
 class DefaultHoursInline(admin.TabularInline):
+    """
+    The site's 7 weekday rows. Rows are created with the site (see signals);
+    missing ones are added when the site is saved, never while displaying,
+    so the inline only edits existing rows and offers no "Add another".
+    """
     model = DefaultHours
-    extra = 0  # we'll pre-fill weekdays manually
-    min_num = 7
+    extra = 0
     max_num = 7
+    can_delete = False
     fields = ('weekday', 'open_time', 'close_time', 'is_closed')
     readonly_fields = ('weekday',)  # prevent changing weekday manually if desired
 
+    def has_add_permission(self, request, obj=None):
+        # an added row would have no weekday (it is read-only)
+        return False
+
     def get_queryset(self, request):
-        """
-        Pre-populate all 7 weekdays if they don't exist yet.
-        """
-        qs = super().get_queryset(request)
-        site = getattr(self.parent_model, 'instance', None)
-        if site:
-            existing_days = qs.values_list('weekday', flat=True)
-            for day_index, day_name in WEEKDAYS:
-                if day_index not in existing_days:
-                    DefaultHours.objects.create(site=site, weekday=day_index, is_closed=False)
-        return qs
+        return super().get_queryset(request).select_related('site').order_by('weekday')
+
 # -----------------------
 # SiteException inline
 # -----------------------
@@ -80,21 +343,55 @@ class SiteExceptionInline(admin.TabularInline):
     model = SiteException
     extra = 1
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('site')
+
+# -----------------------
+# SiteException admin
+# -----------------------
+@admin.register(SiteException)
+class SiteExceptionAdmin(CalendarImportAdminMixin, admin.ModelAdmin):
+    list_display = ('site', 'date', 'open_time', 'close_time', 'reason')
+    list_filter = (('site', AutocompleteFilter), 'date')
+    list_select_related = ('site__company', 'site__location')
+    autocomplete_fields = ('site',)
+    import_kind = 'exceptions'
+    import_form = ExceptionImportForm
+    Media = AutocompleteFilterMedia
+
 # -----------------------
 # Site admin
 # -----------------------
 @admin.register(Site)
-class SiteAdmin(admin.ModelAdmin):
+class SiteAdmin(IndexedSearchAdminMixin, SelectRelatedAdminMixin, admin.ModelAdmin):
     list_display = ('company', 'location', 'name', 'address', 'zip_code')
-    list_filter = ('company', 'location__region__country', 'location__region', 'location')
+    list_filter = (
+        ('company', AutocompleteFilter),
+        ('location__region__country', CachedCountFieldListFilter),
+        ('location__region', AutocompleteFilter),
+        ('location', AutocompleteFilter),
+    )
+    list_select_related = ('company', 'location__region__country')
     search_fields = ('name', 'address', 'zip_code')
+    search_kind = 'site'
+    autocomplete_fields = ('company', 'location')
     inlines = [DefaultHoursInline, SiteExceptionInline]
+    Media = AutocompleteFilterMedia
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        ensure_default_hours(form.instance)
 
 # -----------------------
 # PublicHoliday admin
 # -----------------------
 @admin.register(PublicHoliday)
-class PublicHolidayAdmin(admin.ModelAdmin):
+class PublicHolidayAdmin(CalendarImportAdminMixin, SelectRelatedAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'date', 'country', 'region')
-    list_filter = ('country', 'region', 'date')
-    search_fields = ('name',)
\ No newline at end of file
+    list_filter = (('country', CachedCountFieldListFilter), ('region', AutocompleteFilter), 'date')
+    list_select_related = ('country', 'region__country')
+    search_fields = ('name',)
+    autocomplete_fields = ('country', 'region')
+    import_kind = 'holidays'
+    import_form = HolidayImportForm
+    Media = AutocompleteFilterMedia
\ No newline at end of file
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from locations.services.schedule import store_hours
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored opening hours (Site.hours_summary / hours_data) of all sites from DefaultHours."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Sites per DefaultHours query and bulk_update (default 1000).",
+        )
+
+    def handle(self, *args, **options):
+        updated = store_hours(batch_size=options["batch_size"])
+        self.stdout.write(f"Stored hours of {updated} sites.")
@@ -0,0 +1,100 @@
+import json
+from pathlib import Path
+from time import perf_counter
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from locations.services.benchmark import CACHES, compare, report_header, reset_caches, run_benchmarks
+from locations.services.synthetic import generate_catalogue
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the hot paths (hours resolution, export, admin changelists, API) "
+        "on synthetic catalogues of the given sizes, in a throwaway test database. "
+        "Writes wall times and query counts as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", default="1000,10000,100000",
+            help="Comma-separated catalogue sizes in sites (default 1000,10000,100000).",
+        )
+        parser.add_argument(
+            "-o", "--output",
+            help="JSON file to write (default: data/benchmarks/<commit or timestamp>.json).",
+        )
+        parser.add_argument("--baseline", help="Previous JSON report; regressions against it are listed.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--in-place", action="store_true",
+            help="Use the configured database instead of a test database (every run is rolled back).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",") if size.strip()]
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers.")
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"], encoding="utf-8") as f:
+                baseline = json.load(f)
+
+        try:
+            # test client host, in-memory email, fast password hashing
+            setup_test_environment()
+            own_environment = True
+        except RuntimeError:  # already set up, e.g. under the test runner
+            own_environment = False
+        old_config = None if options["in_place"] else setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(CACHES=CACHES):
+                report = self.run(sizes, options["seed"])
+        finally:
+            if old_config is not None:
+                teardown_databases(old_config, verbosity=0)
+            if own_environment:
+                teardown_test_environment()
+
+        output = options["output"]
+        if output is None:
+            name = report["commit"] or report["created_at"].replace(":", "-")
+            output = settings.BASE_DIR.parent / "data" / "benchmarks" / f"{name}.json"
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        self.stdout.write(f"Benchmark report written to {output}")
+
+        if baseline is not None:
+            regressions = compare(report, baseline)
+            for line in regressions:
+                self.stdout.write(self.style.WARNING(f"Regression: {line}"))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def run(self, sizes, seed):
+        report = dict(report_header(), runs=[])
+        for size in sizes:
+            self.stdout.write(f"{size} sites")
+            try:
+                with transaction.atomic():
+                    started = perf_counter()
+                    generate_catalogue(size, seed=seed)
+                    setup_seconds = round(perf_counter() - started, 3)
+                    benchmarks = run_benchmarks(self.stdout)
+                    raise Rollback
+            except Rollback:
+                pass
+            finally:
+                reset_caches()
+            report["runs"].append({"sites": size, "setup_seconds": setup_seconds, "benchmarks": benchmarks})
+        return report
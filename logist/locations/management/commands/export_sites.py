@@ -0,0 +1,104 @@
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from locations.services.export import (
+    DEFAULT_CHUNK_SIZE, compact_export, msgpack, export_incremental, export_shards, iter_records, write_compact,
+    write_compact_msgpack, write_json,
+)
+
+
+class Command(BaseCommand):
+    help = "Export all sites as JSON (the format of data/sites_data.json), streaming from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-o", "--output", default="-",
+            help="File to write, or '-' for stdout (default).",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+            help=f"Sites fetched per database round trip (default {DEFAULT_CHUNK_SIZE}).",
+        )
+        parser.add_argument("--indent", type=int, default=2)
+        parser.add_argument(
+            "--format", choices=["json", "compact", "msgpack"], default="json",
+            help=(
+                "json: the records of data/sites_data.json (default); compact: dictionary-encoded "
+                "names and structured hours; msgpack: compact as MessagePack (needs msgpack and --output)."
+            ),
+        )
+        parser.add_argument(
+            "--incremental", action="store_true",
+            help="Only re-export sites changed since the last run, tracked in a manifest of content hashes.",
+        )
+        parser.add_argument(
+            "--manifest",
+            help="Manifest file for --incremental (default: <output>.manifest.json).",
+        )
+        parser.add_argument(
+            "--shards", metavar="DIRECTORY",
+            help=(
+                "Write per-company and per-region shards with a manifest.json into DIRECTORY; "
+                "the single file is only written as well when --output is given."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options["shards"]:
+            report = export_shards(options["shards"], chunk_size=options["chunk_size"])
+            self.stderr.write(str(report))
+            if options["output"] == "-":
+                return
+
+        if options["format"] != "json":
+            if options["incremental"]:
+                raise CommandError("--incremental only supports --format json.")
+            self.export_compact(options)
+            return
+
+        if options["incremental"]:
+            if options["output"] == "-":
+                raise CommandError("--incremental needs an --output file.")
+            report = export_incremental(
+                options["output"],
+                manifest_path=options["manifest"],
+                chunk_size=options["chunk_size"],
+                indent=options["indent"],
+            )
+            self.stderr.write(str(report))
+            for label, site_ids in (("added", report.added), ("changed", report.changed), ("removed", report.removed)):
+                if site_ids and not report.full:
+                    self.stderr.write(f"  {label}: {', '.join(map(str, sorted(site_ids)))}")
+            return
+
+        records = iter_records(chunk_size=options["chunk_size"])
+        if options["output"] == "-":
+            # write_json emits fragments; don't terminate each one with "\n"
+            self.stdout.ending = ""
+            write_json(records, self.stdout, indent=options["indent"])
+            self.stdout.write("\n")
+            return
+
+        path = Path(options["output"])
+        with open(path, "w", encoding="utf-8") as f:
+            count = write_json(records, f, indent=options["indent"])
+        self.stderr.write(f"{count} sites exported to {path}")
+
+    def export_compact(self, options):
+        if options["format"] == "msgpack":
+            if options["output"] == "-":
+                raise CommandError("--format msgpack needs an --output file.")
+            if msgpack is None:
+                raise CommandError("The msgpack package is not installed.")
+        document = compact_export(chunk_size=options["chunk_size"])
+        if options["format"] == "msgpack":
+            with open(options["output"], "wb") as f:
+                write_compact_msgpack(document, f)
+        elif options["output"] == "-":
+            self.stdout.ending = ""
+            write_compact(document, self.stdout)
+            self.stdout.write("\n")
+            return
+        else:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                write_compact(document, f)
+        self.stderr.write(f"{len(document['sites'])} sites exported to {options['output']}")
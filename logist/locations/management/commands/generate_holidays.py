@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from locations.services.holiday_calendar import RULES, generate_holidays
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate fixed and Easter-dependent public holidays for a span of years "
+        f"({', '.join(RULES)}; German ones per Bundesland). Existing holidays are kept."
+    )
+
+    def add_arguments(self, parser):
+        this_year = timezone.localdate().year
+        parser.add_argument("--from", dest="first", type=int, default=this_year, help="First year (default: this year).")
+        parser.add_argument("--to", dest="last", type=int, default=this_year + 9, help="Last year (default: 9 years on).")
+        parser.add_argument(
+            "--country", action="append", choices=sorted(RULES),
+            help="Country code, repeatable (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        if options["last"] < options["first"]:
+            raise CommandError("--to must not be before --from.")
+        report = generate_holidays(range(options["first"], options["last"] + 1), options["country"])
+        self.stdout.write(f"Created {report.created} holidays, skipped {report.skipped} existing.")
+        if report.missing_regions:
+            self.stdout.write(f"No Region row for: {', '.join(report.missing_regions)}")
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from locations.services.calendar_import import (
+    DEFAULT_BATCH_SIZE, IMPORTERS, CalendarImportError, import_calendar, sniff_format,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import site exceptions or public holidays from a CSV or ICS file in one transaction, "
+        "overwriting existing rows of the same site (or country and region) and date. "
+        "CSV columns for exceptions: site_id or company/location/name, date, open_time, close_time, reason; "
+        "for holidays: country, region, date, name."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(IMPORTERS))
+        parser.add_argument("file")
+        parser.add_argument("--format", choices=["csv", "ics"], help="Default: from the file name or content.")
+        parser.add_argument("--site", type=int, help="Site id for rows without one (ICS exceptions).")
+        parser.add_argument("--country", help="Country code for rows without one (ICS holidays).")
+        parser.add_argument("--region", help="Region name for ICS holidays (default: country-wide).")
+        parser.add_argument("--delimiter", default=",")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options["kind"] == "exceptions":
+            target = {"site": options["site"]}
+        else:
+            target = {"country": options["country"], "region": options["region"]}
+        with open(options["file"], newline="", encoding="utf-8-sig") as f:
+            file_format = options["format"] or sniff_format(options["file"], f.readline())
+            f.seek(0)
+            try:
+                report = import_calendar(
+                    f, options["kind"], file_format=file_format, delimiter=options["delimiter"],
+                    batch_size=options["batch_size"], **target,
+                )
+            except CalendarImportError as e:
+                raise CommandError(f"Nothing imported:\n{e}")
+        self.stdout.write(f"Imported {report.written} {options['kind']} from {report.rows} rows.")
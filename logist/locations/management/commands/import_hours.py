@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from locations.services.hours_import import DEFAULT_BATCH_SIZE, import_hours
+from locations.services.importing import ImportFailed
+
+
+class Command(BaseCommand):
+    help = (
+        "Load weekly opening hours from a CSV or XLSX table with one row per site "
+        "(site_id or company/location/name) and a column per weekday or span (Mo, Di, ..., Mo-Fr) "
+        "holding a range like 08:00-17:00 or 'geschlossen'. Only days that differ from the "
+        "current hours are written; --dry-run only reports them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("file")
+        parser.add_argument("--dry-run", action="store_true", help="Report the changes without writing them.")
+        parser.add_argument("--format", choices=["csv", "xlsx"], help="Default: from the file name.")
+        parser.add_argument("--sheet", help="XLSX sheet name (default: the first).")
+        parser.add_argument("--delimiter", default=",")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--quiet", action="store_true", help="Print only the summary, not each change.")
+
+    def handle(self, *args, **options):
+        file_format = options["format"] or ("xlsx" if options["file"].lower().endswith(".xlsx") else "csv")
+        try:
+            if file_format == "xlsx":
+                with open(options["file"], "rb") as f:
+                    report = self._import(f, file_format, options)
+            else:
+                with open(options["file"], newline="", encoding="utf-8-sig") as f:
+                    report = self._import(f, file_format, options)
+        except ImportFailed as e:
+            raise CommandError(f"Nothing imported:\n{e}")
+        if not options["quiet"]:
+            for line in report.lines():
+                self.stdout.write(line)
+        self.stdout.write(("Dry run: " if report.dry_run else "") + str(report))
+
+    def _import(self, f, file_format, options):
+        return import_hours(
+            f, file_format=file_format, delimiter=options["delimiter"], sheet=options["sheet"],
+            dry_run=options["dry_run"], batch_size=options["batch_size"],
+        )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from locations.services import day_schedule
+
+
+class Command(BaseCommand):
+    help = (
+        f"Extend the materialized day schedules (SiteDaySchedule) to the next {day_schedule.WINDOW_DAYS} days "
+        "and drop past days. Run daily, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild", action="store_true",
+            help="Regenerate the whole window for all sites instead of only the new days.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=day_schedule.DEFAULT_BATCH_SIZE,
+            help=f"Sites resolved per round trip (default {day_schedule.DEFAULT_BATCH_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        written = day_schedule.extend(rebuild=options["rebuild"], batch_size=options["batch_size"])
+        start, end = day_schedule.window()
+        self.stdout.write(f"Materialized {written} site days ({start} to {end}).")
@@ -0,0 +1,87 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from locations.models import Region, Location, Company, Site
+from locations.services.onboarding import DEFAULT_BATCH_SIZE, create_sites
+
+COLUMNS = ("company", "location", "region", "name", "address", "zip_code", "phone", "email")
+
+
+class Command(BaseCommand):
+    help = (
+        "Create sites in bulk from a CSV file with the columns "
+        f"{', '.join(COLUMNS)} (only company, location and region are required). "
+        "Missing companies and locations are created; regions must exist. "
+        "Sites that already exist are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_file")
+        parser.add_argument("--delimiter", default=",")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        with open(options["csv_file"], newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.DictReader(f, delimiter=options["delimiter"]))
+        missing = {"company", "location", "region"} - set(rows[0] if rows else ())
+        if missing:
+            raise CommandError(f"Missing column(s): {', '.join(sorted(missing))}")
+
+        # One query per reference table; everything else is matched in memory
+        regions = {}
+        for region in Region.objects.all():
+            regions.setdefault(region.name, []).append(region)
+        companies = {company.name: company for company in Company.objects.all()}
+        locations = {(location.name, location.region_id): location for location in Location.objects.all()}
+
+        errors = []
+        for line, row in enumerate(rows, start=2):
+            candidates = regions.get(row["region"].strip(), [])
+            if len(candidates) != 1:
+                problem = "unknown" if not candidates else "ambiguous"
+                errors.append(f"line {line}: {problem} region {row['region']!r}")
+        if errors:
+            raise CommandError("\n".join(errors))
+
+        with transaction.atomic():
+            new_companies = [
+                Company(name=name)
+                for name in {row["company"].strip() for row in rows} - set(companies)
+            ]
+            for company in Company.objects.bulk_create(new_companies):
+                companies[company.name] = company
+
+            new_locations = {}
+            for row in rows:
+                key = (row["location"].strip(), regions[row["region"].strip()][0].pk)
+                if key not in locations:
+                    new_locations[key] = Location(name=key[0], region_id=key[1])
+            for location in Location.objects.bulk_create(new_locations.values()):
+                locations[location.name, location.region_id] = location
+
+            existing = set(Site.objects.values_list("location_id", "company_id", "name"))
+            sites = []
+            skipped = 0
+            for row in rows:
+                location = locations[row["location"].strip(), regions[row["region"].strip()][0].pk]
+                company = companies[row["company"].strip()]
+                name = (row.get("name") or "").strip() or None
+                if (location.pk, company.pk, name) in existing:
+                    skipped += 1
+                    continue
+                existing.add((location.pk, company.pk, name))
+                sites.append(Site(
+                    company=company,
+                    location=location,
+                    name=name,
+                    **{
+                        field: (row.get(field) or "").strip() or None
+                        for field in ("address", "zip_code", "phone", "email")
+                    },
+                ))
+            created = create_sites(sites, batch_size=options["batch_size"])
+
+        self.stdout.write(
+            f"Created {len(created)} sites ({len(new_companies)} new companies, "
+            f"{len(new_locations)} new locations); skipped {skipped} existing."
+        )
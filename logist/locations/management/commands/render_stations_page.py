@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from locations.services import static_page
+from locations.services.export import DEFAULT_CHUNK_SIZE, iter_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the company-grouped stations page from the database into static HTML, "
+        "with precompressed .gz (and .br, if brotli is installed) variants alongside."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-o", "--output", default=str(settings.BASE_DIR.parent / "stations.html"),
+            help="HTML file to write (default: stations.html next to style.css).",
+        )
+        parser.add_argument("--title", default=static_page.TITLE)
+        parser.add_argument("--stylesheet", default="style.css", help="Stylesheet href (default: style.css).")
+        parser.add_argument(
+            "--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+            help=f"Sites fetched per database round trip (default {DEFAULT_CHUNK_SIZE}).",
+        )
+
+    def handle(self, *args, **options):
+        written = static_page.write_page(
+            options["output"],
+            records=iter_records(chunk_size=options["chunk_size"]),
+            title=options["title"],
+            stylesheet=options["stylesheet"],
+        )
+        for path in written:
+            self.stdout.write(f"Wrote {path} ({path.stat().st_size} bytes)")
+        if static_page.brotli is None:
+            self.stderr.write("brotli is not installed; skipped the .br variant.")
@@ -0,0 +1,49 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from locations.services.importing import ImportFailed
+from locations.services.stations_sync import DEFAULT_BATCH_SIZE, SYNC_FIELDS, sync_stations
+
+
+class Command(BaseCommand):
+    help = (
+        "Write hand-edited maps links and contacts of a JSON export (stations.json, export_sites output) "
+        "back to the database. Records are matched by id, or by company and address when they have none; "
+        "only differing values are written, in one transaction. --dry-run only reports them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "file", nargs="?", default=str(settings.BASE_DIR.parent / "stations.json"),
+            help="JSON export to read (default: stations.json next to index.html).",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Report the changes without writing them.")
+        parser.add_argument(
+            "--fields", default=",".join(SYNC_FIELDS),
+            help=f"Comma-separated record keys to sync (default: {','.join(SYNC_FIELDS)}).",
+        )
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--quiet", action="store_true", help="Print only the summary, not each change.")
+
+    def handle(self, *args, **options):
+        fields = [field.strip() for field in options["fields"].split(",") if field.strip()]
+        unknown = set(fields) - set(SYNC_FIELDS)
+        if unknown:
+            raise CommandError(f"Cannot sync {', '.join(sorted(unknown))}; choose from {', '.join(SYNC_FIELDS)}.")
+        with open(options["file"], encoding="utf-8-sig") as f:
+            try:
+                records = json.load(f)
+            except json.JSONDecodeError as e:
+                raise CommandError(f"{options['file']} is not valid JSON: {e}")
+        if not isinstance(records, list):
+            raise CommandError(f"{options['file']} is not a list of export records.")
+        try:
+            report = sync_stations(
+                records, fields=fields, dry_run=options["dry_run"], batch_size=options["batch_size"],
+            )
+        except ImportFailed as e:
+            raise CommandError(f"Nothing synced:\n{e}")
+        if not options["quiet"]:
+            for line in report.lines():
+                self.stdout.write(line)
+        self.stdout.write(("Dry run: " if report.dry_run else "") + str(report))
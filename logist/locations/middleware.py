@@ -0,0 +1,23 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.utils.decorators import sync_and_async_middleware
+from .services import caching
+
+
+@sync_and_async_middleware
+def sync_local_state(get_response):
+    """
+    Rebuilds the in-memory indexes after changes made by other processes
+    before each request, and reads each cache generation once per request
+    (see services/caching.py).
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with caching.request_tokens():
+                await sync_to_async(caching.sync_local_state)()
+                return await get_response(request)
+    else:
+        def middleware(request):
+            with caching.request_tokens():
+                caching.sync_local_state()
+                return get_response(request)
+    return middleware
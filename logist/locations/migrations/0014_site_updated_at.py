@@ -0,0 +1,20 @@
+# Generated by Django 4.2.26 on 2026-10-18 10:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0013_alter_company_options_alter_location_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='site',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
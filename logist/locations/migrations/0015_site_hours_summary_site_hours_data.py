@@ -0,0 +1,24 @@
+# Generated by Django 4.2.26 on 2026-10-18 10:30
+
+from django.db import migrations, models
+import locations.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0014_site_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='site',
+            name='hours_data',
+            field=models.JSONField(blank=True, default=locations.models.blank_week, editable=False),
+        ),
+        migrations.AddField(
+            model_name='site',
+            name='hours_summary',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
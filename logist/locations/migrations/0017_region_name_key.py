@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:17
+
+from django.db import migrations, models
+
+
+def fill_name_keys(apps, schema_editor):
+    Region = apps.get_model('locations', 'Region')
+    regions = list(Region.objects.only('pk', 'name'))
+    for region in regions:
+        region.name_key = (region.name or '').lower()
+    Region.objects.bulk_update(regions, ['name_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0015_site_hours_summary_site_hours_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='region',
+            name='name_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+    ]
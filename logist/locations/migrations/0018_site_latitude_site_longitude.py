@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0017_region_name_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='site',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='site',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0018_site_latitude_site_longitude'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteDaySchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('open_time', models.TimeField(blank=True, null=True)),
+                ('close_time', models.TimeField(blank=True, null=True)),
+                ('source', models.CharField(choices=[('exception', 'Site exception'), ('holiday', 'Public holiday'), ('default', 'Default hours')], max_length=10)),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_schedules', to='locations.site')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'open_time'], name='locations_day_open_idx')],
+                'unique_together': {('site', 'date')},
+            },
+        ),
+    ]
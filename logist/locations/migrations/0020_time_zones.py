@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:39
+
+from django.db import migrations, models
+import locations.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0019_sitedayschedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='country',
+            name='time_zone',
+            field=models.CharField(blank=True, default='', max_length=64, validators=[locations.models.validate_time_zone]),
+        ),
+        migrations.AddField(
+            model_name='region',
+            name='time_zone',
+            field=models.CharField(blank=True, default='', max_length=64, validators=[locations.models.validate_time_zone]),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0020_time_zones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='site',
+            name='maps_link',
+            field=models.URLField(blank=True, max_length=500, null=True),
+        ),
+    ]
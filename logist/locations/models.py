@@ -1,5 +1,7 @@
+import zoneinfo
 from django.db import models
 from django.utils import timezone
+from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from itertools import groupby
 # from .services.opening_hours import get_site_hours
@@ -30,6 +32,43 @@ class Weekday:
     def short_name(cls, weekday_int):
         return cls.SHORT_NAMES[weekday_int]
 
+def validate_time_zone(value):
+    try:
+        zoneinfo.ZoneInfo(value)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        raise ValidationError(f"Unknown time zone {value!r}; use an IANA name such as Europe/Berlin.")
+
+
+class LoadedValuesMixin:
+    """
+    Remembers the TRACKED_FIELDS values an instance was loaded or last
+    saved with, so post_save receivers can tell whether a save changed them.
+    """
+    TRACKED_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {name: getattr(instance, name) for name in cls.TRACKED_FIELDS if name in field_names}
+        return instance
+
+    def _remember_values(self):
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {name: getattr(self, name) for name in self.TRACKED_FIELDS if name not in deferred}
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._remember_values()
+
+    def save(self, *args, **kwargs):
+        # post_save receivers compare against the values before this save
+        super().save(*args, **kwargs)
+        self._remember_values()
+
+    def has_changed(self, name):
+        loaded = getattr(self, "_loaded_values", {})
+        return name in loaded and loaded[name] != getattr(self, name)
+
 # -----------------------
 # Country Level
 # -----------------------
@@ -39,8 +78,8 @@ class Country(models.Model):
     german_name = models.CharField(max_length=100, blank=True, null=True)
     code = models.CharField(max_length=5, unique=True,blank=True, null=True)  # e.g., 'DE', 'AT'
     dialing_code = models.CharField(max_length=5, blank=True, null=True)
-    # time_zones = models.CharField(max_length=100)
-    # time_zones = models.CharField(max_length=100)
+    # IANA name, e.g. 'Europe/Warsaw'; blank means settings.TIME_ZONE
+    time_zone = models.CharField(max_length=64, blank=True, default="", validators=[validate_time_zone])
     emoji_flag = models.CharField(max_length=10, blank=True, null=True)  # 4–10 is usually enough for flags + complex emoji
 
     class Meta:
@@ -55,7 +94,12 @@ class Country(models.Model):
 # -----------------------
 class Region(models.Model):
     name = models.CharField(max_length=100)
+    # lower-cased name for the admin's prefix search: a range lookup on it
+    # uses the index, which SQLite's case-insensitive LIKE cannot
+    name_key = models.CharField(max_length=100, db_index=True, editable=False, default="")
     country = models.ForeignKey(Country, on_delete=models.CASCADE, related_name='regions')
+    # only for regions off their country's zone; blank means the country's
+    time_zone = models.CharField(max_length=64, blank=True, default="", validators=[validate_time_zone])
 
     class Meta:
         ordering = ['name']
@@ -63,13 +107,23 @@ class Region(models.Model):
     def __str__(self):
         return f"{self.name}, {self.country.code}"
 
+    @staticmethod
+    def key_for(name):
+        return (name or "").lower()
+
+    def save(self, *args, **kwargs):
+        self.name_key = self.key_for(self.name)
+        super().save(*args, **kwargs)
+
 # -----------------------
 # Location Level (city/town/village)
 # -----------------------
-class Location(models.Model):
+class Location(LoadedValuesMixin, models.Model):
     name = models.CharField(max_length=100)  # city, town, or municipality
     region = models.ForeignKey(Region, on_delete=models.CASCADE, related_name='locations')
 
+    TRACKED_FIELDS = ("region_id",)  # holidays follow the region
+
     class Meta:
         ordering = ['name']
         unique_together = ('name', 'region')  # only one location per region
@@ -82,6 +136,8 @@ class Location(models.Model):
 # -----------------------
 class Group(models.Model):
     name = models.CharField(max_length=100)  # group name
+    # bumped on every save; part of the company list's ETag
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -92,7 +148,9 @@ class Group(models.Model):
 class Company(models.Model):
     name = models.CharField(max_length=100)  # company name
     group = models.ForeignKey(Group, on_delete=models.SET_NULL, related_name='companies', blank=True, null=True)
-    
+    # bumped on every save (renames, group moves); part of the company list's ETag
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         verbose_name_plural = "Companies"
         ordering = ['name']  # alphabetical by name
@@ -103,10 +161,17 @@ class Company(models.Model):
 """
 WEEKDAY_NAMES = ["Mo","Tu","We","Th","Fr","Sa","Su"]
 """
+def blank_week():
+    """
+    Site.hours_data of a site whose 7 DefaultHours rows have no hours yet.
+    """
+    return [None] * 7
+
+
 # -----------------------
 # Site Level (physical branch/office)
 # -----------------------
-class Site(models.Model):
+class Site(LoadedValuesMixin, models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='sites', null=True)
     name = models.CharField(max_length=200, blank=True, null=True)  # branch/site name
     location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='sites')
@@ -121,8 +186,16 @@ class Site(models.Model):
         null=True
     )
     google_place_id = models.CharField(max_length=200, blank=True, null=True)
+    maps_link = models.URLField(max_length=500, blank=True, null=True)  # curated Google Maps share link
+    latitude = models.FloatField(blank=True, null=True)  # WGS84 degrees
+    longitude = models.FloatField(blank=True, null=True)
     email = models.EmailField(max_length=254, blank=True, null=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
+    # bumped on any change to the site or what it exports (see signals)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # compiled from DefaultHours by signals / backfill_hours_display, never edited directly
+    hours_summary = models.TextField(blank=True, default="", editable=False)  # e.g. "Mo–Fr 08:00-17:00; Sa Closed"
+    hours_data = models.JSONField(blank=True, default=blank_week, editable=False)  # see WeeklySchedule.as_json
     """
     def get_opening_hours(self, check_date):
         # Same logic as before
@@ -155,24 +228,16 @@ class Site(models.Model):
                 return exception.open_time, exception.close_time
             return None, None  # Closed
 
-        # 2. Check PublicHoliday
-        holidays = PublicHoliday.objects.filter(
-            date=check_date,
-            country=site.location.region.country
-        ).filter(models.Q(region__isnull=True) | models.Q(region=site.location.region))
-        if holidays.exists():
+        # 2. Check PublicHoliday (country-wide or region-specific)
+        from .services.holidays import holiday_index
+        region = site.location.region
+        if holiday_index.is_holiday(region.country_id, region.pk, check_date):
             return None, None  # Closed
 
-        # 3. DefaultHours
-        weekday = check_date.weekday()
-        default_hours = site.default_hours.filter(weekday=weekday).first()
-        if default_hours:
-            if getattr(default_hours, "is_closed", False):
-                return None, None
-            return default_hours.open_time, default_hours.close_time
-
-        # 4. If nothing exists, assume closed
-        return None, None
+        # 3. DefaultHours, from the compiled weekly schedule
+        #    (no row or is_closed -> None, None; assume closed)
+        from .services.schedule import get_schedule
+        return get_schedule(site).hours_on(check_date.weekday())
     """
     @property
     def hours_display(self):
@@ -210,47 +275,11 @@ class Site(models.Model):
         """
         Returns a human-readable opening hours string like:
         "Mo–Fr 08:00–17:00; Sa Closed"
-        """
-
-        # 1) Get all opening hours ordered by weekday
-        hours = self.default_hours.order_by("weekday")
-
-        # 2) Build hours_list with correct logic:
-        #    - Explicit closure
-        #    - Normal hours
-        #    - Unknown
-        hours_list = []
 
-        for h in hours:
-            wd = Weekday.short_name(h.weekday)
-
-            if getattr(h, "is_closed", False):
-                hours_list.append((wd, "Closed"))
-            elif h.open_time and h.close_time:
-                hours_list.append(
-                    (wd, f"{h.open_time.strftime('%H:%M')}-{h.close_time.strftime('%H:%M')}")
-                )
-            else:
-                hours_list.append((wd, "Unknown"))
-        
-        # 2b) If all hours are Unknown, return empty string
-        if all(hour == "Unknown" for _, hour in hours_list):
-            return ""
-        
-        # 3) Group consecutive days with same hours
-        result = []
-        for key, group in groupby(enumerate(hours_list), key=lambda x: x[1][1]):
-            group = list(group)
-            days = [x[1][0] for x in group]
-
-            if len(days) == 1:
-                day_str = days[0]
-            else:
-                day_str = f"{days[0]}–{days[-1]}"
-
-            result.append(f"{day_str} {key}")
-
-        return "; ".join(result)
+        Stored on the row (hours_summary) and maintained from DefaultHours
+        signals, so reading it costs no query.
+        """
+        return self.hours_summary
 
     
     class Meta:
@@ -259,49 +288,45 @@ class Site(models.Model):
 
     @property
     def today_hours(self):
-        from datetime import date
-        return Site.get_site_hours(self, date.today())
+        """
+        Hours for the current date in the site's own time zone (see
+        services/today.py), shared by all sites of that zone.
+        """
+        from .services.today import today_hours
+        return today_hours(self)
         # return self.get_opening_hours(date.today())
     
-    def export_to_JSON():
-        data = []
-        for site in Site.objects.all().select_related("company"):
-            parts = []
-            if site.company.group:
-                parts.append(site.company.group.name)
-            else:
-                parts.append(site.company.name)
-            parts.append(site.location.name)
-            if site.name:
-                parts.append(site.name)
-            name = " - ".join(parts)
-            data.append({
-                "company": site.company.name,
-                "name": name,
-                "address": site.address,
-                "maps_link": "",
-                "phone": site.phone,
-                "hours": site.hours_display,
-            })
-        
-        data.sort(key=lambda x: x["company"])
+    @staticmethod
+    def export_to_JSON(path=None):
+        """
+        Writes all sites to path (default: data/sites_data.json in the
+        repository). Use the export_sites management command for stdout
+        or other options.
+        """
+        from django.conf import settings
+        from .services.export import iter_records, write_json
+
+        if path is None:
+            path = settings.BASE_DIR.parent / "data" / "sites_data.json"
+        with open(path, "w", encoding="utf-8") as f:
+            write_json(iter_records(), f)
 
-        import json
-        from pathlib import Path
+        print(f"JSON exported to {path}")
 
-        # Path to the development folder inside your project
-        dev_folder = Path("/Users/marincordeleanu/code/github/pilot/data")
-        json_file_path = dev_folder / "sites_data.json"
-        # Write JSON file
-        with open(json_file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
 
-        print(f"JSON exported to {json_file_path}")
+    TRACKED_FIELDS = ("location_id",)  # holidays follow the location
 
+    # Maintained with queryset updates; a stale instance must not overwrite them
+    DERIVED_FIELDS = ("hours_summary", "hours_data")
 
     def save(self, *args, **kwargs):
         if self.email:
             self.email = self.email.lower()
+        if not self._state.adding and not kwargs.get("force_insert") and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.DERIVED_FIELDS
+            ]
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -349,7 +374,9 @@ class SiteException(models.Model):
         return f"{self.site.name} ({self.date}): {status} - {self.reason}"
     
 
-class PublicHoliday(models.Model):
+class PublicHoliday(LoadedValuesMixin, models.Model):
+    TRACKED_FIELDS = ("country_id", "region_id", "date")
+
     country = models.ForeignKey('Country', on_delete=models.CASCADE, related_name='holidays')
     region = models.ForeignKey('Region', on_delete=models.CASCADE, blank=True, null=True, related_name='holidays')
     date = models.DateField()
@@ -362,3 +389,46 @@ class PublicHoliday(models.Model):
         scope = self.region.name if self.region else self.country.name
         return f"{self.name} ({scope}): {self.date}"
 
+
+
+class SiteDaySchedule(models.Model):
+    """
+    Effective hours of a site on one date, materialized from SiteException,
+    PublicHoliday and DefaultHours for a rolling window (see
+    services/day_schedule.py), one row per site and day; closed and unknown
+    days have no times. A missing row means the day is not materialized.
+    """
+    EXCEPTION = "exception"
+    HOLIDAY = "holiday"
+    DEFAULT = "default"
+    SOURCES = [
+        (EXCEPTION, "Site exception"),
+        (HOLIDAY, "Public holiday"),
+        (DEFAULT, "Default hours"),
+    ]
+
+    site = models.ForeignKey('Site', on_delete=models.CASCADE, related_name='day_schedules')
+    date = models.DateField()
+    open_time = models.TimeField(blank=True, null=True)
+    close_time = models.TimeField(blank=True, null=True)
+    source = models.CharField(max_length=10, choices=SOURCES)
+
+    class Meta:
+        unique_together = ('site', 'date')
+        indexes = [models.Index(fields=['date', 'open_time'], name='locations_day_open_idx')]
+
+    def __str__(self):
+        status = f"{self.open_time}-{self.close_time}" if self.open_time and self.close_time else "Closed"
+        return f"{self.site.name} ({self.date}): {status} [{self.source}]"
+
+
+class CacheGeneration(models.Model):
+    """
+    The current generation token of a cache scope (services/caching.py),
+    kept in the database so that a bump reaches every process.
+    """
+    scope = models.CharField(max_length=64, primary_key=True)
+    token = models.CharField(max_length=32)
+
+    def __str__(self):
+        return f"{self.scope}: {self.token}"
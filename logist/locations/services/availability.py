@@ -0,0 +1,285 @@
+from datetime import timedelta
+from threading import RLock
+from ..models import Site, DefaultHours, SiteException
+from .holidays import holiday_index
+from .schedule import MINUTES_PER_DAY, _minutes, compile_schedule
+from .today import local_now, zone_name
+
+# Filter name -> position in the per-site scope tuple
+DIMENSIONS = ("country", "region", "location", "company", "group")
+
+# How many days of SiteException overrides to keep in memory
+EXCEPTION_DAYS_CACHED = 32
+
+
+def _pk(value):
+    return getattr(value, "pk", value)
+
+
+def _split_days(days):
+    """
+    Splits a WeeklySchedule's days at midnight into minute-of-week intervals
+    opened on their own day and the overnight spills into the next day.
+    """
+    own, spills = [], []
+    for weekday, day in enumerate(days):
+        base = weekday * MINUTES_PER_DAY
+        for start, end in day or ():
+            own.append((base + start, base + min(end, MINUTES_PER_DAY)))
+            if end > MINUTES_PER_DAY:
+                following = (weekday + 1) % 7 * MINUTES_PER_DAY
+                spills.append((following, following + end - MINUTES_PER_DAY))
+    return tuple(own), tuple(spills)
+
+
+def _exception_open(open_time, close_time, minute, spill=False):
+    """
+    Whether a SiteException's (open_time, close_time) covers minute of its
+    own day, or with spill, of the following day; a close not after the
+    open runs past midnight.
+    """
+    if not (open_time and close_time):
+        return False
+    start, end = _minutes(open_time), _minutes(close_time)
+    if spill:
+        return end <= start and minute < end
+    if end <= start:
+        return minute >= start
+    return start <= minute < end
+
+
+class AvailabilityIndex:
+    """
+    In-memory interval index answering "which sites are open at instant t".
+
+    Each site's DefaultHours are compiled into minute-of-week intervals and
+    sites sharing an interval are stored together, so a lookup only scans
+    the distinct intervals of the catalogue. Holidays (from holiday_index)
+    and SiteExceptions for the day are applied on top, in the same priority
+    as get_site_hours. Hours running past midnight are indexed as an
+    overnight spill on the next day and judged by the holidays and
+    exceptions of the day they started on.
+
+    The index is built on first use. Site and DefaultHours changes refresh
+    only the affected site; Company and Location changes rebuild it.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._built = False
+        self._dirty = set()
+        self._exceptions = {}  # date -> {site_id: (open_time, close_time)}
+        self._reset()
+
+    def _reset(self):
+        self._scope = {}  # site_id -> (country_id, region_id, location_id, company_id, group_id)
+        self._site_intervals = {}  # site_id -> (own intervals, overnight spills)
+        self._intervals = {}  # (start, end) -> set of site_ids opened that day
+        self._spills = {}  # (start, end) -> set of site_ids open since the day before
+        self._by_dimension = {dimension: {} for dimension in DIMENSIONS}
+        self._region_country = {}  # region_id -> country_id
+        self._site_zone = {}  # site_id -> IANA time zone name
+        self._by_zone = {}  # zone -> set of site_ids
+        self._zone_regions = {}  # zone -> set of region_ids
+
+    # -----------------------
+    # Maintenance
+    # -----------------------
+    def invalidate(self):
+        with self._lock:
+            self._built = False
+            self._dirty.clear()
+            self._exceptions.clear()
+
+    def invalidate_site(self, site_id):
+        with self._lock:
+            self._dirty.add(site_id)
+
+    def invalidate_exceptions(self):
+        with self._lock:
+            self._exceptions.clear()
+
+    def _ensure(self):
+        with self._lock:
+            if not self._built:
+                self._reset()
+                self._load(None)
+                self._dirty.clear()
+                self._built = True
+            elif self._dirty:
+                dirty, self._dirty = self._dirty, set()
+                for site_id in dirty:
+                    self._remove(site_id)
+                self._load(dirty)
+
+    def _load(self, site_ids):
+        sites = Site.objects.all()
+        hours = DefaultHours.objects.all()
+        if site_ids is not None:
+            sites = sites.filter(pk__in=site_ids)
+            hours = hours.filter(site_id__in=site_ids)
+
+        rows = {}
+        for site_id, weekday, open_time, close_time, is_closed in hours.values_list(
+            "site_id", "weekday", "open_time", "close_time", "is_closed"
+        ):
+            rows.setdefault(site_id, []).append((weekday, open_time, close_time, is_closed))
+
+        for site_id, region_zone, country_zone, *scope in sites.values_list(
+            "pk",
+            "location__region__time_zone",
+            "location__region__country__time_zone",
+            "location__region__country_id",
+            "location__region_id",
+            "location_id",
+            "company_id",
+            "company__group_id",
+        ):
+            own, spills = _split_days(compile_schedule(rows.get(site_id, ())).days)
+            self._scope[site_id] = tuple(scope)
+            self._site_intervals[site_id] = (own, spills)
+            for interval in own:
+                self._intervals.setdefault(interval, set()).add(site_id)
+            for interval in spills:
+                self._spills.setdefault(interval, set()).add(site_id)
+            for dimension, value in zip(DIMENSIONS, scope):
+                self._by_dimension[dimension].setdefault(value, set()).add(site_id)
+            self._region_country[scope[1]] = scope[0]
+            zone = zone_name(region_zone, country_zone)
+            self._site_zone[site_id] = zone
+            self._by_zone.setdefault(zone, set()).add(site_id)
+            self._zone_regions.setdefault(zone, set()).add(scope[1])
+
+    def _remove(self, site_id):
+        scope = self._scope.pop(site_id, None)
+        if scope is None:
+            return
+        own, spills = self._site_intervals.pop(site_id)
+        for index, intervals in ((self._intervals, own), (self._spills, spills)):
+            for interval in intervals:
+                members = index[interval]
+                members.discard(site_id)
+                if not members:
+                    del index[interval]
+        for dimension, value in zip(DIMENSIONS, scope):
+            self._by_dimension[dimension][value].discard(site_id)
+        self._by_zone[self._site_zone.pop(site_id)].discard(site_id)
+
+    def _exceptions_on(self, day):
+        exceptions = self._exceptions.get(day)
+        if exceptions is None:
+            exceptions = {
+                site_id: (open_time, close_time)
+                for site_id, open_time, close_time in SiteException.objects.filter(date=day)
+                .values_list("site_id", "open_time", "close_time")
+            }
+            if len(self._exceptions) >= EXCEPTION_DAYS_CACHED:
+                self._exceptions.clear()
+            self._exceptions[day] = exceptions
+        return exceptions
+
+    # -----------------------
+    # Queries
+    # -----------------------
+    def site_ids(self, **filters):
+        """
+        The set of site ids matching filters (see open_site_ids), or None
+        when no filter is given.
+        """
+        unknown = set(filters) - set(DIMENSIONS)
+        if unknown:
+            raise TypeError(f"Unknown filter(s): {', '.join(sorted(unknown))}")
+
+        with self._lock:
+            self._ensure()
+            candidates = None
+            for dimension, value in filters.items():
+                if value is None:
+                    continue
+                members = self._by_dimension[dimension].get(_pk(value), set())
+                candidates = set(members) if candidates is None else candidates & members
+            return candidates
+
+    def open_site_ids(self, at, **filters):
+        """
+        Returns the set of site ids open at the datetime ``at``.
+
+        Each site is judged by the wall clock of its own time zone (region,
+        else country, else settings.TIME_ZONE); naive datetimes are taken
+        as that local time everywhere. Optional filters narrow the result
+        and accept instances or primary keys: country, region, location,
+        company, group.
+        """
+        with self._lock:
+            candidates = self.site_ids(**filters)
+            single_zone = len(self._by_zone) <= 1
+
+            result = set()
+            for zone, zone_sites in self._by_zone.items():
+                if not zone_sites:
+                    continue
+                local = local_now(zone, at)
+                day = local.date()
+                minute = local.hour * 60 + local.minute
+                point = local.weekday() * MINUTES_PER_DAY + minute
+                if single_zone:
+                    scope = candidates
+                else:
+                    scope = zone_sites if candidates is None else zone_sites & candidates
+
+                open_now = self._matching(self._intervals, point, scope)
+                spilled = self._matching(self._spills, point, scope)
+                open_now = self._apply_overrides(zone, day, minute, open_now, zone_sites, candidates)
+                spilled = self._apply_overrides(
+                    zone, day - timedelta(days=1), minute, spilled, zone_sites, candidates, spill=True
+                )
+                open_now |= spilled
+                result |= open_now
+
+        return result
+
+    @staticmethod
+    def _matching(index, point, scope):
+        matched = set()
+        for (start, end), members in index.items():
+            if start <= point < end:
+                matched |= members if scope is None else members & scope
+        return matched
+
+    def _apply_overrides(self, zone, day, minute, open_now, zone_sites, candidates, spill=False):
+        """
+        Applies day's holidays and exceptions to the sites open_now on it,
+        or with spill, to those still open from day past midnight.
+        """
+        # 2. PublicHoliday closes every site of a holiday region
+        for region_id in self._zone_regions[zone]:
+            members = self._by_dimension["region"].get(region_id)
+            if members and holiday_index.is_holiday(self._region_country[region_id], region_id, day):
+                open_now -= members
+
+        # 1. SiteException wins over holidays and default hours
+        for site_id, (open_time, close_time) in self._exceptions_on(day).items():
+            if site_id not in zone_sites or (candidates is not None and site_id not in candidates):
+                continue
+            if _exception_open(open_time, close_time, minute, spill):
+                open_now.add(site_id)
+            else:
+                open_now.discard(site_id)
+        return open_now
+
+
+availability_index = AvailabilityIndex()
+
+
+def open_site_ids(at, **filters):
+    """
+    Ids of all sites open at ``at``; see AvailabilityIndex.open_site_ids.
+    """
+    return availability_index.open_site_ids(at, **filters)
+
+
+def open_sites(at, **filters):
+    """
+    Queryset of all sites open at ``at``, filtered like open_site_ids.
+    """
+    return Site.objects.filter(pk__in=open_site_ids(at, **filters))
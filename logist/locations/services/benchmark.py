@@ -0,0 +1,170 @@
+import contextlib
+import io
+import os
+import platform
+import subprocess
+import tempfile
+from datetime import datetime, time, timedelta
+from time import perf_counter
+import django
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from ..models import Site
+from .availability import availability_index, open_site_ids
+from .geo import nearest_site_ids, spatial_index
+from .holidays import holiday_index
+from .opening_hours import get_site_hours, resolve_hours
+from .schedule import clear_schedules
+from .search import search, search_index
+from .today import today_cache
+
+# Sites sampled for per-site benchmarks
+SAMPLE_SIZE = 100
+
+# A cache of the benchmarks' own, which reset_caches() can clear without
+# touching the one the configured site uses
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "locations-benchmark"},
+}
+
+
+def reset_caches():
+    """
+    Clears every in-process index and the cache (the benchmarks' own, see
+    CACHES), so "cold" numbers include loading them.
+    """
+    cache.clear()
+    clear_schedules()
+    holiday_index.invalidate()
+    availability_index.invalidate()
+    spatial_index.invalidate()
+    search_index.invalidate()
+    today_cache.invalidate()
+
+
+def measure(func, calls=1):
+    """
+    Runs func() ``calls`` times; returns wall time and query count.
+    """
+    with CaptureQueriesContext(connection) as queries:
+        started = perf_counter()
+        for _ in range(calls):
+            func()
+        seconds = perf_counter() - started
+    return {"seconds": round(seconds, 6), "queries": len(queries), "calls": calls}
+
+
+def _get(client, url, params=None):
+    def fetch():
+        response = client.get(url, params or {})
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+    return fetch
+
+
+def _export():
+    fd, path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            Site.export_to_JSON(path)
+    finally:
+        os.remove(path)
+
+
+def run_benchmarks(stdout=None):
+    """
+    Measures the hot paths against the sites currently in the database.
+    Returns {name: {"seconds", "queries", "calls"}}.
+    """
+    reset_caches()
+    today = timezone.localdate()
+    monday = today + timedelta(days=7 - today.weekday())
+    noon = timezone.make_aware(datetime.combine(monday, time(12)))
+    site_ids = list(Site.objects.order_by("pk").values_list("pk", flat=True))
+    step = max(1, len(site_ids) // SAMPLE_SIZE)
+    sample = list(Site.objects.select_related("location__region").filter(pk__in=site_ids[::step][:SAMPLE_SIZE]))
+
+    user = get_user_model().objects.create_superuser("benchmark", "benchmark@example.com", None)
+    client = Client()
+    client.force_login(user)
+
+    benchmarks = [
+        ("get_site_hours", lambda: [get_site_hours(site, monday) for site in sample], 1),
+        ("Site.get_site_hours", lambda: [Site.get_site_hours(site, monday) for site in sample], 1),
+        ("hours_display", lambda: [site.hours_display for site in Site.objects.all()], 1),
+        ("today_hours.cold", lambda: [site.today_hours for site in sample], 1),
+        ("today_hours.warm", lambda: [site.today_hours for site in sample], 1),
+        ("resolve_hours.week", lambda: resolve_hours(None, monday, monday + timedelta(days=6)), 1),
+        ("open_site_ids.cold", lambda: open_site_ids(noon), 1),
+        ("open_site_ids.warm", lambda: open_site_ids(noon), 10),
+        ("nearest.cold", lambda: nearest_site_ids(51.05, 13.74, k=10), 1),
+        ("nearest.warm", lambda: nearest_site_ids(51.05, 13.74, k=10, at=noon), 10),
+        ("search.cold", lambda: search("industriestrasse 12"), 1),
+        ("search.warm", lambda: search("spedition 4"), 10),
+        ("export_to_JSON", _export, 1),
+        ("admin.site_changelist", _get(client, reverse("admin:locations_site_changelist")), 1),
+        ("admin.site_search", _get(client, reverse("admin:locations_site_changelist"), {"q": "halle 42"}), 1),
+        ("admin.location_changelist", _get(client, reverse("admin:locations_location_changelist")), 1),
+        ("admin.company_changelist", _get(client, reverse("admin:locations_company_changelist")), 1),
+        ("admin.publicholiday_changelist", _get(client, reverse("admin:locations_publicholiday_changelist")), 1),
+        ("api.site_list", _get(client, reverse("locations:site-list"), {"limit": 500}), 1),
+        ("api.hours_list", _get(client, reverse("locations:hours-list"), {
+            "start": monday, "end": monday + timedelta(days=6),
+        }), 1),
+        ("api.company_list", _get(client, reverse("locations:company-list")), 1),
+        ("api.site_nearest", _get(client, reverse("locations:site-nearest"), {"lat": 48.14, "lon": 11.58, "k": 20}), 1),
+        ("api.search", _get(client, reverse("locations:search"), {"q": "spedition"}), 1),
+    ]
+
+    results = {}
+    for name, func, calls in benchmarks:
+        results[name] = measure(func, calls)
+        if stdout is not None:
+            stdout.write(f"  {name:<34} {results[name]['seconds']:>10.4f}s {results[name]['queries']:>6} queries")
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Lines describing benchmarks that got slower by more than ``tolerance``
+    (a share) or run more queries than in baseline, a previous report.
+    """
+    previous = {(run["sites"], name): bench for run in baseline["runs"] for name, bench in run["benchmarks"].items()}
+    regressions = []
+    for run in results["runs"]:
+        for name, bench in run["benchmarks"].items():
+            before = previous.get((run["sites"], name))
+            if before is None:
+                continue
+            if bench["queries"] > before["queries"]:
+                regressions.append(f"{run['sites']} sites, {name}: {before['queries']} -> {bench['queries']} queries")
+            if bench["seconds"] > before["seconds"] * (1 + tolerance) and bench["seconds"] - before["seconds"] > 0.005:
+                regressions.append(
+                    f"{run['sites']} sites, {name}: {before['seconds']:.4f}s -> {bench['seconds']:.4f}s"
+                )
+    return regressions
+
+
+def report_header():
+    return {
+        "created_at": timezone.now().isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
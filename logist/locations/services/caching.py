@@ -0,0 +1,241 @@
+import hashlib
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.core.cache import cache
+from django.db import transaction
+from ..models import CacheGeneration, Location, Site
+from .opening_hours import resolve_hours
+
+# Cached values also expire after this many seconds
+DEFAULT_TIMEOUT = 24 * 60 * 60
+
+PREFIX = "locations"
+
+# Generation scopes besides ("site" | "company" | "location" | "country", id):
+CATALOGUE = ("catalogue", 0)  # bumped by every change; for whole-catalogue payloads
+STRUCTURE = ("structure", 0)  # regions and countries; part of every key
+
+_MISSING = object()
+
+# The CATALOGUE token this process's in-memory indexes are up to date with
+_synced = None
+
+# Tokens already read in the current request (see request_tokens)
+_request_tokens = ContextVar("request_tokens", default=None)
+
+
+# -----------------------
+# Generations
+# -----------------------
+# Tokens read per query
+GENERATION_BATCH_SIZE = 500
+
+
+def _generation_key(scope):
+    return f"{scope[0]}:{scope[1]}"
+
+
+def _tokens(keys):
+    tokens = {}
+    for n in range(0, len(keys), GENERATION_BATCH_SIZE):
+        batch = keys[n:n + GENERATION_BATCH_SIZE]
+        tokens.update(CacheGeneration.objects.filter(scope__in=batch).values_list("scope", "token"))
+    return tokens
+
+
+@contextmanager
+def request_tokens():
+    """
+    Reads each scope's token at most once inside the block (a request, see
+    middleware): the generations are taken as of their first use, which is
+    before the data cached under them is read.
+    """
+    reset = _request_tokens.set({})
+    try:
+        yield
+    finally:
+        _request_tokens.reset(reset)
+
+
+def generations(scopes):
+    """
+    The current generation token of each scope, from the CacheGeneration
+    table shared by all processes; one query per GENERATION_BATCH_SIZE
+    scopes not read yet in the current request.
+
+    A scope without a token (never bumped) gets a fresh random one, never
+    an old value, so values cached under a previous generation cannot come
+    back.
+    """
+    keys = [_generation_key(scope) for scope in scopes]
+    known = _request_tokens.get()
+    found = dict(known) if known is not None else {}
+    unique = [key for key in dict.fromkeys(keys) if key not in found]
+    if unique:
+        found.update(_tokens(unique))
+        missing = [key for key in unique if key not in found]
+        if missing:
+            CacheGeneration.objects.bulk_create(
+                [CacheGeneration(scope=key, token=uuid.uuid4().hex) for key in missing], ignore_conflicts=True,
+            )
+            # another process may have added its token first
+            found.update(_tokens(missing))
+        if known is not None:
+            known.update((key, found[key]) for key in unique)
+    return [found[key] for key in keys]
+
+
+def bump(*scopes):
+    """
+    Invalidates every value cached under scopes, and the CATALOGUE, in all
+    processes.
+
+    The new tokens are written in the current transaction; readers take
+    their tokens before reading the data they cache, so values read before
+    the commit stay under the old generation.
+    """
+    catalogue = _generation_key(CATALOGUE)
+    tokens = {_generation_key(scope): uuid.uuid4().hex for scope in (*scopes, CATALOGUE)}
+    current = CacheGeneration.objects.filter(scope=catalogue).values_list("token", flat=True).first()
+    CacheGeneration.objects.bulk_create(
+        [CacheGeneration(scope=key, token=token) for key, token in tokens.items()],
+        update_conflicts=True, unique_fields=["scope"], update_fields=["token"],
+    )
+    known = _request_tokens.get()
+    if known is not None:
+        known.update(tokens)
+
+    def synced():
+        # the in-memory indexes follow this process's own changes through
+        # the signals; unless another process's change came first, they stay
+        global _synced
+        if _synced is not None and _synced == current:
+            _synced = tokens[catalogue]
+    transaction.on_commit(synced)
+
+
+def sync_local_state():
+    """
+    Drops this process's in-memory indexes (holidays, availability,
+    spatial, search, today's hours, weekly schedules) if another process
+    changed the catalogue since they were last checked, so that edits made
+    by management commands or other workers reach every process. Called
+    at the start of each request (see middleware); costs one query.
+    """
+    global _synced
+    from .availability import availability_index
+    from .geo import spatial_index
+    from .holidays import holiday_index
+    from .schedule import clear_schedules
+    from .search import search_index
+    from .today import today_cache
+
+    # STRUCTURE is part of every key; read along
+    token, _ = generations([CATALOGUE, STRUCTURE])
+    if token == _synced:
+        return
+    clear_schedules()
+    holiday_index.invalidate()
+    availability_index.invalidate()
+    spatial_index.invalidate()
+    search_index.invalidate()
+    today_cache.invalidate()
+    _synced = token
+
+
+def make_keys(name, entries):
+    """
+    Cache keys for [(parts, scopes), ...]: parts identify the value,
+    scopes are the generations it depends on (STRUCTURE is always added).
+    """
+    entries = list(entries)
+    unique = list(dict.fromkeys(scope for _, scopes in entries for scope in (*scopes, STRUCTURE)))
+    tokens = dict(zip(unique, generations(unique)))
+    keys = []
+    for parts, scopes in entries:
+        state = (parts, [tokens[scope] for scope in (*scopes, STRUCTURE)])
+        keys.append(f"{PREFIX}:{name}:{hashlib.blake2b(repr(state).encode(), digest_size=16).hexdigest()}")
+    return keys
+
+
+def get_or_compute(name, parts, scopes, compute, timeout=DEFAULT_TIMEOUT):
+    """
+    The cached value of (name, parts) under the current generations of
+    scopes, computed and stored on a miss.
+    """
+    key, = make_keys(name, [(parts, scopes)])
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+# -----------------------
+# Sites
+# -----------------------
+def site_scopes(site_ids):
+    """
+    {site_id: [site, company, location and country scopes]} of the sites
+    that exist, from cached (company, location) and location -> country
+    mappings; each mapping is re-read only after its site or location was
+    bumped.
+    """
+    site_ids = list(dict.fromkeys(site_ids))
+    site_keys = dict(zip(site_ids, make_keys("site-meta", [(pk, [("site", pk)]) for pk in site_ids])))
+    found = cache.get_many(list(site_keys.values()))
+    meta = {pk: found[key] for pk, key in site_keys.items() if key in found}
+    missing = [pk for pk in site_ids if pk not in meta]
+    if missing:
+        loaded = {pk: (company_id, location_id) for pk, company_id, location_id in (
+            Site.objects.filter(pk__in=missing).values_list("pk", "company_id", "location_id")
+        )}
+        cache.set_many({site_keys[pk]: value for pk, value in loaded.items()}, DEFAULT_TIMEOUT)
+        meta.update(loaded)
+
+    location_ids = list(dict.fromkeys(location_id for _, location_id in meta.values()))
+    location_keys = dict(zip(
+        location_ids, make_keys("location-meta", [(pk, [("location", pk)]) for pk in location_ids]),
+    ))
+    found = cache.get_many(list(location_keys.values()))
+    countries = {pk: found[key] for pk, key in location_keys.items() if key in found}
+    missing = [pk for pk in location_ids if pk not in countries]
+    if missing:
+        loaded = dict(Location.objects.filter(pk__in=missing).values_list("pk", "region__country_id"))
+        cache.set_many({location_keys[pk]: value for pk, value in loaded.items()}, DEFAULT_TIMEOUT)
+        countries.update(loaded)
+
+    return {
+        pk: [("site", pk), ("company", company_id), ("location", location_id), ("country", countries.get(location_id))]
+        for pk, (company_id, location_id) in meta.items()
+    }
+
+
+def cached_resolved_hours(site_ids, start, end):
+    """
+    resolve_hours for the given sites and dates, each site's span cached
+    on its own; only the sites missing from the cache are resolved, in one
+    pass. Keys of unknown sites are left out.
+    """
+    # hours do not depend on the company
+    scopes = {
+        pk: [scope for scope in site if scope[0] != "company"] for pk, site in site_scopes(site_ids).items()
+    }
+    keys = dict(zip(scopes, make_keys("hours", [((pk, start, end), site) for pk, site in scopes.items()])))
+    found = cache.get_many(list(keys.values()))
+    resolved = {}
+    missing = []
+    for pk, key in keys.items():
+        if key in found:
+            resolved.update(((pk, day), hours) for day, hours in found[key])
+        else:
+            missing.append(pk)
+    if missing:
+        fresh = resolve_hours(missing, start, end)
+        spans = {pk: [] for pk in missing}
+        for (pk, day), hours in fresh.items():
+            spans[pk].append((day, hours))
+        cache.set_many({keys[pk]: span for pk, span in spans.items()}, DEFAULT_TIMEOUT)
+        resolved.update(fresh)
+    return resolved
@@ -0,0 +1,408 @@
+import csv
+import zoneinfo
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+from django.conf import settings
+from django.db import transaction
+from ..models import Country, Region, Site, SiteException, PublicHoliday
+from .changes import exceptions_changed, holidays_changed
+from .importing import MAX_ERRORS, ImportFailed, ImportRowError
+from .search import normalize
+
+DEFAULT_BATCH_SIZE = 1000
+
+ImportReport = namedtuple("ImportReport", "rows written")
+
+
+class CalendarImportError(ImportFailed):
+    """
+    Calendar rows that could not be imported; nothing was written.
+    """
+
+
+# -----------------------
+# Parsing
+# -----------------------
+def parse_date(value):
+    """
+    YYYY-MM-DD, DD.MM.YYYY or the ICS form YYYYMMDD.
+    """
+    value = (value or "").strip()
+    if len(value) == 10 and value[4] == "-":
+        try:
+            return date.fromisoformat(value)  # the common case, without strptime
+        except ValueError:
+            pass
+    for pattern in ("%d.%m.%Y", "%Y%m%d"):
+        try:
+            return datetime.strptime(value, pattern).date()
+        except ValueError:
+            pass
+    raise ImportRowError(f"invalid date {value!r}")
+
+
+def parse_time(value):
+    """
+    HH:MM, or None for an empty value.
+    """
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return time.fromisoformat(value)
+    except ValueError:
+        raise ImportRowError(f"invalid time {value!r}")
+
+
+def read_csv(f, delimiter=","):
+    """
+    Yields (line number, {column: value}) per data row of a CSV file.
+    """
+    reader = csv.DictReader(f, delimiter=delimiter)
+    for row in reader:
+        yield reader.line_num, {key.strip().lower(): (value or "").strip() for key, value in row.items() if key}
+
+
+def _unfold(f):
+    """
+    Yields (line number, logical line) of an ICS file, joining folded lines.
+    """
+    start, pending = None, None
+    for number, line in enumerate(f, start=1):
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield start, pending
+        start, pending = number, line
+    if pending:
+        yield start, pending
+
+
+def _unescape(text):
+    return (
+        text.replace("\\n", "\n").replace("\\N", "\n")
+        .replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\")
+    )
+
+
+def _ics_moment(value, params):
+    """
+    A DTSTART/DTEND value as a date (all-day) or a naive local datetime.
+    """
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return parse_date(value)
+    try:
+        moment = datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S")
+    except ValueError:
+        raise ImportRowError(f"invalid date-time {value!r}")
+    if value.endswith("Z"):
+        zone = zoneinfo.ZoneInfo(settings.TIME_ZONE)
+        moment = moment.replace(tzinfo=zoneinfo.ZoneInfo("UTC")).astimezone(zone).replace(tzinfo=None)
+    return moment
+
+
+def read_ics(f):
+    """
+    Yields (line number, {"date", "open_time", "close_time", "summary"}) per
+    day of each VEVENT in an ICS file, one event at a time.
+
+    All-day events cover DTSTART up to the day before DTEND (one day
+    without DTEND) and yield closed days; timed events yield their start
+    day with the event's start and end as special opening hours.
+    """
+    event = None
+    for number, line in _unfold(f):
+        if line == "BEGIN:VEVENT":
+            event = {"line": number}
+        elif line == "END:VEVENT" and event is not None:
+            yield from _event_days(event)
+            event = None
+        elif event is not None and ":" in line:
+            head, value = line.split(":", 1)
+            name, *params = head.split(";")
+            event[name.upper()] = (value, dict(param.split("=", 1) for param in params if "=" in param))
+
+
+def _event_days(event):
+    line = event["line"]
+    if "DTSTART" not in event:
+        yield line, ImportRowError("event without DTSTART")
+        return
+    if "RRULE" in event:
+        yield line, ImportRowError("recurring events are not supported; list each date")
+        return
+    summary = _unescape(event.get("SUMMARY", ("", {}))[0]).strip()
+    try:
+        start = _ics_moment(*event["DTSTART"])
+        end = _ics_moment(*event["DTEND"]) if "DTEND" in event else None
+    except ImportRowError as e:
+        yield line, e
+        return
+    if isinstance(start, datetime):
+        close = end.time() if isinstance(end, datetime) else None
+        yield line, {"date": start.date(), "open_time": start.time(), "close_time": close, "summary": summary}
+        return
+    if isinstance(end, datetime):
+        end = end.date()
+    days = max(1, (end - start).days) if end else 1
+    for n in range(days):
+        yield line, {"date": start + timedelta(days=n), "open_time": None, "close_time": None, "summary": summary}
+
+
+def sniff_format(name, head):
+    """
+    "ics" or "csv", from the file name or else its first line.
+    """
+    name = (name or "").lower()
+    if name.endswith((".ics", ".ical")):
+        return "ics"
+    if name.endswith(".csv"):
+        return "csv"
+    return "ics" if head.lstrip("\ufeff").startswith("BEGIN:VCALENDAR") else "csv"
+
+
+# -----------------------
+# Importers: rows -> (unique key, unsaved instance)
+# -----------------------
+def _date(value):
+    return value if isinstance(value, date) else parse_date(value)
+
+
+def _time(value):
+    return value if isinstance(value, time) or value is None else parse_time(value)
+
+
+class Importer:
+    """
+    Turns parsed rows into unsaved instances keyed by the model's unique
+    fields, and upserts them.
+    """
+    model = None
+    unique_fields = []
+    update_fields = []
+
+    def write(self, batch, batch_size):
+        self.model.objects.bulk_create(
+            batch, batch_size=batch_size,
+            update_conflicts=True, unique_fields=self.unique_fields, update_fields=self.update_fields,
+        )
+
+
+class SiteMatcher:
+    """
+    Finds the site a row names, by its site_id column or by its company,
+    location and name (the site's name, may be empty) columns, compared
+    normalised. All sites are read in one query up front.
+    """
+    def __init__(self):
+        self.site_ids = set()
+        self.by_name = {}
+        for pk, company, location, name in Site.objects.values_list(
+            "pk", "company__name", "location__name", "name"
+        ).iterator(chunk_size=10000):
+            self.site_ids.add(pk)
+            key = (normalize(company or ""), normalize(location), normalize(name or ""))
+            self.by_name.setdefault(key, []).append(pk)
+
+    def names_site(self, fields):
+        return bool(fields.get("site_id") or fields.get("company") or fields.get("location"))
+
+    def site_id(self, fields):
+        if fields.get("site_id"):
+            try:
+                site_id = int(fields["site_id"])
+            except ValueError:
+                raise ImportRowError(f"invalid site_id {fields['site_id']!r}")
+            if site_id not in self.site_ids:
+                raise ImportRowError(f"unknown site {site_id}")
+            return site_id
+        names = [fields.get(column, "") for column in ("company", "location", "name")]
+        matches = self.by_name.get(tuple(normalize(name) for name in names), [])
+        if len(matches) != 1:
+            raise ImportRowError(f"{'ambiguous' if matches else 'unknown'} site {' / '.join(names)!r}")
+        return matches[0]
+
+
+class ExceptionImporter(Importer):
+    """
+    SiteException rows. CSV columns: site_id, or company, location and name
+    (see SiteMatcher); date; open_time and close_time (empty for closed);
+    reason. Rows naming no site go to the given one.
+    """
+    model = SiteException
+    unique_fields = ["site", "date"]
+    update_fields = ["open_time", "close_time", "reason"]
+
+    def __init__(self, site=None):
+        # one query for the whole file
+        self.sites = SiteMatcher()
+        self.site = getattr(site, "pk", site)
+        if self.site is not None and self.site not in self.sites.site_ids:
+            raise CalendarImportError([f"unknown site {self.site}"])
+        self.changed = {}
+
+    def _site_id(self, fields):
+        if self.sites.names_site(fields):
+            return self.sites.site_id(fields)
+        if self.site is not None:
+            return self.site
+        raise ImportRowError("no site_id or company/location/name, and no site given for the file")
+
+    def instance(self, fields):
+        day = _date(fields.get("date"))
+        open_time, close_time = _time(fields.get("open_time")), _time(fields.get("close_time"))
+        if (open_time is None) != (close_time is None):
+            raise ImportRowError("give both open_time and close_time, or neither for a closed day")
+        reason = fields.get("reason") or fields.get("summary") or None
+        site_id = self._site_id(fields)
+        self.changed.setdefault(site_id, set()).add(day)
+        return (site_id, day), SiteException(
+            site_id=site_id, date=day, open_time=open_time, close_time=close_time,
+            reason=reason[:200] if reason else None,
+        )
+
+    def finish(self):
+        exceptions_changed(self.changed)
+
+
+class HolidayImporter(Importer):
+    """
+    PublicHoliday rows. CSV columns: country (code), region (name, empty
+    for a country-wide holiday), date, name. Rows without these columns
+    (ICS events) go to the given country and region.
+    """
+    model = PublicHoliday
+    unique_fields = ["country", "region", "date"]
+    update_fields = ["name"]
+
+    def __init__(self, country=None, region=None):
+        self.countries = {code.upper(): pk for pk, code in Country.objects.values_list("pk", "code") if code}
+        self.regions = {}
+        for pk, country_id, name in Region.objects.values_list("pk", "country_id", "name"):
+            self.regions.setdefault((country_id, normalize(name)), []).append(pk)
+        self.country = self.region = None
+        try:
+            if country is not None:
+                self.country = self._country_id(getattr(country, "code", country))
+            if region is not None:
+                if self.country is None:
+                    raise ImportRowError("a region needs its country")
+                self.region = self._region_id(self.country, getattr(region, "name", region))
+        except ImportRowError as e:
+            raise CalendarImportError([str(e)])
+        self.changed = {}
+
+    def _country_id(self, code):
+        try:
+            return self.countries[(code or "").strip().upper()]
+        except KeyError:
+            raise ImportRowError(f"unknown country {code!r}")
+
+    def _region_id(self, country_id, name):
+        matches = self.regions.get((country_id, normalize(name)), [])
+        if len(matches) != 1:
+            raise ImportRowError(f"{'ambiguous' if matches else 'unknown'} region {name!r}")
+        return matches[0]
+
+    def instance(self, fields):
+        day = _date(fields.get("date"))
+        if fields.get("country"):
+            country_id = self._country_id(fields["country"])
+        elif self.country is not None:
+            country_id = self.country
+        else:
+            raise ImportRowError("no country, and no country given for the file")
+        if "region" in fields:
+            region_id = self._region_id(country_id, fields["region"]) if fields["region"] else None
+        else:
+            region_id = self.region if country_id == self.country else None
+        name = fields.get("name") or fields.get("summary")
+        if not name:
+            raise ImportRowError("holiday without a name")
+        self.changed.setdefault(country_id, set()).add(day)
+        return (country_id, region_id, day), PublicHoliday(
+            country_id=country_id, region_id=region_id, date=day, name=name[:200],
+        )
+
+    def write(self, batch, batch_size):
+        """
+        Country-wide rows are matched against existing ones here: their
+        NULL region never conflicts in the unique index.
+        """
+        country_wide = [holiday for holiday in batch if holiday.region_id is None]
+        if country_wide:
+            existing = {
+                (country_id, day): pk for pk, country_id, day in PublicHoliday.objects.filter(
+                    region__isnull=True,
+                    country_id__in={holiday.country_id for holiday in country_wide},
+                    date__in={holiday.date for holiday in country_wide},
+                ).values_list("pk", "country_id", "date")
+            }
+            updates = []
+            for holiday in country_wide:
+                holiday.pk = existing.get((holiday.country_id, holiday.date))
+                if holiday.pk is not None:
+                    updates.append(holiday)
+            PublicHoliday.objects.bulk_update(updates, ["name"], batch_size=batch_size)
+            batch = [holiday for holiday in batch if holiday.pk is None]
+        super().write(batch, batch_size)
+
+    def finish(self):
+        holidays_changed(self.changed)
+
+
+IMPORTERS = {"exceptions": ExceptionImporter, "holidays": HolidayImporter}
+
+
+# -----------------------
+# Import
+# -----------------------
+def import_calendar(f, kind, file_format="csv", delimiter=",", batch_size=DEFAULT_BATCH_SIZE, **target):
+    """
+    Imports SiteException ("exceptions") or PublicHoliday ("holidays") rows
+    from the text file f (CSV or ICS) in one transaction. Rows are parsed
+    as they are read and upserted batch_size at a time on the models'
+    unique keys, so an existing exception or holiday of the same day is
+    overwritten. Sites, countries and regions are resolved from lookup
+    tables read once. target is site=... for exceptions, or country=...
+    and region=... for holidays, for rows that name none themselves.
+
+    Raises CalendarImportError, with nothing written, if any row is bad.
+    Returns an ImportReport.
+    """
+    rows = read_ics(f) if file_format == "ics" else read_csv(f, delimiter=delimiter)
+    errors = []
+    rows_read = written = 0
+    with transaction.atomic():
+        importer = IMPORTERS[kind](**target)
+        batch = {}
+        for line, fields in rows:
+            rows_read += 1
+            try:
+                if isinstance(fields, ImportRowError):
+                    raise fields
+                key, instance = importer.instance(fields)
+            except ImportRowError as e:
+                errors.append(f"line {line}: {e}")
+                if len(errors) >= MAX_ERRORS:
+                    break
+                continue
+            if errors:
+                continue  # the import fails; only look for more errors
+            # the last row for a key wins, also within a batch
+            batch.pop(key, None)
+            batch[key] = instance
+            if len(batch) >= batch_size:
+                importer.write(list(batch.values()), batch_size)
+                written += len(batch)
+                batch = {}
+        if errors:
+            raise CalendarImportError(errors)
+        if batch:
+            importer.write(list(batch.values()), batch_size)
+            written += len(batch)
+        # bulk writes send no signals
+        importer.finish()
+    return ImportReport(rows_read, written)
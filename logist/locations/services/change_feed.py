@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import weakref
+from bisect import bisect_right
+from collections import deque
+from django.utils import timezone
+from ..models import Site
+from .changes import COMMIT_DELAY
+
+# Seconds between two polls of the shared poller
+POLL_INTERVAL = 1.0
+
+# A change is published once its updated_at is this old: writers bump
+# updated_at again when their transaction commits (changes.touch_on_commit),
+# and that bump is committed within COMMIT_DELAY
+SETTLE = COMMIT_DELAY
+
+# Changes kept in memory; older cursors are answered from the database
+BUFFER_SIZE = 10000
+
+
+class _LoopState:
+    """
+    A ChangeFeed's poller task and waiters on one event loop.
+    """
+    def __init__(self):
+        self.task = None
+        self.waiters = 0
+        self.published = asyncio.Event()
+
+    def wake(self):
+        # runs on the state's own loop; waiters hold on to the old event
+        self.published.set()
+        self.published = asyncio.Event()
+
+
+class ChangeFeed:
+    """
+    Site changes (bumps of Site.updated_at: edits, hours, exceptions,
+    company and location renames) for long-poll and server-sent-event
+    clients, from one poller per event loop.
+
+    The poller runs while clients wait. Each poll reads the sites changed
+    since the previous one in a single async query, appends them to a
+    bounded buffer and wakes every waiter, so thousands of idle clients
+    cost one query per POLL_INTERVAL rather than one each.
+
+    The buffer is shared by all event loops of the process (one per
+    request under WSGI or async_to_sync, one in all under ASGI) and
+    guarded by a lock; a poll on any loop wakes the waiters of all of them
+    through call_soon_threadsafe, and a loop's poller and waiters are
+    dropped along with the loop.
+
+    Cursors are datetimes: a client passes the cursor of its last answer
+    and gets the changes after it. Deleted sites are not reported.
+    """
+
+    def __init__(self, interval=POLL_INTERVAL, settle=SETTLE, buffer_size=BUFFER_SIZE):
+        self.interval = interval
+        self.settle = settle
+        self._lock = threading.Lock()
+        self._changes = deque(maxlen=buffer_size)  # (updated_at, site_id), ascending
+        self._horizon = None  # changes up to here are published
+        self._floor = None  # ... and all those after it are in the buffer
+        self._loops = weakref.WeakKeyDictionary()  # event loop: _LoopState
+
+    def reset(self):
+        with self._lock:
+            loops = list(self._loops.items())
+            self._loops = weakref.WeakKeyDictionary()
+            self._changes = deque(maxlen=self._changes.maxlen)
+            self._horizon = self._floor = None
+        for loop, state in loops:
+            if state.task is not None and not loop.is_closed():
+                try:
+                    loop.call_soon_threadsafe(state.task.cancel)
+                except RuntimeError:  # closed meanwhile
+                    pass
+
+    def _state(self):
+        """
+        This loop's state, with its poller running.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._loops.get(loop)
+            if state is None:
+                state = self._loops[loop] = _LoopState()
+            if self._horizon is None:
+                self._horizon = self._floor = timezone.now() - self.settle
+        if state.task is None or state.task.done():
+            state.task = loop.create_task(self._run(state))
+        return state
+
+    async def _run(self, state):
+        while state.waiters:
+            await self.poll()
+            await asyncio.sleep(self.interval)
+
+    async def poll(self):
+        """
+        Publishes the changes between the last horizon and now - settle.
+        """
+        with self._lock:
+            since = self._horizon
+        horizon = timezone.now() - self.settle
+        if since is None or horizon <= since:
+            return
+        rows = [
+            row async for row in Site.objects.filter(updated_at__gt=since, updated_at__lte=horizon)
+            .order_by("updated_at", "pk").values_list("updated_at", "pk")
+        ]
+        with self._lock:
+            if self._horizon != since:
+                return  # another loop's poller published this span already
+            overflow = len(self._changes) + len(rows) - self._changes.maxlen
+            if overflow > 0:
+                # the newest change pushed out of the buffer
+                self._floor = (list(self._changes) + rows)[overflow - 1][0]
+            self._changes.extend(rows)
+            self._horizon = horizon
+            loops = list(self._loops.items())
+        for loop, state in loops:
+            if not loop.is_closed():
+                try:
+                    loop.call_soon_threadsafe(state.wake)
+                except RuntimeError:  # closed meanwhile
+                    pass
+
+    async def _since(self, cursor):
+        """
+        [(updated_at, site_id), ...] published after cursor.
+        """
+        with self._lock:
+            horizon = self._horizon
+            if cursor >= self._floor:
+                changes = list(self._changes)
+                return changes[bisect_right(changes, (cursor, float("inf"))):]
+        return [
+            row async for row in Site.objects.filter(updated_at__gt=cursor, updated_at__lte=horizon)
+            .order_by("updated_at", "pk").values_list("updated_at", "pk")
+        ]
+
+    async def wait(self, cursor=None, timeout=25):
+        """
+        Waits up to timeout seconds for changes after cursor (default: now)
+        and returns (changes, next cursor). With nothing new the list is
+        empty and the cursor still moves on to the current horizon.
+        """
+        state = self._state()
+        state.waiters += 1
+        loop = asyncio.get_running_loop()
+        try:
+            if cursor is None:
+                cursor = self._horizon
+            deadline = loop.time() + timeout
+            while True:
+                # taken before looking, so a publication in between is not missed
+                published = state.published
+                horizon = self._horizon
+                changes = await self._since(cursor) if cursor < horizon else []
+                remaining = deadline - loop.time()
+                if changes or remaining <= 0:
+                    return changes, max(cursor, horizon)
+                try:
+                    await asyncio.wait_for(published.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            state.waiters -= 1
+
+
+change_feed = ChangeFeed()
@@ -0,0 +1,105 @@
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from ..models import Site
+
+# Site.updated_at bumps are committed within this delay of their time (see
+# touch_on_commit); readers following updated_at look back this far
+COMMIT_DELAY = timedelta(seconds=2)
+
+
+def touch_on_commit(queryset):
+    """
+    Bumps updated_at of the sites of queryset again when the current
+    transaction commits. Readers following updated_at (the change feed,
+    incremental exports) see a row only once it is committed, by when a
+    bump made early in a long transaction (an import materializing day
+    schedules) is long past their horizon; the second bump commits right
+    away. Outside a transaction there is nothing to do.
+    """
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: queryset.update(updated_at=timezone.now()))
+
+
+def touch_sites(**lookups):
+    """
+    Bumps Site.updated_at for the sites matching lookups, e.g.
+    touch_sites(pk=1) or touch_sites(company__group_id=3).
+
+    Used when something a site exports (hours, company, location) changes
+    without the Site row itself being saved.
+    """
+    sites = Site.objects.filter(**lookups)
+    touch_on_commit(sites)
+    return sites.update(updated_at=timezone.now())
+
+
+def sites_changed(site_ids):
+    """
+    Drops the in-memory state and shared cache entries of sites written
+    without model signals (bulk_create, bulk_update, queryset.update).
+    """
+    from .availability import availability_index
+    from .caching import bump
+    from .geo import spatial_index
+    from .schedule import invalidate_schedule
+    from .search import search_index
+    from .today import today_cache
+
+    for site_id in site_ids:
+        invalidate_schedule(site_id)
+        availability_index.invalidate_site(site_id)
+        spatial_index.invalidate_site(site_id)
+        search_index.invalidate_document("site", site_id)
+    today_cache.invalidate()
+    bump(*[("site", site_id) for site_id in site_ids])
+
+
+def exceptions_changed(days_by_site):
+    """
+    What the SiteException signals do, for exceptions written in bulk:
+    days_by_site is {site_id: {date, ...}} of the rows written.
+    """
+    from . import day_schedule
+    from .availability import availability_index
+
+    if not days_by_site:
+        return
+    touch_sites(pk__in=list(days_by_site))
+    availability_index.invalidate_exceptions()
+    sites_changed(days_by_site)
+    # one pass over the union of the dates; rows of unchanged days are rewritten as they were
+    day_schedule.materialize(list(days_by_site), days=set().union(*days_by_site.values()))
+
+
+def holidays_changed(days_by_country):
+    """
+    What the PublicHoliday signals do, for holidays written in bulk:
+    days_by_country is {country_id: {date, ...}} of the rows written.
+    """
+    from . import day_schedule
+    from .caching import bump
+    from .holidays import holiday_index
+    from .today import today_cache
+
+    holiday_index.invalidate()
+    today_cache.invalidate()
+    bump(*[("country", country_id) for country_id in days_by_country])
+    for country_id, days in days_by_country.items():
+        day_schedule.materialize(Site.objects.filter(location__region__country_id=country_id), days=days)
+
+
+def hours_changed(weekdays_by_site):
+    """
+    What the DefaultHours signals do, for weekly hours written in bulk:
+    weekdays_by_site is {site_id: {weekday, ...}} of the rows written.
+    """
+    from . import day_schedule
+    from .schedule import store_hours
+
+    if not weekdays_by_site:
+        return
+    store_hours(list(weekdays_by_site))  # also bumps updated_at
+    sites_changed(weekdays_by_site)
+    # only the dates of the changed weekdays
+    day_schedule.materialize_weekdays(weekdays_by_site)
@@ -0,0 +1,185 @@
+from datetime import date, timedelta
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Max, Q, QuerySet
+from django.utils import timezone
+from ..models import Site, SiteDaySchedule
+from .opening_hours import resolve_hours, resolve_sourced_hours
+
+# Days materialized from today on
+WINDOW_DAYS = 365
+
+# Sites resolved per round trip
+DEFAULT_BATCH_SIZE = 500
+
+
+def window(today=None):
+    """
+    The materialized (start, end) dates, both inclusive.
+    """
+    today = today or timezone.localdate()
+    return today, today + timedelta(days=WINDOW_DAYS - 1)
+
+
+def _site_id_batches(sites, batch_size):
+    if sites is None:
+        sites = Site.objects.all()
+    if isinstance(sites, QuerySet):
+        ids = list(sites.order_by("pk").values_list("pk", flat=True))
+    else:
+        ids = [getattr(site, "pk", site) for site in sites]
+    for n in range(0, len(ids), batch_size):
+        yield ids[n:n + batch_size]
+
+
+def materialize(sites=None, start=None, end=None, days=None, batch_size=DEFAULT_BATCH_SIZE, today=None):
+    """
+    Regenerates the SiteDaySchedule rows of sites (a queryset, instances or
+    ids; None for all) from start to end, clipped to the window. With days,
+    only those dates are regenerated. Returns the number of rows written.
+    """
+    window_start, window_end = window(today)
+    if days is not None:
+        days = {day for day in days if window_start <= day <= window_end}
+        if not days:
+            return 0
+        start, end = min(days), max(days)
+    else:
+        start = max(start or window_start, window_start)
+        end = min(end or window_end, window_end)
+        if end < start:
+            return 0
+
+    written = 0
+    for site_ids in _site_id_batches(sites, batch_size):
+        rows = [
+            SiteDaySchedule(site_id=site_id, date=day, open_time=open_time, close_time=close_time, source=source)
+            for (site_id, day), (open_time, close_time, source) in resolve_sourced_hours(
+                site_ids, start, end, days
+            ).items()
+        ]
+        stale = SiteDaySchedule.objects.filter(site_id__in=site_ids)
+        stale = stale.filter(date__range=(start, end)) if days is None else stale.filter(date__in=days)
+        with transaction.atomic():
+            stale.delete()
+            SiteDaySchedule.objects.bulk_create(rows, batch_size=batch_size)
+        written += len(rows)
+    return written
+
+
+def materialize_weekdays(weekdays_by_site, batch_size=DEFAULT_BATCH_SIZE, today=None):
+    """
+    Regenerates only the window's dates that fall on the given weekdays of
+    each site ({site_id: {weekday, ...}}, Monday 0), after their weekly
+    hours changed: one resolve pass, one delete and one insert per batch of
+    sites. Returns the number of rows written.
+    """
+    start, end = window(today)
+    all_days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+    site_ids = [site_id for site_id, weekdays in weekdays_by_site.items() if weekdays]
+    written = 0
+    for n in range(0, len(site_ids), batch_size):
+        batch = site_ids[n:n + batch_size]
+        by_weekdays = {}
+        for site_id in batch:
+            by_weekdays.setdefault(frozenset(weekdays_by_site[site_id]), []).append(site_id)
+        weekdays = frozenset().union(*by_weekdays)
+        rows = [
+            SiteDaySchedule(site_id=site_id, date=day, open_time=open_time, close_time=close_time, source=source)
+            for (site_id, day), (open_time, close_time, source) in resolve_sourced_hours(
+                batch, start, end, {day for day in all_days if day.weekday() in weekdays}
+            ).items()
+            if day.weekday() in weekdays_by_site[site_id]
+        ]
+        stale = Q()
+        for site_weekdays, ids in by_weekdays.items():
+            # iso_week_day counts from Monday 1
+            stale |= Q(site_id__in=ids, date__iso_week_day__in=[weekday + 1 for weekday in site_weekdays])
+        with transaction.atomic():
+            SiteDaySchedule.objects.filter(stale, date__range=(start, end)).delete()
+            SiteDaySchedule.objects.bulk_create(rows, batch_size=batch_size)
+        written += len(rows)
+    return written
+
+
+def materialized_days(source, **lookups):
+    """
+    Dates that currently have rows from source, e.g. the holidays of a
+    country, which must be regenerated when a holiday moves or is deleted.
+    """
+    return set(
+        SiteDaySchedule.objects.filter(source=source, **lookups).order_by().values_list("date", flat=True).distinct()
+    )
+
+
+def extend(today=None, rebuild=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Drops rows before today and materializes the days the window gained
+    since the last run (all of it on the first run, or with rebuild).
+    Run daily.
+    """
+    window_start, window_end = window(today)
+    SiteDaySchedule.objects.filter(date__lt=window_start).delete()
+    last = None if rebuild else SiteDaySchedule.objects.aggregate(last=Max("date"))["last"]
+    start = window_start if last is None else max(window_start, last + timedelta(days=1))
+    return materialize(start=start, end=window_end, batch_size=batch_size, today=today)
+
+
+# -----------------------
+# Lookups
+# -----------------------
+def _resolved(site, day):
+    return resolve_hours([site], day, day).get((getattr(site, "pk", site), day), (None, None))
+
+
+def hours_on(site, day: date):
+    """
+    (open_time, close_time) of site on day, or (None, None) when closed;
+    one indexed lookup inside the window, resolve_hours outside it and for
+    days not materialized yet (new sites, the time before the first
+    materialize_hours run, or while it lags behind).
+    """
+    window_start, window_end = window()
+    if not window_start <= day <= window_end:
+        return _resolved(site, day)
+    row = (
+        SiteDaySchedule.objects.filter(site=site, date=day)
+        .values_list("open_time", "close_time").first()
+    )
+    if row is None:
+        return _resolved(site, day)
+    return row if row[0] and row[1] else (None, None)
+
+
+async def ahours_on(site, day: date):
+    """
+    hours_on for async views: the same lookup on the async ORM.
+    """
+    window_start, window_end = window()
+    if not window_start <= day <= window_end:
+        return await sync_to_async(hours_on)(site, day)
+    row = await (
+        SiteDaySchedule.objects.filter(site=site, date=day)
+        .values_list("open_time", "close_time").afirst()
+    )
+    if row is None:
+        return await sync_to_async(_resolved)(site, day)
+    return row if row[0] and row[1] else (None, None)
+
+
+def open_site_ids_on(day: date):
+    """
+    Ids of the sites open at some point of day (inside the window); sites
+    without a row for the day (created since the last materialize_hours
+    run, or all of them before the first) are resolved with resolve_hours.
+    """
+    rows = SiteDaySchedule.objects.filter(date=day)
+    site_ids = set(
+        rows.filter(open_time__isnull=False, close_time__isnull=False).values_list("site_id", flat=True)
+    )
+    missing = list(Site.objects.exclude(pk__in=rows.values("site_id")).values_list("pk", flat=True))
+    if missing:
+        site_ids.update(
+            site_id for (site_id, _), (open_time, close_time) in resolve_hours(missing, day, day).items() if open_time
+        )
+    return site_ids
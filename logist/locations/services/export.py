@@ -0,0 +1,457 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from django.utils import timezone
+from ..models import Site
+from .changes import COMMIT_DELAY
+
+try:
+    import msgpack
+except ImportError:  # optional; only needed for the binary compact format
+    msgpack = None
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def export_queryset():
+    """
+    Sites in export order (company, location), with everything a record
+    needs fetched alongside: company, group and location. Hours are stored
+    on the site row.
+    """
+    return (
+        Site.objects
+        .select_related("company__group", "location")
+        .order_by("company__name", "location__name", "pk")
+    )
+
+
+def site_record(site):
+    """
+    The exported JSON record of a site, e.g.
+    {"id": ..., "company": ..., "name": "<group or company> - <location> - <site>", ...}
+
+    id is the stable key sync_stations matches edited records by; name is
+    for display only.
+    """
+    company = site.company
+    parts = []
+    if company is not None:
+        parts.append(company.group.name if company.group else company.name)
+    parts.append(site.location.name)
+    if site.name:
+        parts.append(site.name)
+    return {
+        "id": site.pk,
+        "company": company.name if company is not None else "",
+        "name": " - ".join(parts),
+        "address": site.address,
+        "maps_link": site.maps_link or "",
+        "phone": site.phone,
+        "hours": site.hours_display,
+    }
+
+
+def iter_records(queryset=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields export records, streaming sites from the database chunk by chunk.
+    """
+    if queryset is None:
+        queryset = export_queryset()
+    for site in queryset.iterator(chunk_size=chunk_size):
+        yield site_record(site)
+
+
+def write_json(records, fp, indent=2):
+    """
+    Writes records to fp as a JSON array, one record at a time.
+
+    The output is identical to json.dump(list(records), fp, indent=indent,
+    ensure_ascii=False) without holding the list in memory. Returns the
+    number of records written.
+    """
+    count = 0
+    pretty = indent is not None
+    pad = " " * indent if pretty else ""
+    newline = "\n" if pretty else ""
+    separator = "," if pretty else ", "
+    fp.write("[")
+    for record in records:
+        text = json.dumps(record, ensure_ascii=False, indent=indent)
+        if pretty:
+            text = text.replace("\n", "\n" + pad)
+        fp.write((separator if count else "") + newline + pad + text)
+        count += 1
+    fp.write(newline + "]" if count else "]")
+    return count
+
+
+# -----------------------
+# Incremental export
+# -----------------------
+MANIFEST_VERSION = 1
+
+
+class ExportReport:
+    """
+    What an incremental export did, as lists of site ids.
+    """
+    def __init__(self, full=False):
+        self.full = full
+        self.added = []
+        self.changed = []
+        self.removed = []
+        self.unchanged = 0
+
+    @property
+    def rewritten(self):
+        return self.full or bool(self.added or self.changed or self.removed)
+
+    def __str__(self):
+        mode = "full export" if self.full else "incremental export"
+        return (
+            f"{mode}: {len(self.added)} added, {len(self.changed)} changed, "
+            f"{len(self.removed)} removed, {self.unchanged} unchanged"
+        )
+
+
+def record_hash(record):
+    payload = json.dumps(record, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def default_manifest_path(path):
+    path = Path(path)
+    return path.with_name(path.name + ".manifest.json")
+
+
+def _atomic_write(path, write, binary=False):
+    """
+    Calls write(f) on a temporary file next to path (opened as UTF-8 text,
+    or for bytes with binary), then renames it over path.
+    """
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with (os.fdopen(fd, "wb") if binary else os.fdopen(fd, "w", encoding="utf-8")) as f:
+            result = write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return result
+
+
+def _load_previous(path, manifest_path):
+    """
+    Returns (exported_at, {site_id: entry}) from the last run, or None if
+    there is no usable previous output.
+    """
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        with open(path, encoding="utf-8") as f:
+            records = json.load(f)
+    except (OSError, ValueError):
+        return None
+    entries = manifest.get("sites", [])
+    if manifest.get("version") != MANIFEST_VERSION or len(entries) != len(records):
+        return None
+    previous = {}
+    for entry, record in zip(entries, records):
+        site_id, digest, sort_key = entry
+        previous[site_id] = (tuple(sort_key), digest, record)
+    return datetime.fromisoformat(manifest["exported_at"]), previous
+
+
+def _entry(site, record):
+    """
+    (sort key, hash, record) in export_queryset order.
+    """
+    company = site.company.name if site.company is not None else ""
+    return (company, site.location.name), record_hash(record), record
+
+
+def export_incremental(path, manifest_path=None, chunk_size=DEFAULT_CHUNK_SIZE, indent=2):
+    """
+    Brings the JSON export at path up to date and returns an ExportReport.
+
+    A manifest next to the output keeps each site's content hash and the
+    time of the last run. Only sites whose updated_at moved since then
+    (less COMMIT_DELAY, see changes.touch_on_commit) are re-read and
+    re-hashed; removed sites are found by id. The output and
+    manifest are replaced atomically, and not at all if nothing changed.
+    Without a usable previous run, everything is exported.
+    """
+    path = Path(path)
+    manifest_path = Path(manifest_path) if manifest_path else default_manifest_path(path)
+    started_at = timezone.now()
+
+    previous = _load_previous(path, manifest_path)
+    if previous is None:
+        report = ExportReport(full=True)
+        entries = {}
+        for site in export_queryset().iterator(chunk_size=chunk_size):
+            entries[site.pk] = _entry(site, site_record(site))
+            report.added.append(site.pk)
+    else:
+        report = ExportReport()
+        exported_at, entries = previous
+        current_ids = set(Site.objects.values_list("pk", flat=True))
+        for site_id in set(entries) - current_ids:
+            del entries[site_id]
+            report.removed.append(site_id)
+        seen = set()
+        # bumps are committed up to COMMIT_DELAY after their time, so a site
+        # bumped just before the last run may have been invisible to it;
+        # re-reading it is harmless, the hashes drop it if unchanged
+        since = exported_at - COMMIT_DELAY
+        for site in export_queryset().filter(updated_at__gte=since).iterator(chunk_size=chunk_size):
+            entry = _entry(site, site_record(site))
+            old = entries.get(site.pk)
+            if old is None:
+                report.added.append(site.pk)
+            elif old[:2] != entry[:2]:
+                report.changed.append(site.pk)
+            else:
+                continue
+            entries[site.pk] = entry
+            seen.add(site.pk)
+        report.unchanged = len(entries) - len(seen)
+
+    ordered = sorted(entries.items(), key=lambda item: (item[1][0], item[0]))
+    if report.rewritten:
+        _atomic_write(path, lambda f: write_json((record for _, (_, _, record) in ordered), f, indent=indent))
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "exported_at": started_at.isoformat(),
+        "sites": [[site_id, digest, list(sort_key)] for site_id, (sort_key, digest, _) in ordered],
+    }
+    _atomic_write(manifest_path, lambda f: json.dump(manifest, f))
+    return report
+
+
+# -----------------------
+# Sharded export
+# -----------------------
+SHARD_MANIFEST_VERSION = 1
+
+
+class ShardReport:
+    """
+    What a sharded export did, as lists of shard file names.
+    """
+    def __init__(self):
+        self.written = []
+        self.unchanged = []
+        self.removed = []
+
+    def __str__(self):
+        return (
+            f"sharded export: {len(self.written)} shards written, "
+            f"{len(self.unchanged)} unchanged, {len(self.removed)} removed"
+        )
+
+
+def _render_shard(records):
+    out = io.StringIO()
+    write_json(records, out, indent=None)
+    text = out.getvalue()
+    return text, hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def export_shards(directory, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Writes the export as one JSON shard per company (companies/<id>.json)
+    and per region (regions/<id>.json) under directory, plus manifest.json
+    listing every shard with its name, record count and content hash, for
+    clients that load shards on demand.
+
+    A shard file is only replaced when its content changed, so an edit
+    invalidates the cached copies of the shards holding the edited site and
+    nothing else. Shards of companies or regions without sites are removed.
+    Returns a ShardReport.
+    """
+    directory = Path(directory)
+    queryset = export_queryset().select_related("location__region__country")
+    companies, regions = {}, {}
+    for site in queryset.iterator(chunk_size=chunk_size):
+        record = site_record(site)
+        company = site.company
+        region = site.location.region
+        companies.setdefault(
+            site.company_id, (company.name if company is not None else "", [])
+        )[1].append(record)
+        regions.setdefault(
+            region.pk, (region.name, region.country.code, [])
+        )[2].append(record)
+
+    try:
+        with open(directory / "manifest.json", encoding="utf-8") as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+    if previous.get("version") != SHARD_MANIFEST_VERSION:
+        previous = {}
+    old_hashes = {
+        entry["file"]: entry["hash"]
+        for kind in ("companies", "regions") for entry in previous.get(kind, [])
+    }
+
+    report = ShardReport()
+
+    def write_shard(name, records):
+        text, digest = _render_shard(records)
+        path = directory / name
+        if old_hashes.get(name) == digest and path.exists():
+            report.unchanged.append(name)
+        else:
+            _atomic_write(path, lambda f: f.write(text))
+            report.written.append(name)
+        return digest
+
+    for subdirectory in ("companies", "regions"):
+        (directory / subdirectory).mkdir(parents=True, exist_ok=True)
+
+    manifest = {
+        "version": SHARD_MANIFEST_VERSION,
+        "exported_at": timezone.now().isoformat(),
+        "count": sum(len(records) for _, records in companies.values()),
+        "companies": [],
+        "regions": [],
+    }
+    # export order is by company name already
+    for company_id, (name, records) in companies.items():
+        file = f"companies/{company_id if company_id is not None else 'none'}.json"
+        manifest["companies"].append({
+            "id": company_id, "name": name, "file": file, "count": len(records), "hash": write_shard(file, records),
+        })
+    for region_id, (name, country, records) in sorted(regions.items(), key=lambda item: (item[1][1], item[1][0])):
+        file = f"regions/{region_id}.json"
+        manifest["regions"].append({
+            "id": region_id, "name": name, "country": country, "file": file,
+            "count": len(records), "hash": write_shard(file, records),
+        })
+
+    current = {entry["file"] for kind in ("companies", "regions") for entry in manifest[kind]}
+    for subdirectory in ("companies", "regions"):
+        for path in sorted((directory / subdirectory).glob("*.json")):
+            name = f"{subdirectory}/{path.name}"
+            if name not in current:
+                path.unlink()
+                report.removed.append(name)
+
+    _atomic_write(directory / "manifest.json", lambda f: json.dump(manifest, f, ensure_ascii=False, indent=2))
+    return report
+
+
+# -----------------------
+# Compact format
+# -----------------------
+COMPACT_VERSION = 2
+
+# Columns of a row in "sites"
+COMPACT_FIELDS = ["id", "company", "location", "name", "address", "maps_link", "phone", "hours"]
+
+
+def compact_export(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    The whole export as one dictionary-encoded document:
+
+    - groups: [name, ...]
+    - companies: [[name, group index or null], ...]
+    - locations: [name, ...]
+    - weeks: distinct weekly hours, each 7 entries (Monday first) of null
+      (unknown), [] (closed) or [[open, close], ...] in minutes after
+      midnight; close may exceed 1440 overnight (Site.hours_data)
+    - sites: one row of indexes and values per site, columns as in fields;
+      company is null for sites without one
+
+    Sites come in export order. Display names ("<group or company> -
+    <location> - <site>") and localised hours are left to the client.
+    """
+    groups, companies, locations, weeks = {}, {}, {}, {}
+
+    def index(table, key, value):
+        position = table.get(key)
+        if position is None:
+            position = table[key] = (len(table), value)
+        return position[0]
+
+    rows = []
+    for (
+        pk, company_id, company, group_id, group, location_id, location, name, address, maps_link, phone, hours
+    ) in export_queryset().values_list(
+        "pk", "company_id", "company__name", "company__group_id", "company__group__name",
+        "location_id", "location__name", "name", "address", "maps_link", "phone", "hours_data",
+    ).iterator(chunk_size=chunk_size):
+        company_index = None
+        if company_id is not None:
+            group_index = None if group_id is None else index(groups, group_id, group)
+            company_index = index(companies, company_id, [company, group_index])
+        week = json.dumps(hours, separators=(",", ":"))
+        rows.append([
+            pk, company_index, index(locations, location_id, location), name, address, maps_link, phone,
+            index(weeks, week, hours),
+        ])
+
+    def values(table):
+        return [value for _, value in table.values()]
+
+    return {
+        "version": COMPACT_VERSION,
+        "fields": COMPACT_FIELDS,
+        "groups": values(groups),
+        "companies": values(companies),
+        "locations": values(locations),
+        "weeks": values(weeks),
+        "sites": rows,
+    }
+
+
+def write_compact(document, fp):
+    """
+    Writes a compact_export document to the text file fp as minified JSON.
+    """
+    json.dump(document, fp, ensure_ascii=False, separators=(",", ":"))
+
+
+def write_compact_msgpack(document, fp):
+    """
+    Writes a compact_export document to the binary file fp as MessagePack.
+    Needs the optional msgpack package.
+    """
+    if msgpack is None:
+        raise RuntimeError("The msgpack package is not installed.")
+    fp.write(msgpack.packb(document, use_bin_type=True))
+
+
+def expand_compact(document):
+    """
+    The export records of a compact_export document, except that hours
+    stay structured (the inverse a client performs before rendering).
+    """
+    records = []
+    for pk, company_index, location_index, name, address, maps_link, phone, week_index in document["sites"]:
+        location = document["locations"][location_index]
+        company, parts = "", []
+        if company_index is not None:
+            company, group_index = document["companies"][company_index]
+            parts.append(company if group_index is None else document["groups"][group_index])
+        parts.append(location)
+        if name:
+            parts.append(name)
+        records.append({
+            "id": pk,
+            "company": company,
+            "name": " - ".join(parts),
+            "address": address,
+            "maps_link": maps_link or "",
+            "phone": phone,
+            "hours": document["weeks"][week_index],
+        })
+    return records
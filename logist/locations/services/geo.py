@@ -0,0 +1,174 @@
+import heapq
+from math import asin, cos, floor, radians, sin, sqrt
+from threading import RLock
+from ..models import Site
+from .availability import availability_index
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.19  # along a meridian
+CELL_DEGREES = 0.25  # about 28 x 18 km cells in Germany
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle (haversine) distance between two points in km.
+    """
+    lat1, lon1, lat2, lon2 = map(radians, (lat1, lon1, lat2, lon2))
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+
+def _cell(lat, lon):
+    return floor(lat / CELL_DEGREES), floor(lon / CELL_DEGREES)
+
+
+class SpatialIndex:
+    """
+    In-process geohash-style grid over the coordinates of all sites.
+
+    Sites are bucketed into CELL_DEGREES cells; a k-nearest query searches
+    rings of cells around the query point and stops once no unvisited cell
+    can hold a closer site. The grid is loaded on first use and updated
+    per site: directly from a saved instance, or lazily for sites written
+    in bulk (invalidate_site).
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._loaded = False
+        self._dirty = set()
+        self._cells = {}  # (row, col) -> {site_id: (lat, lon)}
+        self._positions = {}  # site_id -> (row, col)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+            self._dirty.clear()
+
+    def invalidate_site(self, site_id):
+        with self._lock:
+            self._dirty.add(site_id)
+
+    def update_site(self, site_id, lat, lon):
+        """
+        Moves a site to (lat, lon), or drops it when either is None.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove(site_id)
+            if lat is not None and lon is not None:
+                cell = _cell(lat, lon)
+                self._cells.setdefault(cell, {})[site_id] = (lat, lon)
+                self._positions[site_id] = cell
+            self._dirty.discard(site_id)
+
+    def remove_site(self, site_id):
+        with self._lock:
+            self._remove(site_id)
+            self._dirty.discard(site_id)
+
+    def _remove(self, site_id):
+        cell = self._positions.pop(site_id, None)
+        if cell is not None:
+            members = self._cells[cell]
+            del members[site_id]
+            if not members:
+                del self._cells[cell]
+
+    def _ensure(self):
+        if not self._loaded:
+            self._cells, self._positions = {}, {}
+            self._dirty.clear()
+            self._loaded = True
+            self._load(Site.objects.all())
+        elif self._dirty:
+            dirty, self._dirty = self._dirty, set()
+            for site_id in dirty:
+                self._remove(site_id)
+            self._load(Site.objects.filter(pk__in=dirty))
+
+    def _load(self, queryset):
+        for site_id, lat, lon in queryset.filter(latitude__isnull=False, longitude__isnull=False).values_list(
+            "pk", "latitude", "longitude"
+        ):
+            self.update_site(site_id, lat, lon)
+
+    def nearest(self, lat, lon, k=5, accept=None):
+        """
+        The k sites closest to (lat, lon) as [(site_id, km), ...], nearest
+        first. accept(site_id) can reject candidates, e.g. closed sites.
+        """
+        with self._lock:
+            self._ensure()
+            if not self._cells or k < 1:
+                return []
+            row0, col0 = _cell(lat, lon)
+            rows = [row for row, _ in self._cells]
+            cols = [col for _, col in self._cells]
+            max_ring = max(abs(row0 - min(rows)), abs(row0 - max(rows)), abs(col0 - min(cols)), abs(col0 - max(cols)))
+
+            found = []  # max-heap of the best k: (-km, site_id)
+            for ring in range(max_ring + 1):
+                for cell in self._ring(row0, col0, ring):
+                    for site_id, (site_lat, site_lon) in self._cells.get(cell, {}).items():
+                        if accept is not None and not accept(site_id):
+                            continue
+                        km = distance_km(lat, lon, site_lat, site_lon)
+                        if len(found) < k:
+                            heapq.heappush(found, (-km, site_id))
+                        elif km < -found[0][0]:
+                            heapq.heapreplace(found, (-km, site_id))
+                # Any site in a further ring is at least `ring` whole cells away
+                if len(found) == k and -found[0][0] <= self._ring_distance_km(lat, ring):
+                    break
+            return sorted(((site_id, -neg_km) for neg_km, site_id in found), key=lambda item: item[1])
+
+    @staticmethod
+    def _ring(row0, col0, ring):
+        if ring == 0:
+            yield row0, col0
+            return
+        for col in range(col0 - ring, col0 + ring + 1):
+            yield row0 - ring, col
+            yield row0 + ring, col
+        for row in range(row0 - ring + 1, row0 + ring):
+            yield row, col0 - ring
+            yield row, col0 + ring
+
+    @staticmethod
+    def _ring_distance_km(lat, ring):
+        """
+        Lower bound on the distance from a point to any cell beyond ``ring``;
+        longitude degrees shrink towards the poles, so use the narrowest
+        latitude those cells can reach.
+        """
+        widest_lat = min(89.0, abs(lat) + (ring + 1) * CELL_DEGREES)
+        return ring * CELL_DEGREES * KM_PER_DEGREE * cos(radians(widest_lat))
+
+
+spatial_index = SpatialIndex()
+
+
+def nearest_site_ids(lat, lon, k=5, at=None, **filters):
+    """
+    The k sites nearest to (lat, lon) as [(site_id, km), ...], optionally
+    only those open at the datetime ``at`` and matching the filters of
+    open_site_ids (country, region, location, company, group).
+    """
+    if at is not None:
+        allowed = availability_index.open_site_ids(at, **filters)
+    else:
+        allowed = availability_index.site_ids(**filters)
+    accept = None if allowed is None else allowed.__contains__
+    return spatial_index.nearest(lat, lon, k=k, accept=accept)
+
+
+def nearest_sites(lat, lon, k=5, at=None, **filters):
+    """
+    Like nearest_site_ids, but returns [(site, km), ...] with company and
+    location loaded, in one query.
+    """
+    nearest = nearest_site_ids(lat, lon, k=k, at=at, **filters)
+    sites = Site.objects.select_related("company", "location__region").in_bulk([site_id for site_id, _ in nearest])
+    return [(sites[site_id], km) for site_id, km in nearest if site_id in sites]
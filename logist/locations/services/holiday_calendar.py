@@ -0,0 +1,203 @@
+from collections import namedtuple
+from datetime import date, timedelta
+from django.db import transaction
+from ..models import Country, Region, PublicHoliday
+from .changes import holidays_changed
+from .search import normalize
+
+GenerationReport = namedtuple("GenerationReport", "created skipped missing_regions")
+
+
+def easter_sunday(year):
+    """
+    Western (Gregorian) Easter Sunday, by the anonymous Gregorian algorithm.
+    """
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+# -----------------------
+# Rules: year -> date
+# -----------------------
+def fixed(month, day):
+    return lambda year: date(year, month, day)
+
+
+def easter(offset):
+    return lambda year: easter_sunday(year) + timedelta(days=offset)
+
+
+def buss_und_bettag(year):
+    """
+    The Wednesday before 23 November.
+    """
+    nov_22 = date(year, 11, 22)
+    return nov_22 - timedelta(days=(nov_22.weekday() - 2) % 7)
+
+
+# (name, rule, region codes or None for the whole country, first year or None)
+RULES = {
+    "DE": [
+        ("Neujahr", fixed(1, 1), None, None),
+        ("Heilige Drei Könige", fixed(1, 6), {"BW", "BY", "ST"}, None),
+        ("Internationaler Frauentag", fixed(3, 8), {"BE"}, 2019),
+        ("Internationaler Frauentag", fixed(3, 8), {"MV"}, 2023),
+        ("Karfreitag", easter(-2), None, None),
+        ("Ostersonntag", easter(0), {"BB"}, None),
+        ("Ostermontag", easter(1), None, None),
+        ("Tag der Arbeit", fixed(5, 1), None, None),
+        ("Christi Himmelfahrt", easter(39), None, None),
+        ("Pfingstsonntag", easter(49), {"BB"}, None),
+        ("Pfingstmontag", easter(50), None, None),
+        ("Fronleichnam", easter(60), {"BW", "BY", "HE", "NW", "RP", "SL"}, None),
+        ("Mariä Himmelfahrt", fixed(8, 15), {"SL"}, None),
+        ("Weltkindertag", fixed(9, 20), {"TH"}, 2019),
+        ("Tag der Deutschen Einheit", fixed(10, 3), None, None),
+        ("Reformationstag", fixed(10, 31), {"BB", "MV", "SN", "ST", "TH"}, None),
+        ("Reformationstag", fixed(10, 31), {"HB", "HH", "NI", "SH"}, 2018),
+        ("Allerheiligen", fixed(11, 1), {"BW", "BY", "NW", "RP", "SL"}, None),
+        ("Buß- und Bettag", buss_und_bettag, {"SN"}, None),
+        ("1. Weihnachtstag", fixed(12, 25), None, None),
+        ("2. Weihnachtstag", fixed(12, 26), None, None),
+    ],
+    "AT": [
+        ("Neujahr", fixed(1, 1), None, None),
+        ("Heilige Drei Könige", fixed(1, 6), None, None),
+        ("Ostermontag", easter(1), None, None),
+        ("Staatsfeiertag", fixed(5, 1), None, None),
+        ("Christi Himmelfahrt", easter(39), None, None),
+        ("Pfingstmontag", easter(50), None, None),
+        ("Fronleichnam", easter(60), None, None),
+        ("Mariä Himmelfahrt", fixed(8, 15), None, None),
+        ("Nationalfeiertag", fixed(10, 26), None, None),
+        ("Allerheiligen", fixed(11, 1), None, None),
+        ("Mariä Empfängnis", fixed(12, 8), None, None),
+        ("Christtag", fixed(12, 25), None, None),
+        ("Stefanitag", fixed(12, 26), None, None),
+    ],
+    # Federal holidays only; cantonal ones differ too much and are entered by hand
+    "CH": [
+        ("Neujahr", fixed(1, 1), None, None),
+        ("Auffahrt", easter(39), None, None),
+        ("Bundesfeier", fixed(8, 1), None, None),
+        ("Weihnachten", fixed(12, 25), None, None),
+    ],
+    "PL": [
+        ("Nowy Rok", fixed(1, 1), None, None),
+        ("Trzech Króli", fixed(1, 6), None, 2011),
+        ("Wielkanoc", easter(0), None, None),
+        ("Poniedziałek Wielkanocny", easter(1), None, None),
+        ("Święto Pracy", fixed(5, 1), None, None),
+        ("Święto Konstytucji 3 Maja", fixed(5, 3), None, None),
+        ("Zielone Świątki", easter(49), None, None),
+        ("Boże Ciało", easter(60), None, None),
+        ("Wniebowzięcie Najświętszej Maryi Panny", fixed(8, 15), None, None),
+        ("Wszystkich Świętych", fixed(11, 1), None, None),
+        ("Narodowe Święto Niepodległości", fixed(11, 11), None, None),
+        ("Wigilia Bożego Narodzenia", fixed(12, 24), None, 2025),
+        ("Boże Narodzenie", fixed(12, 25), None, None),
+        ("Drugi dzień Bożego Narodzenia", fixed(12, 26), None, None),
+    ],
+}
+
+# Region code -> names a Region row may carry (German and English)
+REGION_NAMES = {
+    "DE": {
+        "BW": ("Baden-Württemberg",),
+        "BY": ("Bayern", "Bavaria"),
+        "BE": ("Berlin",),
+        "BB": ("Brandenburg",),
+        "HB": ("Bremen",),
+        "HH": ("Hamburg",),
+        "HE": ("Hessen", "Hesse"),
+        "MV": ("Mecklenburg-Vorpommern", "Mecklenburg-Western Pomerania"),
+        "NI": ("Niedersachsen", "Lower Saxony"),
+        "NW": ("Nordrhein-Westfalen", "North Rhine-Westphalia"),
+        "RP": ("Rheinland-Pfalz", "Rhineland-Palatinate"),
+        "SL": ("Saarland",),
+        "SN": ("Sachsen", "Saxony"),
+        "ST": ("Sachsen-Anhalt", "Saxony-Anhalt"),
+        "SH": ("Schleswig-Holstein",),
+        "TH": ("Thüringen", "Thuringia"),
+    },
+}
+
+
+def holidays_for(country_code, year):
+    """
+    [(region code or None, date, name), ...] of country_code in year.
+    """
+    return [
+        (code, rule(year), name)
+        for name, rule, codes, since in RULES[country_code]
+        if since is None or year >= since
+        for code in (sorted(codes) if codes else [None])
+    ]
+
+
+def _region_ids(country):
+    """
+    Region code -> id for the regions of country that have a Region row,
+    matched on name (or the code itself) regardless of umlaut spelling.
+    """
+    by_name = {normalize(name): pk for pk, name in Region.objects.filter(country=country).values_list("pk", "name")}
+    ids = {}
+    for code, names in REGION_NAMES.get(country.code, {}).items():
+        for name in (code, *names):
+            if normalize(name) in by_name:
+                ids[code] = by_name[normalize(name)]
+                break
+    return ids
+
+
+def generate_holidays(years, country_codes=None, batch_size=1000):
+    """
+    Inserts the holidays of RULES for the given years into PublicHoliday,
+    for each country with a matching Country.code (all of RULES by
+    default). Existing (country, region, date) rows are kept as they are.
+
+    Returns a GenerationReport: rows created, rows skipped as existing,
+    and the "CC-REGION" codes with regional holidays but no Region row.
+    """
+    years = sorted(set(years))
+    if not years:
+        return GenerationReport(0, 0, [])
+    countries = Country.objects.filter(code__in=country_codes or list(RULES))
+
+    rows, skipped, missing, changed = [], 0, set(), {}
+    for country in countries:
+        if country.code not in RULES:
+            continue
+        region_ids = _region_ids(country)
+        # unique_together does not catch duplicates with region NULL, so
+        # filter against the existing rows instead of relying on conflicts
+        existing = set(PublicHoliday.objects.filter(
+            country=country, date__range=(date(years[0], 1, 1), date(years[-1], 12, 31))
+        ).values_list("region_id", "date"))
+        for year in years:
+            for code, day, name in holidays_for(country.code, year):
+                if code is not None and code not in region_ids:
+                    missing.add(f"{country.code}-{code}")
+                    continue
+                key = (region_ids.get(code), day)
+                if key in existing:
+                    skipped += 1
+                    continue
+                existing.add(key)
+                rows.append(PublicHoliday(country=country, region_id=key[0], date=day, name=name))
+                changed.setdefault(country.pk, set()).add(day)
+
+    with transaction.atomic():
+        PublicHoliday.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+    # bulk_create sends no signals
+    holidays_changed(changed)
+    return GenerationReport(len(rows), skipped, sorted(missing))
@@ -0,0 +1,75 @@
+import hashlib
+from bisect import bisect_left, bisect_right
+from datetime import date
+from threading import Lock
+from ..models import PublicHoliday
+
+
+class HolidayIndex:
+    """
+    Process-wide, in-memory calendar of all PublicHoliday rows.
+
+    Dates are kept per (country_id, region_id) key, with region_id None for
+    country-wide holidays. The table is loaded on first use and reloaded
+    lazily after invalidate(), which the PublicHoliday signals call.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        # ({(country_id, region_id): set of dates}, {(country_id, region_id): sorted dates}, fingerprint)
+        self._state = None
+
+    def _load(self):
+        state = self._state
+        if state is None:
+            with self._lock:
+                if self._state is None:
+                    loaded = {}
+                    for country_id, region_id, day in PublicHoliday.objects.values_list("country_id", "region_id", "date"):
+                        loaded.setdefault((country_id, region_id), set()).add(day)
+                    ordered = {key: sorted(days) for key, days in loaded.items()}
+                    digest = hashlib.blake2b(digest_size=16)
+                    for key in sorted(ordered, key=lambda key: (key[0], key[1] or 0)):
+                        digest.update(f"{key}:{','.join(map(str, ordered[key]))};".encode())
+                    self._state = (loaded, ordered, digest.hexdigest())
+                state = self._state
+        return state
+
+    def invalidate(self):
+        with self._lock:
+            self._state = None
+
+    def fingerprint(self):
+        """
+        A digest of the whole calendar, equal across processes holding the
+        same holidays; used in HTTP ETags.
+        """
+        return self._load()[2]
+
+    def is_holiday(self, country_id, region_id, day):
+        """
+        Whether day is a country-wide holiday or a holiday in region_id.
+        """
+        dates, _, _ = self._load()
+        if day in dates.get((country_id, None), ()):
+            return True
+        return region_id is not None and day in dates.get((country_id, region_id), ())
+
+    def holidays_between(self, country_id, region_id, start, end):
+        """
+        Sorted holiday dates in the inclusive range start..end that apply to
+        region_id (country-wide ones included).
+        """
+        _, sorted_dates, _ = self._load()
+        keys = [(country_id, None)] if region_id is None else [(country_id, None), (country_id, region_id)]
+        result = set()
+        for key in keys:
+            days = sorted_dates.get(key, [])
+            result.update(days[bisect_left(days, start):bisect_right(days, end)])
+        return sorted(result)
+
+    def holidays_in_year(self, country_id, region_id, year):
+        return self.holidays_between(country_id, region_id, date(year, 1, 1), date(year, 12, 31))
+
+
+holiday_index = HolidayIndex()
@@ -0,0 +1,241 @@
+import re
+from datetime import time
+from django.db import transaction
+from ..models import DefaultHours, Weekday
+from .calendar_import import SiteMatcher, read_csv
+from .changes import hours_changed
+from .importing import MAX_ERRORS, ImportFailed, ImportRowError
+from .search import normalize
+
+try:
+    import openpyxl
+except ImportError:  # XLSX sheets need openpyxl
+    openpyxl = None
+
+DEFAULT_BATCH_SIZE = 500
+
+# Normalised column headers naming a weekday
+WEEKDAY_COLUMNS = {}
+for _weekday, _names in enumerate([
+    ("mo", "montag", "mon", "monday"),
+    ("di", "dienstag", "tue", "tuesday"),
+    ("mi", "mittwoch", "wed", "wednesday"),
+    ("do", "donnerstag", "thu", "thursday"),
+    ("fr", "freitag", "fri", "friday"),
+    ("sa", "samstag", "sonnabend", "sat", "saturday"),
+    ("so", "sonntag", "sun", "sunday"),
+]):
+    WEEKDAY_COLUMNS.update((name, _weekday) for name in _names)
+
+CLOSED_WORDS = {"geschlossen", "closed", "zu"}
+
+# "8-17", "08:00 - 17:00 Uhr", "8.30–16.45"
+TIME_RANGE = re.compile(r"(\d{1,2})(?:[:.](\d{2}))?\s*(?:uhr)?\s*[-–—]\s*(\d{1,2})(?:[:.](\d{2}))?\s*(?:uhr)?")
+
+CLOSED = (None, None, True)
+
+
+# -----------------------
+# Reading
+# -----------------------
+def read_xlsx(f, sheet=None):
+    """
+    Yields (line number, {column: value}) per data row of an XLSX sheet
+    (the first one by default), the header taken from its first row.
+    """
+    if openpyxl is None:
+        raise ImportFailed(["reading XLSX files needs openpyxl; export the sheet as CSV instead"])
+    workbook = openpyxl.load_workbook(f, read_only=True, data_only=True)
+    try:
+        rows = (workbook[sheet] if sheet else workbook.worksheets[0]).iter_rows(values_only=True)
+        header = [str(cell or "").strip().lower() for cell in next(rows, ())]
+        for number, row in enumerate(rows, start=2):
+            yield number, {
+                key: str(cell if cell is not None else "").strip() for key, cell in zip(header, row) if key
+            }
+    finally:
+        workbook.close()
+
+
+def weekday_columns(column):
+    """
+    The weekdays a header names: one ("Mo", "Montag", "Monday") or a span
+    ("Mo-Fr"); empty for other columns.
+    """
+    names = normalize(column).split()
+    if len(names) == 2 and all(name in WEEKDAY_COLUMNS for name in names):
+        first, last = (WEEKDAY_COLUMNS[name] for name in names)
+        return list(range(first, last + 1))
+    if len(names) == 1 and names[0] in WEEKDAY_COLUMNS:
+        return [WEEKDAY_COLUMNS[names[0]]]
+    return []
+
+
+def parse_day(value):
+    """
+    (open_time, close_time, is_closed) of a cell: a time range or
+    "geschlossen"/"closed". A range closing before it opens ("22-2") runs
+    past midnight, as in WeeklySchedule. None for an empty cell, which
+    leaves the day as it is.
+    """
+    text = (value or "").strip().lower()
+    if not text:
+        return None
+    if text in CLOSED_WORDS or text.strip("-–— ") == "":
+        return CLOSED
+    ranges = TIME_RANGE.findall(text)
+    if len(ranges) != 1 or TIME_RANGE.sub("", text).strip(" ,;/"):
+        raise ImportRowError(f"invalid hours {value!r}; give one range like 08:00-17:00, or 'geschlossen'")
+    open_hour, open_minute, close_hour, close_minute = ranges[0]
+    try:
+        open_time = time(int(open_hour), int(open_minute or 0))
+        close_time = time(int(close_hour), int(close_minute or 0))
+    except ValueError:
+        raise ImportRowError(f"invalid hours {value!r}")
+    if close_time == open_time:
+        raise ImportRowError(f"hours {value!r} open and close at the same time")
+    return open_time, close_time, False
+
+
+def _display(hours):
+    open_time, close_time, is_closed = hours
+    if is_closed:
+        return "Closed"
+    if open_time is None or close_time is None:
+        return "Unknown"
+    return f"{open_time:%H:%M}-{close_time:%H:%M}"
+
+
+# -----------------------
+# Import
+# -----------------------
+class HoursImportReport:
+    """
+    What an hours import changed (or, dry, would change): changes are
+    (site_id, label, weekday, old, new) with old and new as
+    (open_time, close_time, is_closed).
+    """
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.sites = 0
+        self.changes = []
+        self.unchanged = 0
+        self.unmatched = []  # "line N: message"
+
+    @property
+    def changed_sites(self):
+        return sorted({site_id for site_id, *_ in self.changes})
+
+    @property
+    def changed_weekdays(self):
+        weekdays = {}
+        for site_id, label, weekday, old, new in self.changes:
+            weekdays.setdefault(site_id, set()).add(weekday)
+        return weekdays
+
+    def lines(self):
+        for site_id, label, weekday, old, new in self.changes:
+            yield f"site {site_id} ({label}) {Weekday.short_name(weekday)}: {_display(old)} -> {_display(new)}"
+        for message in self.unmatched:
+            yield f"skipped {message}"
+
+    def __str__(self):
+        verb = "would change" if self.dry_run else "changed"
+        return (
+            f"{self.rows} rows, {self.sites} sites matched: {verb} {len(self.changes)} days "
+            f"of {len(self.changed_sites)} sites, {self.unchanged} days unchanged, "
+            f"{len(self.unmatched)} rows skipped"
+        )
+
+
+def _site_label(fields, site_id):
+    names = [fields.get(column) for column in ("company", "location", "name")]
+    return " / ".join(name for name in names if name) or f"site {site_id}"
+
+
+def import_hours(f, file_format="csv", delimiter=",", sheet=None, dry_run=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Loads weekly opening hours from a table with one row per site: site_id
+    or company/location/name columns (see SiteMatcher) and one column per
+    weekday or span of weekdays ("Mo", "Dienstag", "Mo-Fr") holding a time
+    range, "geschlossen" or nothing (left unchanged).
+
+    Rows are matched to sites in memory and diffed against the sites'
+    DefaultHours, read a batch of sites per query; only differing days are
+    written, with bulk_update, so re-importing an unchanged sheet writes
+    nothing. Rows naming an unknown or ambiguous site are skipped and
+    reported. With dry_run nothing is written.
+
+    Raises ImportFailed, with nothing written, if a cell cannot be parsed.
+    Returns a HoursImportReport.
+    """
+    rows = read_xlsx(f, sheet=sheet) if file_format == "xlsx" else read_csv(f, delimiter=delimiter)
+    report = HoursImportReport(dry_run=dry_run)
+    errors = []
+    wanted = {}  # site_id: (label, {weekday: hours})
+    sites = SiteMatcher()
+    columns = None
+    for line, fields in rows:
+        report.rows += 1
+        if columns is None:
+            columns = {column: weekday_columns(column) for column in fields}
+            columns = {column: weekdays for column, weekdays in columns.items() if weekdays}
+            if not columns:
+                raise ImportFailed(["no weekday columns (Mo, Di, ... or Montag, Dienstag, ...)"])
+        try:
+            site_id = sites.site_id(fields)
+        except ImportRowError as e:
+            report.unmatched.append(f"line {line}: {e}")
+            continue
+        week = {}
+        try:
+            for column, weekdays in columns.items():
+                hours = parse_day(fields.get(column))
+                if hours is not None:
+                    week.update((weekday, hours) for weekday in weekdays)
+        except ImportRowError as e:
+            errors.append(f"line {line}: {e}")
+            if len(errors) >= MAX_ERRORS:
+                break
+            continue
+        # the last row for a site wins
+        wanted.setdefault(site_id, (_site_label(fields, site_id), {}))[1].update(week)
+    if errors:
+        raise ImportFailed(errors)
+    report.sites = len(wanted)
+
+    updates, creates = [], []
+    site_ids = list(wanted)
+    for n in range(0, len(site_ids), batch_size):
+        batch = site_ids[n:n + batch_size]
+        current = {
+            (row.site_id, row.weekday): row for row in DefaultHours.objects.filter(site_id__in=batch)
+            .only("pk", "site_id", "weekday", "open_time", "close_time", "is_closed")
+        }
+        for site_id in batch:
+            label, week = wanted[site_id]
+            for weekday, hours in sorted(week.items()):
+                row = current.get((site_id, weekday))
+                old = (None, None, False) if row is None else (
+                    CLOSED if row.is_closed else (row.open_time, row.close_time, False)
+                )
+                if old == hours:
+                    report.unchanged += 1
+                    continue
+                report.changes.append((site_id, label, weekday, old, hours))
+                if row is None:
+                    # sites predating the create_default_hours signal
+                    row = DefaultHours(site_id=site_id, weekday=weekday)
+                    creates.append(row)
+                else:
+                    updates.append(row)
+                row.open_time, row.close_time, row.is_closed = hours
+
+    if not dry_run and report.changes:
+        with transaction.atomic():
+            DefaultHours.objects.bulk_update(updates, ["open_time", "close_time", "is_closed"], batch_size=batch_size)
+            DefaultHours.objects.bulk_create(creates, batch_size=batch_size)
+            # bulk writes send no signals
+            hours_changed(report.changed_weekdays)
+    return report
@@ -0,0 +1,18 @@
+# Errors listed before an import gives up
+MAX_ERRORS = 50
+
+
+class ImportFailed(Exception):
+    """
+    Rows or records that could not be imported, as "line N: message"
+    strings; nothing was written.
+    """
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("\n".join(errors))
+
+
+class ImportRowError(Exception):
+    """
+    What is wrong with one row or record; collected into ImportFailed.
+    """
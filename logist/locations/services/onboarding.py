@@ -0,0 +1,58 @@
+from django.db import transaction
+from ..models import Site, DefaultHours, Weekday
+from .changes import sites_changed, touch_on_commit
+from .schedule import store_hours
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def default_hours_for(sites):
+    """
+    The 7 blank DefaultHours rows (one per weekday) of each site.
+    """
+    return [
+        DefaultHours(site=site, weekday=day_index, is_closed=False)
+        for site in sites
+        for day_index, day_name in Weekday.CHOICES
+    ]
+
+
+def create_sites(sites, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Inserts unsaved Site instances together with their 7 DefaultHours rows
+    each, in batched bulk_create calls inside one transaction.
+
+    Equivalent to saving each site (email is lowercased, default hours are
+    created) but bypasses the per-site post_save signals. Returns the
+    created sites, with primary keys set.
+    """
+    sites = list(sites)
+    for site in sites:
+        if site.email:
+            site.email = site.email.lower()
+
+    with transaction.atomic():
+        created = Site.objects.bulk_create(sites, batch_size=batch_size)
+        DefaultHours.objects.bulk_create(default_hours_for(created), batch_size=batch_size * 7)
+        transaction.on_commit(lambda: sites_changed([site.pk for site in created]))
+        touch_on_commit(Site.objects.filter(pk__in=[site.pk for site in created]))
+    return created
+
+
+def ensure_default_hours(site):
+    """
+    Adds the blank DefaultHours rows a site is missing (sites predating the
+    create_default_hours signal) and recompiles its stored hours if any
+    were added. Returns the number of rows created.
+    """
+    existing = set(site.default_hours.values_list("weekday", flat=True))
+    missing = [
+        DefaultHours(site=site, weekday=day_index, is_closed=False)
+        for day_index, day_name in Weekday.CHOICES
+        if day_index not in existing
+    ]
+    if missing:
+        DefaultHours.objects.bulk_create(missing)
+        store_hours([site.pk])
+        sites_changed([site.pk])
+    return len(missing)
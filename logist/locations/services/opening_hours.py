@@ -1,6 +1,7 @@
-from datetime import date
-from django.db.models import Q
-from ..models import Site, PublicHoliday
+from datetime import date, timedelta
+from django.db.models import Q, QuerySet
+from ..models import Site, SiteException, DefaultHours, SiteDaySchedule
+from .holidays import holiday_index
 
 def get_site_hours(site: Site, check_date: date):
     """
@@ -19,17 +20,113 @@ def get_site_hours(site: Site, check_date: date):
         return None, None  # Closed
 
     # 2. Check for public holidays (country-wide or region-specific)
-    holidays = PublicHoliday.objects.filter(
-        date=check_date,
-        country=site.location.region.country
-    ).filter(Q(region__isnull=True) | Q(region=site.location.region))
-    if holidays.exists():
+    region = site.location.region
+    if holiday_index.is_holiday(region.country_id, region.pk, check_date):
         return None, None  # Closed on holiday
 
     # 3. Default weekly schedule
     weekday = check_date.weekday()  # 0 = Monday
     default_hours = site.default_hours.filter(weekday=weekday).first()
     if default_hours:
+        if default_hours.is_closed:
+            return None, None
         return default_hours.open_time, default_hours.close_time
 
-    return None, None  # No schedule defined
\ No newline at end of file
+    return None, None  # No schedule defined
+
+
+def _site_filter(sites, field="site"):
+    """
+    Build a filter for ``sites``, which may be a Site queryset, an iterable
+    of Site instances or primary keys, or None for every site.
+    """
+    if sites is None:
+        return Q()
+    if isinstance(sites, QuerySet):
+        return Q(**{f"{field}__in": sites.values("pk")})
+    ids = [s.pk if isinstance(s, Site) else s for s in sites]
+    return Q(**{f"{field}__in": ids})
+
+
+def resolve_hours(sites, start: date, end: date):
+    """
+    Resolves opening hours for many sites over the inclusive range start..end.
+
+    Runs a fixed number of queries (sites, exceptions, default hours, plus
+    the holiday index on its first load) regardless of how many sites or
+    days are requested, then applies the same priority as get_site_hours
+    in memory:
+      1. SiteException
+      2. PublicHoliday (country-wide or the site's region)
+      3. DefaultHours
+
+    Returns {(site_id, date): (open_time, close_time)}, with (None, None)
+    for closed or unknown days.
+    """
+    return {key: (open_time, close_time) for key, (open_time, close_time, _) in resolve_sourced_hours(
+        sites, start, end
+    ).items()}
+
+
+def resolve_sourced_hours(sites, start: date, end: date, days=None):
+    """
+    Like resolve_hours, but each value also names the rule that decided it:
+    (open_time, close_time, source) with source one of SiteDaySchedule.SOURCES.
+    With days, only those dates (within start..end) are resolved.
+    """
+    if end < start:
+        return {}
+    if days is None:
+        days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+        dates = Q(date__range=(start, end))
+    else:
+        days = sorted(day for day in days if start <= day <= end)
+        dates = Q(date__in=days)
+    if not days:
+        return {}
+
+    # site_id -> (country_id, region_id)
+    site_scope = {
+        site_id: (country_id, region_id)
+        for site_id, country_id, region_id in Site.objects.filter(_site_filter(sites, "pk"))
+        .values_list("pk", "location__region__country_id", "location__region_id")
+    }
+    if not site_scope:
+        return {}
+
+    exceptions = {
+        (site_id, day): (open_time, close_time)
+        for site_id, day, open_time, close_time in SiteException.objects.filter(
+            _site_filter(sites), dates
+        ).values_list("site_id", "date", "open_time", "close_time")
+    }
+
+    # (country_id, region_id) -> set of holiday dates in range
+    holidays = {
+        scope: set(holiday_index.holidays_between(*scope, days[0], days[-1]))
+        for scope in set(site_scope.values())
+    }
+
+    # site_id -> {weekday: (open_time, close_time)}
+    weekly = {}
+    for site_id, weekday, open_time, close_time, is_closed in DefaultHours.objects.filter(
+        _site_filter(sites)
+    ).values_list("site_id", "weekday", "open_time", "close_time", "is_closed"):
+        weekly.setdefault(site_id, {})[weekday] = (None, None) if is_closed else (open_time, close_time)
+
+    result = {}
+    for site_id, (country_id, region_id) in site_scope.items():
+        holiday_days = holidays[country_id, region_id]
+        site_week = weekly.get(site_id, {})
+        for day in days:
+            exception = exceptions.get((site_id, day))
+            if exception is not None:
+                open_time, close_time = exception
+                if not (open_time and close_time):
+                    open_time = close_time = None
+                result[site_id, day] = (open_time, close_time, SiteDaySchedule.EXCEPTION)
+            elif day in holiday_days:
+                result[site_id, day] = (None, None, SiteDaySchedule.HOLIDAY)
+            else:
+                result[site_id, day] = site_week.get(day.weekday(), (None, None)) + (SiteDaySchedule.DEFAULT,)
+    return result
@@ -0,0 +1,213 @@
+from bisect import bisect_right
+from itertools import groupby
+from django.utils import timezone
+from ..models import Site, DefaultHours, Weekday
+from .changes import touch_on_commit
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+
+class WeeklySchedule:
+    """
+    Immutable, compiled week of a site built from its DefaultHours rows.
+
+    - hours: 7 (open_time, close_time) pairs, as get_site_hours returns them
+    - days: per weekday, None (unknown), () (closed) or ((open, close),) in
+      minutes after that day's midnight; close may exceed 1440 overnight
+    - intervals: sorted, non-overlapping [start, end) minute-of-week ranges
+    - display: the human-readable string shown by Site.hours_display
+    """
+    __slots__ = ("hours", "days", "intervals", "display", "_starts")
+
+    def __init__(self, hours, days, intervals, display):
+        object.__setattr__(self, "hours", tuple(hours))
+        object.__setattr__(self, "days", tuple(days))
+        object.__setattr__(self, "intervals", tuple(intervals))
+        object.__setattr__(self, "display", display)
+        object.__setattr__(self, "_starts", tuple(start for start, _ in self.intervals))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("WeeklySchedule is immutable")
+
+    def __repr__(self):
+        return f"<WeeklySchedule {self.display!r}>"
+
+    def hours_on(self, weekday):
+        """
+        Returns (open_time, close_time) for weekday (0 = Monday), or (None, None).
+        """
+        return self.hours[weekday]
+
+    def is_open(self, weekday, minute):
+        """
+        Whether the site is open at minute (0..1439) of weekday.
+        """
+        point = weekday * MINUTES_PER_DAY + minute
+        index = bisect_right(self._starts, point) - 1
+        return index >= 0 and point < self.intervals[index][1]
+
+    def is_open_at(self, moment):
+        """
+        Whether the site is open at a date/time (interpreted as local time).
+        """
+        return self.is_open(moment.weekday(), moment.hour * 60 + moment.minute)
+
+    def as_json(self):
+        """
+        The structured form stored in Site.hours_data: 7 entries, Monday
+        first, each null (unknown), [] (closed) or [[open, close]] in
+        minutes after midnight.
+        """
+        return [None if day is None else [list(interval) for interval in day] for day in self.days]
+
+
+def compile_schedule(rows):
+    """
+    Compiles DefaultHours rows (instances or (weekday, open_time, close_time,
+    is_closed) tuples) into a WeeklySchedule.
+
+    Opening hours whose closing time is not after the opening time run past
+    midnight into the following day.
+    """
+    rows = sorted(
+        (
+            tuple(row) if isinstance(row, (tuple, list))
+            else (row.weekday, row.open_time, row.close_time, row.is_closed)
+            for row in rows
+        ),
+        key=lambda row: row[0],
+    )
+
+    hours = [(None, None)] * 7
+    days = [None] * 7
+    intervals = []
+    hours_list = []
+    for weekday, open_time, close_time, is_closed in rows:
+        wd = Weekday.short_name(weekday)
+        if is_closed:
+            hours_list.append((wd, "Closed"))
+            days[weekday] = ()
+            continue
+
+        hours[weekday] = (open_time, close_time)
+        if open_time and close_time:
+            hours_list.append((wd, f"{open_time.strftime('%H:%M')}-{close_time.strftime('%H:%M')}"))
+            start = weekday * MINUTES_PER_DAY + _minutes(open_time)
+            end = weekday * MINUTES_PER_DAY + _minutes(close_time)
+            if end <= start:
+                end += MINUTES_PER_DAY
+            days[weekday] = ((start % MINUTES_PER_DAY, end - weekday * MINUTES_PER_DAY),)
+            if end > MINUTES_PER_WEEK:
+                # Sunday night into Monday morning
+                intervals.append((0, end - MINUTES_PER_WEEK))
+                end = MINUTES_PER_WEEK
+            intervals.append((start, end))
+        else:
+            hours_list.append((wd, "Unknown"))
+
+    return WeeklySchedule(hours, days, _merge(intervals), _display(hours_list))
+
+
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _display(hours_list):
+    """
+    "Mo–Fr 08:00-17:00; Sa Closed", or "" if every day is Unknown.
+    """
+    if all(hour == "Unknown" for _, hour in hours_list):
+        return ""
+
+    result = []
+    for key, group in groupby(hours_list, key=lambda x: x[1]):
+        days = [wd for wd, _ in group]
+        day_str = days[0] if len(days) == 1 else f"{days[0]}–{days[-1]}"
+        result.append(f"{day_str} {key}")
+    return "; ".join(result)
+
+
+# -----------------------
+# Process-wide cache, invalidated from locations.signals
+# -----------------------
+_schedules = {}
+
+
+def get_schedule(site):
+    """
+    Returns the compiled WeeklySchedule for a site, compiling it on first use.
+
+    Uses prefetched default_hours when available. The cache is invalidated by
+    DefaultHours post_save/post_delete; queryset.update() and bulk_* calls
+    bypass signals and must call invalidate_schedule themselves.
+    """
+    schedule = _schedules.get(site.pk)
+    if schedule is None:
+        prefetched = getattr(site, "_prefetched_objects_cache", {}).get("default_hours")
+        if prefetched is not None:
+            rows = prefetched
+        else:
+            rows = DefaultHours.objects.filter(site_id=site.pk).values_list(
+                "weekday", "open_time", "close_time", "is_closed"
+            )
+        schedule = compile_schedule(rows)
+        if site.pk is not None:
+            _schedules[site.pk] = schedule
+    return schedule
+
+
+def invalidate_schedule(site_id):
+    _schedules.pop(site_id, None)
+
+
+def clear_schedules():
+    _schedules.clear()
+
+
+# -----------------------
+# Denormalized Site.hours_summary / Site.hours_data
+# -----------------------
+def store_hours(site_ids=None, batch_size=1000):
+    """
+    Recompiles the stored hours of the given sites (all when None), a batch
+    at a time: one query for the batch's DefaultHours and one bulk_update.
+    Returns the number of sites updated.
+    """
+    if site_ids is None:
+        site_ids = Site.objects.order_by("pk").values_list("pk", flat=True).iterator(chunk_size=batch_size)
+    updated = 0
+    batch = []
+    for site_id in site_ids:
+        batch.append(site_id)
+        if len(batch) >= batch_size:
+            updated += _store_batch(batch)
+            batch = []
+    if batch:
+        updated += _store_batch(batch)
+    return updated
+
+
+def _store_batch(site_ids):
+    rows = {site_id: [] for site_id in site_ids}
+    for site_id, *row in DefaultHours.objects.filter(site_id__in=site_ids).values_list(
+        "site_id", "weekday", "open_time", "close_time", "is_closed"
+    ):
+        rows[site_id].append(tuple(row))
+    now = timezone.now()
+    sites = []
+    for site_id, site_rows in rows.items():
+        schedule = compile_schedule(site_rows)
+        sites.append(Site(pk=site_id, hours_summary=schedule.display, hours_data=schedule.as_json(), updated_at=now))
+    touch_on_commit(Site.objects.filter(pk__in=site_ids))
+    return Site.objects.bulk_update(sites, ["hours_summary", "hours_data", "updated_at"])
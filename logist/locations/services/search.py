@@ -0,0 +1,233 @@
+import re
+import unicodedata
+from collections import Counter, namedtuple
+from threading import RLock
+from ..models import Site, Company, Location, Group
+
+# Document kinds, named after the models they index
+KINDS = ("site", "company", "location", "group")
+
+# Share of the query's trigrams a document needs to match
+MIN_SIMILARITY = 0.5
+
+# Added to the similarity when the normalised query occurs verbatim
+EXACT_MATCH_BONUS = 1.0
+
+GERMAN_LETTERS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+SearchResult = namedtuple("SearchResult", "kind pk label score")
+
+
+def normalize(text):
+    """
+    Lowercased ASCII words of text: German umlauts and ß are transliterated
+    ("Römerstraße" -> "roemerstrasse"), other accents dropped, "…str." spelt
+    out as "…strasse" and punctuation turned into spaces.
+    """
+    text = (text or "").lower().translate(GERMAN_LETTERS)
+    text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    text = re.sub(r"str\b\.?", "strasse", text)
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+def trigrams(text, prefix=False):
+    """
+    Trigrams of each word of normalised text, padded like pg_trgm. With
+    prefix, the last word is not padded at its end, so a query still being
+    typed ("dres") matches the full word ("dresden").
+    """
+    words = text.split()
+    grams = set()
+    for n, word in enumerate(words):
+        padded = f"  {word}" if prefix and n == len(words) - 1 else f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _join(*parts):
+    return " ".join(part for part in parts if part)
+
+
+class SearchIndex:
+    """
+    In-memory trigram index over site, company, location and group names,
+    plus site addresses and zip codes.
+
+    A site's document also holds its company, group and location names,
+    so "altmann dresden" finds the Dresden sites of ARS Altmann. Matching is
+    diacritic-insensitive and typo-tolerant; results are ranked by the share
+    of query trigrams they contain.
+
+    The index is built on first use. Saving or deleting an object refreshes
+    its document, and those of the sites and companies showing its name,
+    on the next query.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._built = False
+        self._dirty = set()  # (kind, pk)
+        self._reset()
+
+    def _reset(self):
+        self._documents = {kind: {} for kind in KINDS}  # kind -> {pk: (label, text, trigrams)}
+        self._postings = {kind: {} for kind in KINDS}  # kind -> {trigram: set of pks}
+        self._parents = {}  # (kind, pk) -> keys of the objects whose names it shows
+        self._dependents = {}  # (kind, pk) -> keys of the documents showing its name
+
+    # -----------------------
+    # Maintenance
+    # -----------------------
+    def invalidate(self):
+        with self._lock:
+            self._built = False
+            self._dirty.clear()
+
+    def invalidate_document(self, kind, pk):
+        """
+        Reindexes one object, and every document showing its name, on the
+        next query; deleted objects are dropped.
+        """
+        with self._lock:
+            if self._built:
+                key = (kind, pk)
+                self._dirty.add(key)
+                self._dirty.update(self._dependents.get(key, ()))
+
+    def _ensure(self):
+        if not self._built:
+            self._reset()
+            for kind in KINDS:
+                self._load(kind, None)
+            self._dirty.clear()
+            self._built = True
+        elif self._dirty:
+            dirty, self._dirty = self._dirty, set()
+            for kind in KINDS:
+                pks = {pk for dirty_kind, pk in dirty if dirty_kind == kind}
+                if pks:
+                    for pk in pks:
+                        self._remove(kind, pk)
+                    self._load(kind, pks)
+
+    def _load(self, kind, pks):
+        for pk, label, fields, parents in LOADERS[kind](pks):
+            text = normalize(_join(*fields))
+            grams = trigrams(text)
+            self._documents[kind][pk] = (label, text, grams)
+            for gram in grams:
+                self._postings[kind].setdefault(gram, set()).add(pk)
+            key = (kind, pk)
+            parents = tuple(parent for parent in parents if parent[1] is not None)
+            self._parents[key] = parents
+            for parent in parents:
+                self._dependents.setdefault(parent, set()).add(key)
+
+    def _remove(self, kind, pk):
+        document = self._documents[kind].pop(pk, None)
+        if document is None:
+            return
+        postings = self._postings[kind]
+        for gram in document[2]:
+            members = postings[gram]
+            members.discard(pk)
+            if not members:
+                del postings[gram]
+        key = (kind, pk)
+        for parent in self._parents.pop(key, ()):
+            self._dependents[parent].discard(key)
+
+    # -----------------------
+    # Queries
+    # -----------------------
+    def search(self, query, kinds=KINDS, limit=20):
+        """
+        The best matches for query as SearchResults, highest score first
+        (then by label); limit=None returns every match.
+        """
+        unknown = set(kinds) - set(KINDS)
+        if unknown:
+            raise ValueError(f"Unknown kind(s): {', '.join(sorted(unknown))}")
+        terms = normalize(query)
+        wanted = trigrams(terms, prefix=True)
+        if not wanted:
+            return []
+
+        results = []
+        with self._lock:
+            self._ensure()
+            for kind in kinds:
+                postings = self._postings[kind]
+                hits = Counter()
+                for gram in wanted:
+                    hits.update(postings.get(gram, ()))
+                documents = self._documents[kind]
+                for pk, count in hits.items():
+                    score = count / len(wanted)
+                    if score < MIN_SIMILARITY:
+                        continue
+                    label, text, _ = documents[pk]
+                    if terms in text:
+                        score += EXACT_MATCH_BONUS
+                    results.append(SearchResult(kind, pk, label, round(score, 3)))
+
+        results.sort(key=lambda result: (-result.score, result.label))
+        return results if limit is None else results[:limit]
+
+    def search_ids(self, query, kind, limit=None):
+        return [result.pk for result in self.search(query, kinds=(kind,), limit=limit)]
+
+
+# -----------------------
+# Documents: (pk, label, searchable fields, parent keys)
+# -----------------------
+def _filtered(queryset, pks):
+    queryset = queryset.order_by()
+    return queryset if pks is None else queryset.filter(pk__in=pks)
+
+
+def _site_documents(pks):
+    for pk, name, address, zip_code, company_id, company, group_id, group, location_id, location in _filtered(
+        Site.objects.all(), pks
+    ).values_list(
+        "pk", "name", "address", "zip_code",
+        "company_id", "company__name", "company__group_id", "company__group__name",
+        "location_id", "location__name",
+    ):
+        label = " - ".join(filter(None, (company, location, name)))
+        parents = (("company", company_id), ("group", group_id), ("location", location_id))
+        yield pk, label, (name, address, zip_code, company, group, location), parents
+
+
+def _company_documents(pks):
+    for pk, name, group_id, group in _filtered(Company.objects.all(), pks).values_list(
+        "pk", "name", "group_id", "group__name"
+    ):
+        yield pk, name, (name, group), (("group", group_id),)
+
+
+def _location_documents(pks):
+    for pk, name in _filtered(Location.objects.all(), pks).values_list("pk", "name"):
+        yield pk, name, (name,), ()
+
+
+def _group_documents(pks):
+    for pk, name in _filtered(Group.objects.all(), pks).values_list("pk", "name"):
+        yield pk, name, (name,), ()
+
+
+LOADERS = {
+    "site": _site_documents,
+    "company": _company_documents,
+    "location": _location_documents,
+    "group": _group_documents,
+}
+
+search_index = SearchIndex()
+
+
+def search(query, kinds=KINDS, limit=20):
+    """
+    Ranked matches for query; see SearchIndex.search.
+    """
+    return search_index.search(query, kinds=kinds, limit=limit)
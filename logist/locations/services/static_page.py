@@ -0,0 +1,126 @@
+import gzip
+from html import escape
+from itertools import groupby
+from pathlib import Path
+from .export import _atomic_write, iter_records
+
+try:
+    import brotli
+except ImportError:  # optional; the .br variant is skipped without it
+    brotli = None
+
+TITLE = "Dresden Car Rental Stations"
+
+HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+  <meta charset="UTF-8">
+  <meta name="viewport" content="width=device-width, initial-scale=1.0">
+  <title>{title}</title>
+  <link rel="stylesheet" href="{stylesheet}">
+</head>
+<body>
+  <div class="wrapper">
+
+    <div id="stations">
+"""
+
+FOOT = """    </div>
+  </div>
+</body>
+</html>
+"""
+
+
+# -----------------------
+# Rendering
+# -----------------------
+def hours_rows(hours):
+    """
+    (weekday, time) pairs of an hours string like
+    "Mo–Fr 08:00-17:00; Sa Closed", with German closed/unknown labels.
+    """
+    rows = []
+    for part in (hours or "").split(";"):
+        part = part.strip().replace("Closed", "geschlossen").replace("Unknown", "unbekannt")
+        if not part:
+            continue
+        day, space, time = part.partition(" ")
+        rows.append((day, time) if space else ("", part))
+    return rows
+
+
+def render_tile(record):
+    """
+    The tile of one exported record, as index.html builds it client-side.
+    """
+    parts = [
+        '<div class="tile">\n',
+        f'<h3>{escape(record["name"] or record.get("location") or "(no name)")}</h3>\n',
+        '<div class="row address">',
+        f'<a href="{escape(record["maps_link"] or "")}" target="_blank">{escape(record["address"] or "(no address)")}</a>',
+        '</div>\n',
+    ]
+    phone = record["phone"]
+    if phone:
+        parts.append(
+            f'<div class="row phone"><a href="tel:{escape("".join(phone.split()))}">{escape(phone)}</a></div>\n'
+        )
+    rows = hours_rows(record["hours"])
+    if rows:
+        parts.append('<div class="row hours">')
+        parts.extend(
+            f'<div class="hours-row"><span class="weekday">{escape(day)}</span>'
+            f'<span class="hour-time">{escape(time)}</span></div>'
+            for day, time in rows
+        )
+        parts.append('</div>\n')
+    parts.append('</div>\n')
+    return "".join(parts)
+
+
+def render_page(records=None, title=TITLE, stylesheet="style.css"):
+    """
+    Yields the stations page in chunks: one heading per company followed
+    by its tiles. Records (default: the export, streamed from the
+    database) must be ordered by company, as export_queryset is.
+    """
+    if records is None:
+        records = iter_records()
+    yield HEAD.format(title=escape(title), stylesheet=escape(stylesheet))
+    for company, tiles in groupby(records, key=lambda record: record["company"]):
+        yield f'<h2 class="company-title">{escape(company)}</h2>\n'
+        for record in tiles:
+            yield render_tile(record)
+    yield FOOT
+
+
+# -----------------------
+# Output
+# -----------------------
+def compressed_variants(data):
+    """
+    {suffix: bytes} of the precompressed variants of data. mtime is fixed
+    so unchanged pages compress to identical files.
+    """
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, mode=brotli.MODE_TEXT)
+    return variants
+
+
+def write_page(path, records=None, title=TITLE, stylesheet="style.css"):
+    """
+    Renders the stations page to path and writes path.gz (and path.br when
+    brotli is installed) alongside, each replaced atomically. Returns the
+    written paths.
+    """
+    path = Path(path)
+    data = "".join(render_page(records, title=title, stylesheet=stylesheet)).encode("utf-8")
+    written = [path]
+    _atomic_write(path, lambda f: f.write(data), binary=True)
+    for suffix, compressed in compressed_variants(data).items():
+        variant = path.with_name(path.name + suffix)
+        _atomic_write(variant, lambda f: f.write(compressed), binary=True)
+        written.append(variant)
+    return written
@@ -0,0 +1,170 @@
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import transaction
+from django.utils import timezone
+from ..models import Site
+from .changes import sites_changed, touch_on_commit
+from .importing import MAX_ERRORS, ImportFailed, ImportRowError
+from .search import normalize
+
+DEFAULT_BATCH_SIZE = 500
+
+# Record keys written back to the sites they match
+SYNC_FIELDS = ("address", "maps_link", "phone")
+
+_validate_url = URLValidator()
+
+
+def _value(value):
+    """
+    A record value as stored: strings stripped, empty ones None (the export
+    writes a missing maps_link as "").
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+class SyncReport:
+    """
+    What a sync changed (or, dry, would change): changes are
+    (site_id, field, old, new).
+    """
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.records = 0
+        self.sites = 0
+        self.changes = []
+        self.skipped = []  # "record N: message"
+
+    @property
+    def changed_sites(self):
+        return sorted({site_id for site_id, *_ in self.changes})
+
+    def lines(self):
+        for site_id, field, old, new in self.changes:
+            yield f"site {site_id} {field}: {old or ''!r} -> {new or ''!r}"
+        for message in self.skipped:
+            yield f"skipped {message}"
+
+    def __str__(self):
+        verb = "would change" if self.dry_run else "changed"
+        return (
+            f"{self.records} records, {self.sites} sites matched: {verb} {len(self.changes)} values "
+            f"of {len(self.changed_sites)} sites, {len(self.skipped)} records skipped"
+        )
+
+
+class RecordMatcher:
+    """
+    Finds the site of an export record: by its id, or for records without
+    one (older exports) by company and address, compared normalised. The
+    display name is never used; it changes with group, location and site
+    names. Reads all sites in one query.
+    """
+    def __init__(self, fields):
+        self.current = {}  # site_id: {field: value}
+        self.by_address = {}
+        columns = ["address", *(field for field in fields if field != "address")]
+        for pk, company, *values in Site.objects.values_list(
+            "pk", "company__name", *columns
+        ).iterator(chunk_size=10000):
+            values = dict(zip(columns, map(_value, values)))
+            self.current[pk] = {field: values[field] for field in fields}
+            self.by_address.setdefault((normalize(company or ""), normalize(values["address"] or "")), []).append(pk)
+
+    def site_id(self, record):
+        if record.get("id") is not None:
+            try:
+                site_id = int(record["id"])
+            except (TypeError, ValueError):
+                raise ImportRowError(f"invalid id {record['id']!r}")
+            if site_id not in self.current:
+                raise ImportRowError(f"unknown site {site_id}")
+            return site_id
+        if not _value(record.get("address")):
+            raise ImportRowError("no id and no address to match by")
+        company, address = record.get("company") or "", record.get("address")
+        matches = self.by_address.get((normalize(company), normalize(address)), [])
+        if len(matches) != 1:
+            raise ImportRowError(f"{'ambiguous' if matches else 'unknown'} site {company} / {address!r}")
+        return matches[0]
+
+
+def _validated(field, value):
+    if value is None:
+        return value
+    if field == "maps_link":
+        try:
+            _validate_url(value)
+        except ValidationError:
+            raise ImportRowError(f"invalid maps_link {value!r}")
+    max_length = Site._meta.get_field(field).max_length
+    if max_length and len(value) > max_length:
+        raise ImportRowError(f"{field} longer than {max_length} characters")
+    return value
+
+
+def sync_stations(records, fields=SYNC_FIELDS, dry_run=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Writes hand-edited values of export records (stations.json, the
+    export_sites output) back to their sites: for each record the given
+    fields, where present in the record, are diffed in memory against the
+    site's current values, and only sites with differences are written,
+    with one bulk_update in one transaction. Re-syncing an unchanged
+    export reads the sites once and writes nothing.
+
+    Records that match no site, or several, are skipped and reported; when
+    two records match the same site, the last one wins. With dry_run
+    nothing is written.
+
+    Raises ImportFailed, with nothing written, if a value is invalid.
+    Returns a SyncReport.
+    """
+    fields = list(fields)
+    report = SyncReport(dry_run=dry_run)
+    errors = []
+    sites = RecordMatcher(fields)
+    wanted = {}  # site_id: {field: value}
+    for number, record in enumerate(records, start=1):
+        report.records += 1
+        if not isinstance(record, dict):
+            errors.append(f"record {number}: not an object")
+            continue
+        try:
+            site_id = sites.site_id(record)
+        except ImportRowError as e:
+            report.skipped.append(f"record {number}: {e}")
+            continue
+        try:
+            values = {field: _validated(field, _value(record[field])) for field in fields if field in record}
+        except ImportRowError as e:
+            errors.append(f"record {number}: {e}")
+            if len(errors) >= MAX_ERRORS:
+                break
+            continue
+        wanted.setdefault(site_id, {}).update(values)
+    if errors:
+        raise ImportFailed(errors)
+    report.sites = len(wanted)
+
+    updates = []
+    changed_fields = set()
+    now = timezone.now()
+    for site_id, values in wanted.items():
+        current = sites.current[site_id]
+        changes = [(field, current[field], value) for field, value in values.items() if current[field] != value]
+        if not changes:
+            continue
+        report.changes.extend((site_id, field, old, new) for field, old, new in changes)
+        changed_fields.update(field for field, _, _ in changes)
+        updates.append(Site(pk=site_id, updated_at=now, **{**current, **values}))
+
+    if not dry_run and updates:
+        with transaction.atomic():
+            # bulk_update neither sends signals nor applies auto_now
+            Site.objects.bulk_update(updates, sorted(changed_fields) + ["updated_at"], batch_size=batch_size)
+            touch_on_commit(Site.objects.filter(pk__in=report.changed_sites))
+            sites_changed(report.changed_sites)
+    return report
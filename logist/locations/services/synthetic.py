@@ -0,0 +1,107 @@
+import random
+from datetime import date, time, timedelta
+from django.db import transaction
+from ..models import Country, Region, Location, Group, Company, Site, DefaultHours, SiteException
+from .holiday_calendar import REGION_NAMES, generate_holidays
+from .onboarding import create_sites
+from .schedule import store_hours
+
+# (code, name, time zone, region names, latitude range, longitude range)
+COUNTRIES = [
+    ("DE", "Germany", "Europe/Berlin", [names[0] for names in REGION_NAMES["DE"].values()], (47.3, 55.0), (5.9, 15.0)),
+    ("AT", "Austria", "Europe/Vienna", [
+        "Burgenland", "Kärnten", "Niederösterreich", "Oberösterreich", "Salzburg",
+        "Steiermark", "Tirol", "Vorarlberg", "Wien",
+    ], (46.4, 49.0), (9.5, 17.2)),
+    ("PL", "Poland", "Europe/Warsaw", [
+        "Dolnośląskie", "Kujawsko-Pomorskie", "Lubelskie", "Lubuskie", "Łódzkie", "Małopolskie",
+        "Mazowieckie", "Opolskie", "Podkarpackie", "Podlaskie", "Pomorskie", "Śląskie",
+        "Świętokrzyskie", "Warmińsko-Mazurskie", "Wielkopolskie", "Zachodniopomorskie",
+    ], (49.0, 54.8), (14.1, 24.1)),
+]
+
+# Weekly patterns: (weekday hours, Saturday hours or None, Sunday hours or None)
+PATTERNS = [
+    ((time(8), time(17)), None, None),
+    ((time(6), time(22)), (time(8), time(12)), None),
+    ((time(7), time(16)), (time(7), time(12)), None),
+    ((time(0), time(0)), (time(0), time(0)), (time(0), time(0))),  # round the clock
+]
+
+
+def generate_catalogue(sites, seed=0, exception_share=0.02, batch_size=2000):
+    """
+    Creates a reproducible synthetic catalogue of about ``sites`` sites in
+    Germany, Austria and Poland: regions, one location per 20 sites, one
+    company per 50 sites in groups of ten, weekly hours from PATTERNS,
+    coordinates, site exceptions for ``exception_share`` of the sites and
+    generated public holidays for this year and the next.
+
+    Uses bulk inserts throughout; returns the created sites.
+    """
+    rng = random.Random(seed)
+    this_year = date.today().year
+
+    with transaction.atomic():
+        countries = []
+        for code, name, zone, region_names, lat_range, lon_range in COUNTRIES:
+            country, _ = Country.objects.get_or_create(code=code, defaults={"name": name, "time_zone": zone})
+            regions = Region.objects.bulk_create(
+                Region(name=region, name_key=Region.key_for(region), country=country) for region in region_names
+            )
+            countries.append((country, regions, lat_range, lon_range))
+
+        all_regions = [(region, lat, lon) for _, regions, lat, lon in countries for region in regions]
+        locations = Location.objects.bulk_create(
+            Location(name=f"Ort {n}", region=rng.choice(all_regions)[0]) for n in range(max(10, sites // 20))
+        )
+        bounds = {region.pk: (lat, lon) for region, lat, lon in all_regions}
+
+        company_count = max(5, sites // 50)
+        groups = Group.objects.bulk_create(Group(name=f"Gruppe {n}") for n in range(max(1, company_count // 10)))
+        companies = Company.objects.bulk_create(
+            Company(name=f"Spedition {n}", group=groups[n % len(groups)] if n % 3 else None)
+            for n in range(company_count)
+        )
+
+        def make_site(n):
+            location = locations[n % len(locations)]
+            (lat_min, lat_max), (lon_min, lon_max) = bounds[location.region_id]
+            return Site(
+                company=companies[n % len(companies)], location=location, name=f"Halle {n}",
+                address=f"Industriestraße {n % 200 + 1}", zip_code=f"{rng.randrange(1000, 99999):05d}",
+                latitude=rng.uniform(lat_min, lat_max), longitude=rng.uniform(lon_min, lon_max),
+                email=f"halle{n}@example.com",
+            )
+
+        created = create_sites((make_site(n) for n in range(sites)), batch_size=batch_size)
+
+        by_pattern = {}
+        for site in created:
+            by_pattern.setdefault(rng.randrange(len(PATTERNS)), []).append(site.pk)
+        for index, site_ids in by_pattern.items():
+            weekday, saturday, sunday = PATTERNS[index]
+            for days, hours in ((range(5), weekday), ([5], saturday), ([6], sunday)):
+                rows = DefaultHours.objects.filter(site_id__in=site_ids, weekday__in=days)
+                if hours:
+                    rows.update(open_time=hours[0], close_time=hours[1], is_closed=False)
+                else:
+                    rows.update(is_closed=True)
+
+        today = date.today()
+        SiteException.objects.bulk_create(
+            (
+                SiteException(
+                    site=site, date=today + timedelta(days=rng.randrange(60)),
+                    open_time=time(10) if n % 2 else None, close_time=time(14) if n % 2 else None,
+                    reason="Inventur",
+                )
+                for n, site in enumerate(rng.sample(created, int(len(created) * exception_share)))
+            ),
+            batch_size=batch_size, ignore_conflicts=True,
+        )
+
+    # DefaultHours were written with queryset updates
+    store_hours(batch_size=batch_size)
+    generate_holidays([this_year, this_year + 1], [code for code, *_ in COUNTRIES])
+    return created
@@ -0,0 +1,141 @@
+import zoneinfo
+from datetime import timedelta
+from threading import RLock
+from django.conf import settings
+from django.utils import timezone
+from ..models import Region, Location, Site
+from .opening_hours import resolve_hours
+
+
+def zone_name(region_zone, country_zone):
+    """
+    The IANA zone a region's sites live in: the region's own, else its
+    country's, else settings.TIME_ZONE.
+    """
+    return region_zone or country_zone or settings.TIME_ZONE
+
+
+def region_zones():
+    """
+    {region_id: zone name} for every region, in one query.
+    """
+    return {
+        region_id: zone_name(region_zone, country_zone)
+        for region_id, region_zone, country_zone in Region.objects.order_by()
+        .values_list("pk", "time_zone", "country__time_zone")
+    }
+
+
+def local_now(zone, at=None):
+    """
+    at (default: now) as a naive wall-clock datetime in zone.
+    """
+    at = at or timezone.now()
+    if timezone.is_naive(at):
+        return at
+    return at.astimezone(zoneinfo.ZoneInfo(zone)).replace(tzinfo=None)
+
+
+class TodayHours:
+    """
+    Resolved hours of every site for the current date in its own time zone.
+
+    Sites are grouped by zone; the first lookup for a (zone, local date)
+    resolves all sites of the zone for that day and the day before (whose
+    overnight hours may still run) in one resolve_hours pass, and later
+    lookups for any site of that zone are dict hits. An entry is dropped
+    when the zone's date rolls over or when hours, exceptions, holidays or
+    zones change (see signals).
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._zones = None  # ({location_id: zone}, {zone: [region_id, ...]})
+        self._entries = {}  # zone -> (local date, {site_id: (open_time, close_time)}, same for the day before)
+
+    def invalidate(self):
+        with self._lock:
+            self._zones = None
+            self._entries.clear()
+
+    def _load_zones(self):
+        if self._zones is None:
+            by_region = region_zones()
+            regions = {}
+            for region_id, zone in by_region.items():
+                regions.setdefault(zone, []).append(region_id)
+            locations = {
+                location_id: by_region[region_id]
+                for location_id, region_id in Location.objects.order_by().values_list("pk", "region_id")
+            }
+            self._zones = (locations, regions)
+        return self._zones
+
+    def zone_of(self, site):
+        with self._lock:
+            return self._load_zones()[0].get(site.location_id, settings.TIME_ZONE)
+
+    def _entry(self, zone, at):
+        day = local_now(zone, at).date()
+        with self._lock:
+            entry = self._entries.get(zone)
+            if entry is None or entry[0] != day:
+                region_ids = self._load_zones()[1].get(zone, [])
+                previous = day - timedelta(days=1)
+                resolved = resolve_hours(Site.objects.filter(location__region_id__in=region_ids), previous, day)
+                by_day = {day: {}, previous: {}}
+                for (site_id, resolved_day), hours in resolved.items():
+                    by_day[resolved_day][site_id] = hours
+                entry = self._entries[zone] = (day, by_day[day], by_day[previous])
+            return entry
+
+    def hours_in_zone(self, zone, at=None):
+        """
+        {site_id: (open_time, close_time)} of the zone's sites on the local
+        date of at (default: now) in that zone.
+        """
+        return self._entry(zone, at)[1]
+
+    def hours(self, site, at=None):
+        return self.hours_in_zone(self.zone_of(site), at).get(site.pk, (None, None))
+
+    def hours_since_yesterday(self, site, at=None):
+        """
+        (today's hours, yesterday's hours) of site by its local date.
+        """
+        _, today, yesterday = self._entry(self.zone_of(site), at)
+        return today.get(site.pk, (None, None)), yesterday.get(site.pk, (None, None))
+
+
+today_cache = TodayHours()
+
+
+def today_hours(site, at=None):
+    """
+    (open_time, close_time) of site today in its own time zone, or
+    (None, None) when closed.
+    """
+    return today_cache.hours(site, at)
+
+
+def is_open_now(site, at=None):
+    """
+    Whether site is open at at (default: now), judged by its local clock.
+    """
+    (open_time, close_time), previous = today_cache.hours_since_yesterday(site, at)
+    return is_open_within(open_time, close_time, local_now(today_cache.zone_of(site), at).time(), previous)
+
+
+def is_open_within(open_time, close_time, now, previous=(None, None)):
+    """
+    Whether the local time now falls within a day's (open_time, close_time),
+    or within the part of the previous day's hours that ran past midnight.
+    """
+    previous_open, previous_close = previous
+    if previous_open and previous_close and previous_close <= previous_open and now < previous_close:
+        return True
+    if open_time is None or close_time is None:
+        return False
+    if close_time <= open_time:  # closes after midnight
+        return now >= open_time
+    return open_time <= now < close_time
@@ -1,16 +1,244 @@
-from django.db.models.signals import post_save
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from .models import Site, DefaultHours, Weekday
+from .models import Country, Region, Location, Group, Company, Site, DefaultHours, SiteException, PublicHoliday, SiteDaySchedule
+from .services.availability import availability_index
+from .services.changes import touch_on_commit, touch_sites
+from .services import caching, day_schedule
+from .services.geo import spatial_index
+from .services.holidays import holiday_index
+from .services.onboarding import default_hours_for
+from .services.schedule import invalidate_schedule, store_hours
+from .services.search import search_index
+from .services.today import today_cache
 
 @receiver(post_save, sender=Site)
 def create_default_hours(sender, instance, created, **kwargs):
     """
     Automatically create 7 DefaultHours (one per weekday) when a Site is created.
+
+    A single bulk insert: the rows carry no hours, so the site's stored hours
+    (blank_week) stay valid and no per-row DefaultHours signal is needed.
+    Sites created with create_sites() get their rows from there instead.
     """
     if created:
-        for day_index, day_name in Weekday.CHOICES:
-            DefaultHours.objects.create(
-                site=instance,
-                weekday=day_index,
-                is_closed=False
-            )
\ No newline at end of file
+        DefaultHours.objects.bulk_create(default_hours_for([instance]))
+        invalidate_schedule(instance.pk)
+
+@receiver([post_save, post_delete], sender=DefaultHours)
+def invalidate_weekly_schedule(sender, instance, **kwargs):
+    """
+    Drop the compiled WeeklySchedule of the site whose hours changed.
+    """
+    invalidate_schedule(instance.site_id)
+
+@receiver(post_delete, sender=Site)
+def drop_weekly_schedule(sender, instance, **kwargs):
+    invalidate_schedule(instance.pk)
+
+@receiver([post_save, post_delete], sender=PublicHoliday)
+def refresh_holiday_index(sender, instance, **kwargs):
+    """
+    Reload the in-memory holiday calendar on its next use.
+    """
+    holiday_index.invalidate()
+
+@receiver([post_save, post_delete], sender=Site)
+def refresh_site_availability(sender, instance, **kwargs):
+    availability_index.invalidate_site(instance.pk)
+
+@receiver([post_save, post_delete], sender=DefaultHours)
+def refresh_hours_availability(sender, instance, **kwargs):
+    availability_index.invalidate_site(instance.site_id)
+
+@receiver([post_save, post_delete], sender=SiteException)
+def refresh_exception_availability(sender, instance, **kwargs):
+    availability_index.invalidate_exceptions()
+
+@receiver([post_save, post_delete], sender=Company)
+@receiver([post_save, post_delete], sender=Location)
+@receiver([post_save, post_delete], sender=Region)
+@receiver([post_save, post_delete], sender=Country)
+def rebuild_availability(sender, instance, **kwargs):
+    """
+    Group, region or time zone membership of many sites may have changed.
+    """
+    availability_index.invalidate()
+
+@receiver([post_save, post_delete], sender=DefaultHours)
+def store_site_hours(sender, instance, **kwargs):
+    """
+    Recompile Site.hours_summary / hours_data (this also bumps updated_at).
+    """
+    store_hours([instance.site_id])
+
+@receiver(post_save, sender=Site)
+def touch_site_on_commit(sender, instance, **kwargs):
+    """
+    Saved in a transaction (an admin form with its inlines), the site shows
+    up in the change feed with the time of the commit.
+    """
+    touch_on_commit(Site.objects.filter(pk=instance.pk))
+
+@receiver([post_save, post_delete], sender=SiteException)
+def touch_site_of_exception(sender, instance, **kwargs):
+    touch_sites(pk=instance.site_id)
+
+@receiver(post_save, sender=Company)
+def touch_company_sites(sender, instance, created, **kwargs):
+    if not created:
+        touch_sites(company=instance)
+
+@receiver(post_save, sender=Location)
+def touch_location_sites(sender, instance, created, **kwargs):
+    if not created:
+        touch_sites(location=instance)
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def touch_group_sites(sender, instance, **kwargs):
+    """
+    Also before delete: companies are detached (SET_NULL) without signals.
+    """
+    if not kwargs.get("created"):
+        touch_sites(company__group=instance)
+
+@receiver(post_save, sender=Site)
+def move_site_in_spatial_index(sender, instance, **kwargs):
+    spatial_index.update_site(instance.pk, instance.latitude, instance.longitude)
+
+@receiver(post_delete, sender=Site)
+def drop_site_from_spatial_index(sender, instance, **kwargs):
+    spatial_index.remove_site(instance.pk)
+
+@receiver([post_save, post_delete], sender=Site)
+@receiver([post_save, post_delete], sender=Company)
+@receiver([post_save, post_delete], sender=Location)
+@receiver([post_save, post_delete], sender=Group)
+def reindex_for_search(sender, instance, **kwargs):
+    search_index.invalidate_document(sender._meta.model_name, instance.pk)
+
+
+# -----------------------
+# Materialized day schedules
+# -----------------------
+def _cascaded(sender, kwargs):
+    """
+    Whether a post_delete comes from deleting a parent object (e.g. the
+    site itself), whose own cascade removes the day schedules.
+    """
+    origin = kwargs.get("origin")
+    if origin is None:
+        return False
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is not sender
+
+@receiver([post_save, post_delete], sender=DefaultHours)
+def materialize_site_days(sender, instance, **kwargs):
+    """
+    Only the dates of the weekday whose hours changed.
+    """
+    if not _cascaded(sender, kwargs):
+        day_schedule.materialize_weekdays({instance.site_id: {instance.weekday}})
+
+@receiver([post_save, post_delete], sender=SiteException)
+def materialize_exception_days(sender, instance, **kwargs):
+    """
+    The exception's date, and the dates of exceptions that moved away.
+    """
+    if not _cascaded(sender, kwargs):
+        days = day_schedule.materialized_days(SiteDaySchedule.EXCEPTION, site_id=instance.site_id)
+        day_schedule.materialize([instance.site_id], days=days | {instance.date})
+
+def _holiday_sites(country_id, region_id):
+    if region_id is not None:
+        return Site.objects.filter(location__region_id=region_id)
+    return Site.objects.filter(location__region__country_id=country_id)
+
+@receiver([post_save, post_delete], sender=PublicHoliday)
+def materialize_holiday_days(sender, instance, created=False, **kwargs):
+    """
+    The holiday's date for the sites of its region (or country), and on a
+    move the old date for the sites of the old region (or country); a
+    rename changes no hours.
+    """
+    if _cascaded(sender, kwargs):
+        return
+    loaded = getattr(instance, "_loaded_values", None)
+    if kwargs["signal"] is post_save and not created:
+        if loaded is not None and len(loaded) == len(PublicHoliday.TRACKED_FIELDS):
+            if not any(instance.has_changed(name) for name in PublicHoliday.TRACKED_FIELDS):
+                return
+            day_schedule.materialize(_holiday_sites(loaded["country_id"], loaded["region_id"]), days={loaded["date"]})
+        else:
+            # saved without being loaded: the old date is unknown
+            sites = _holiday_sites(instance.country_id, None)
+            days = day_schedule.materialized_days(SiteDaySchedule.HOLIDAY, site__in=sites)
+            day_schedule.materialize(sites, days=days | {instance.date})
+            return
+    day_schedule.materialize(_holiday_sites(instance.country_id, instance.region_id), days={instance.date})
+
+@receiver(post_save, sender=Site)
+def materialize_moved_site_days(sender, instance, created, **kwargs):
+    """
+    A site moved to another location may fall under other holidays.
+    """
+    if instance.has_changed("location_id"):
+        day_schedule.materialize([instance.pk])
+
+@receiver(post_save, sender=Location)
+def materialize_moved_location_days(sender, instance, created, **kwargs):
+    if instance.has_changed("region_id"):
+        day_schedule.materialize(instance.sites.all())
+
+@receiver([post_save, post_delete], sender=DefaultHours)
+@receiver([post_save, post_delete], sender=SiteException)
+@receiver([post_save, post_delete], sender=PublicHoliday)
+@receiver([post_save, post_delete], sender=Site)
+@receiver([post_save, post_delete], sender=Location)
+@receiver([post_save, post_delete], sender=Region)
+@receiver([post_save, post_delete], sender=Country)
+def reset_today_hours(sender, instance, **kwargs):
+    today_cache.invalidate()
+
+
+# -----------------------
+# Shared cache (services/caching.py)
+# -----------------------
+@receiver([post_save, post_delete], sender=Site)
+def bump_site_cache(sender, instance, **kwargs):
+    caching.bump(("site", instance.pk))
+
+@receiver([post_save, post_delete], sender=DefaultHours)
+@receiver([post_save, post_delete], sender=SiteException)
+def bump_site_hours_cache(sender, instance, **kwargs):
+    if not _cascaded(sender, kwargs):
+        caching.bump(("site", instance.site_id))
+
+@receiver([post_save, post_delete], sender=PublicHoliday)
+def bump_holiday_cache(sender, instance, **kwargs):
+    if not _cascaded(sender, kwargs):
+        caching.bump(("country", instance.country_id))
+
+@receiver([post_save, post_delete], sender=Company)
+def bump_company_cache(sender, instance, **kwargs):
+    caching.bump(("company", instance.pk))
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def bump_group_cache(sender, instance, **kwargs):
+    """
+    Companies carry their group's name; before delete as well, since they
+    are detached (SET_NULL) without signals.
+    """
+    caching.bump(*[("company", pk) for pk in instance.companies.values_list("pk", flat=True)])
+
+@receiver([post_save, post_delete], sender=Location)
+def bump_location_cache(sender, instance, **kwargs):
+    caching.bump(("location", instance.pk))
+
+@receiver([post_save, post_delete], sender=Region)
+@receiver([post_save, post_delete], sender=Country)
+def bump_structure_cache(sender, instance, **kwargs):
+    caching.bump(caching.STRUCTURE)
+
@@ -0,0 +1,14 @@
+'use strict';
+{
+    // Reload the changelist when an AutocompleteFilter box changes
+    const $ = django.jQuery;
+    $(function() {
+        $('select.autocomplete-filter').on('change', function() {
+            const url = new URL(this.dataset.clearUrl, window.location.href);
+            if (this.value) {
+                url.searchParams.set(this.dataset.filterParam, this.value);
+            }
+            window.location.href = url.toString();
+        });
+    });
+}
@@ -1,3 +1,1617 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import random
+import tempfile
+import threading
+from pathlib import Path
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from django.test import TestCase, override_settings
+
+from .admin import RegionAdmin
+from .models import (
+    Country, Region, Location, Group, Company, Site, DefaultHours, SiteException, PublicHoliday, SiteDaySchedule,
+    CacheGeneration,
+)
+from .services.opening_hours import get_site_hours, resolve_hours
+from .services.availability import availability_index, open_site_ids
+from .services.calendar_import import CalendarImportError, import_calendar
+from .services.change_feed import ChangeFeed, change_feed
+from .services import caching, day_schedule
+from .services.changes import hours_changed
+from .services.export import (
+    compact_export, default_manifest_path, expand_compact, export_incremental, export_shards, iter_records, write_json,
+)
+from .services.geo import distance_km, nearest_site_ids, spatial_index
+from .services.holiday_calendar import easter_sunday, generate_holidays
+from .services.holidays import holiday_index
+from .services.hours_import import import_hours, parse_day
+from .services.importing import ImportFailed, ImportRowError
+from .services.onboarding import create_sites, ensure_default_hours
+from .services.today import is_open_now, today_cache, today_hours
+from .services.search import normalize, search, search_index
+from .services.static_page import hours_rows, render_page
+from .services.stations_sync import sync_stations
+from .services.schedule import clear_schedules, compile_schedule, get_schedule, store_hours
+
+
+def make_catalogue():
+    """
+    Small catalogue: two Saxon sites and one Bavarian site, open Mo–Fr
+    08:00-17:00, closed at weekends.
+    """
+    germany = Country.objects.create(name="Germany", code="DE")
+    sachsen = Region.objects.create(name="Sachsen", country=germany)
+    bayern = Region.objects.create(name="Bayern", country=germany)
+    dresden = Location.objects.create(name="Dresden", region=sachsen)
+    munich = Location.objects.create(name="München", region=bayern)
+    company = Company.objects.create(name="ARS Altmann AG")
+    sites = [
+        Site.objects.create(company=company, location=dresden, name="Nord"),
+        Site.objects.create(company=company, location=dresden, name="Süd"),
+        Site.objects.create(company=company, location=munich, name="Hafen"),
+    ]
+    DefaultHours.objects.filter(weekday__lt=5).update(open_time=time(8), close_time=time(17))
+    DefaultHours.objects.filter(weekday__gte=5).update(is_closed=True)
+    # queryset updates bypass the DefaultHours signals
+    store_hours()
+    for site in sites:
+        site.refresh_from_db()
+    return germany, sachsen, bayern, sites
+
+
+@override_settings(CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "locations-tests"},
+})
+class LocationsTestCase(TestCase):
+    """
+    Clears the process-wide caches, which a test rollback does not
+    invalidate. Classes setting catalogue build the make_catalogue() data
+    once per class instead of in every test's setUp.
+    """
+    catalogue = False
+
+    @classmethod
+    def setUpTestData(cls):
+        if cls.catalogue:
+            cls.germany, cls.sachsen, cls.bayern, cls.sites = make_catalogue()
+
+    def setUp(self):
+        cache.clear()
+        clear_schedules()
+        holiday_index.invalidate()
+        availability_index.invalidate()
+        spatial_index.invalidate()
+        search_index.invalidate()
+        today_cache.invalidate()
+
+
+class ResolveHoursTests(LocationsTestCase):
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        nord, sued, hafen = self.sites
+        # Monday 2025-11-17 .. Sunday 2025-11-23
+        self.start = date(2025, 11, 17)
+        self.end = date(2025, 11, 23)
+        PublicHoliday.objects.create(country=self.germany, region=self.sachsen, date=date(2025, 11, 19), name="Buß- und Bettag")
+        PublicHoliday.objects.create(country=self.germany, date=date(2025, 11, 21), name="Test holiday")
+        SiteException.objects.create(site=nord, date=date(2025, 11, 18), reason="Inventur")
+        SiteException.objects.create(site=hafen, date=date(2025, 11, 22), open_time=time(9), close_time=time(12))
+
+    def test_matches_single_site_resolver(self):
+        resolved = resolve_hours(Site.objects.all(), self.start, self.end)
+        self.assertEqual(len(resolved), len(self.sites) * 7)
+        day = self.start
+        while day <= self.end:
+            for site in self.sites:
+                self.assertEqual(resolved[site.pk, day], get_site_hours(site, day), (site, day))
+            day += timedelta(days=1)
+
+    def test_priority_rules(self):
+        nord, sued, hafen = self.sites
+        resolved = resolve_hours(self.sites, self.start, self.end)
+        self.assertEqual(resolved[nord.pk, date(2025, 11, 17)], (time(8), time(17)))
+        self.assertEqual(resolved[nord.pk, date(2025, 11, 18)], (None, None))
+        self.assertEqual(resolved[sued.pk, date(2025, 11, 19)], (None, None))
+        self.assertEqual(resolved[hafen.pk, date(2025, 11, 19)], (time(8), time(17)))
+        self.assertEqual(resolved[hafen.pk, date(2025, 11, 21)], (None, None))
+        self.assertEqual(resolved[hafen.pk, date(2025, 11, 22)], (time(9), time(12)))
+
+    def test_constant_query_count(self):
+        # sites, exceptions, default hours, plus the first holiday index load
+        with self.assertNumQueries(4):
+            resolve_hours(Site.objects.all(), self.start, self.start + timedelta(days=60))
+        with self.assertNumQueries(3):
+            resolve_hours(Site.objects.all(), self.start, self.start + timedelta(days=60))
+
+
+class WeeklyScheduleTests(LocationsTestCase):
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        self.site = self.sites[0]
+
+    def test_display_and_lookups_without_queries(self):
+        get_schedule(self.site)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.site.hours_display, "Mo–Fr 08:00-17:00; Sa–So Closed")
+            schedule = get_schedule(self.site)
+            self.assertEqual(schedule.display, "Mo–Fr 08:00-17:00; Sa–So Closed")
+            self.assertEqual(schedule.hours_on(0), (time(8), time(17)))
+            self.assertEqual(schedule.hours_on(6), (None, None))
+            self.assertTrue(schedule.is_open_at(datetime(2025, 11, 17, 8, 0)))
+            self.assertFalse(schedule.is_open_at(datetime(2025, 11, 17, 17, 0)))
+            self.assertFalse(schedule.is_open_at(datetime(2025, 11, 22, 10, 0)))
+
+    def test_rebuilt_on_default_hours_change(self):
+        self.assertEqual(get_schedule(self.site).display, "Mo–Fr 08:00-17:00; Sa–So Closed")
+        saturday = self.site.default_hours.get(weekday=5)
+        saturday.is_closed = False
+        saturday.open_time, saturday.close_time = time(8), time(12)
+        saturday.save()
+        self.assertEqual(get_schedule(self.site).display, "Mo–Fr 08:00-17:00; Sa 08:00-12:00; So Closed")
+        saturday.delete()
+        self.assertEqual(get_schedule(self.site).display, "Mo–Fr 08:00-17:00; So Closed")
+
+    def test_overnight_hours(self):
+        schedule = compile_schedule([(6, time(22), time(6), False)])
+        self.assertTrue(schedule.is_open(6, 23 * 60))
+        self.assertTrue(schedule.is_open(0, 5 * 60))
+        self.assertFalse(schedule.is_open(0, 6 * 60))
+
+    def test_unknown_hours_display_empty(self):
+        site = Site.objects.create(company=self.site.company, location=self.site.location, name="Neu")
+        self.assertEqual(get_schedule(site).display, "")
+
+
+class StoredHoursTests(LocationsTestCase):
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        self.site = self.sites[0]
+
+    def test_stored_on_site(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.site.hours_display, "Mo–Fr 08:00-17:00; Sa–So Closed")
+        self.assertEqual(self.site.hours_data, [[[480, 1020]]] * 5 + [[], []])
+
+    def test_maintained_from_signals(self):
+        saturday = self.site.default_hours.get(weekday=5)
+        saturday.is_closed = False
+        saturday.open_time, saturday.close_time = time(22), time(2)
+        saturday.save()
+        self.site.refresh_from_db()
+        self.assertEqual(self.site.hours_display, "Mo–Fr 08:00-17:00; Sa 22:00-02:00; So Closed")
+        self.assertEqual(self.site.hours_data[5], [[1320, 1560]])
+        self.site.default_hours.get(weekday=6).delete()
+        self.site.refresh_from_db()
+        self.assertEqual(self.site.hours_display, "Mo–Fr 08:00-17:00; Sa 22:00-02:00")
+        self.assertIsNone(self.site.hours_data[6])
+
+    def test_stale_instance_does_not_overwrite(self):
+        stale = Site.objects.get(pk=self.site.pk)
+        self.site.default_hours.filter(weekday=0).get().delete()
+        stale.phone = "0351 123456"
+        stale.save()
+        stale.refresh_from_db()
+        self.assertEqual(stale.hours_display, "Di–Fr 08:00-17:00; Sa–So Closed")
+
+    def test_backfill_command(self):
+        Site.objects.update(hours_summary="", hours_data=[])
+        out = io.StringIO()
+        # one DefaultHours query and one bulk_update per batch, after the id query
+        with self.assertNumQueries(5):
+            call_command("backfill_hours_display", batch_size=2, stdout=out)
+        self.assertEqual(out.getvalue().strip(), "Stored hours of 3 sites.")
+        self.assertEqual(Site.objects.get(pk=self.site.pk).hours_display, "Mo–Fr 08:00-17:00; Sa–So Closed")
+
+
+class HolidayIndexTests(LocationsTestCase):
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        PublicHoliday.objects.create(country=self.germany, date=date(2025, 10, 3), name="Tag der Deutschen Einheit")
+        PublicHoliday.objects.create(country=self.germany, region=self.sachsen, date=date(2025, 11, 19), name="Buß- und Bettag")
+
+    def test_lookups_from_memory(self):
+        holiday_index.is_holiday(self.germany.pk, None, date(2025, 1, 1))
+        with self.assertNumQueries(0):
+            self.assertTrue(holiday_index.is_holiday(self.germany.pk, self.bayern.pk, date(2025, 10, 3)))
+            self.assertTrue(holiday_index.is_holiday(self.germany.pk, self.sachsen.pk, date(2025, 11, 19)))
+            self.assertFalse(holiday_index.is_holiday(self.germany.pk, self.bayern.pk, date(2025, 11, 19)))
+            self.assertFalse(holiday_index.is_holiday(self.germany.pk, None, date(2025, 11, 19)))
+            self.assertEqual(
+                holiday_index.holidays_in_year(self.germany.pk, self.sachsen.pk, 2025),
+                [date(2025, 10, 3), date(2025, 11, 19)],
+            )
+            self.assertEqual(holiday_index.holidays_in_year(self.germany.pk, self.bayern.pk, 2024), [])
+
+    def test_refreshed_on_change(self):
+        day = date(2025, 12, 25)
+        self.assertFalse(holiday_index.is_holiday(self.germany.pk, self.bayern.pk, day))
+        holiday = PublicHoliday.objects.create(country=self.germany, date=day, name="1. Weihnachtstag")
+        self.assertTrue(holiday_index.is_holiday(self.germany.pk, self.bayern.pk, day))
+        holiday.delete()
+        self.assertFalse(holiday_index.is_holiday(self.germany.pk, self.bayern.pk, day))
+
+
+class AvailabilityIndexTests(LocationsTestCase):
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        self.monday = datetime(2025, 11, 17, 10, 0)
+
+    def test_open_sites_with_filters(self):
+        nord, sued, hafen = self.sites
+        self.assertEqual(open_site_ids(self.monday), {nord.pk, sued.pk, hafen.pk})
+        self.assertEqual(open_site_ids(self.monday, region=self.bayern), {hafen.pk})
+        self.assertEqual(open_site_ids(self.monday, country=self.germany.pk, location=nord.location), {nord.pk, sued.pk})
+        self.assertEqual(open_site_ids(self.monday, company=nord.company, group=None), {nord.pk, sued.pk, hafen.pk})
+        self.assertEqual(open_site_ids(self.monday.replace(hour=18)), set())
+        self.assertEqual(open_site_ids(datetime(2025, 11, 22, 10, 0)), set())
+        with self.assertRaises(TypeError):
+            open_site_ids(self.monday, zip_code="01067")
+
+    def test_overrides(self):
+        nord, sued, hafen = self.sites
+        PublicHoliday.objects.create(country=self.germany, region=self.sachsen, date=date(2025, 11, 17), name="Test")
+        SiteException.objects.create(site=sued, date=date(2025, 11, 17), open_time=time(9), close_time=time(11))
+        SiteException.objects.create(site=hafen, date=date(2025, 11, 17), reason="Inventur")
+        self.assertEqual(open_site_ids(self.monday), {sued.pk})
+        self.assertEqual(open_site_ids(self.monday.replace(hour=11)), set())
+
+    def test_overnight_hours_follow_their_own_day(self):
+        nord, sued, hafen = self.sites
+        friday = nord.default_hours.get(weekday=4)
+        friday.open_time, friday.close_time = time(22), time(2)
+        friday.save()
+        night = datetime(2025, 11, 22, 1, 0)
+        self.assertEqual(open_site_ids(night), {nord.pk})
+        PublicHoliday.objects.create(country=self.germany, region=self.sachsen, date=date(2025, 11, 22), name="Samstag")
+        self.assertEqual(open_site_ids(night), {nord.pk})
+        PublicHoliday.objects.create(country=self.germany, region=self.sachsen, date=date(2025, 11, 21), name="Freitag")
+        self.assertEqual(open_site_ids(night), set())
+
+    def test_overnight_exception(self):
+        nord, sued, hafen = self.sites
+        SiteException.objects.create(site=hafen, date=date(2025, 11, 19), open_time=time(20), close_time=time(3))
+        SiteException.objects.create(site=hafen, date=date(2025, 11, 20), reason="Inventur")
+        self.assertEqual(open_site_ids(datetime(2025, 11, 19, 21, 0), region=self.bayern), {hafen.pk})
+        self.assertEqual(open_site_ids(datetime(2025, 11, 20, 2, 0), region=self.bayern), {hafen.pk})
+        self.assertEqual(open_site_ids(datetime(2025, 11, 20, 3, 0), region=self.bayern), set())
+
+    def test_refreshes_changed_site_only(self):
+        nord, sued, hafen = self.sites
+        open_site_ids(self.monday)
+        with self.assertNumQueries(0):
+            open_site_ids(self.monday)
+        monday = hafen.default_hours.get(weekday=0)
+        monday.is_closed = True
+        monday.save()
+        with self.assertNumQueries(2):
+            self.assertEqual(open_site_ids(self.monday), {nord.pk, sued.pk})
+
+
+class ExportSitesTests(LocationsTestCase):
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        group = Group.objects.create(name="Altmann Gruppe")
+        Company.objects.filter(pk=self.sites[0].company_id).update(group=group)
+        Site.objects.create(company=Company.objects.create(name="Autokontor Bayern GmbH"), location=self.sites[2].location)
+
+    def test_streamed_json_matches_json_dump(self):
+        records = list(iter_records())
+        for indent in (2, None):
+            out = io.StringIO()
+            self.assertEqual(write_json(iter(records), out, indent=indent), 4)
+            self.assertEqual(out.getvalue(), json.dumps(records, ensure_ascii=False, indent=indent))
+        out = io.StringIO()
+        write_json([], out)
+        self.assertEqual(out.getvalue(), "[]")
+
+    def test_command_output(self):
+        out = io.StringIO()
+        # sites with company, group, location and stored hours in one query per chunk
+        with self.assertNumQueries(1):
+            call_command("export_sites", stdout=out)
+        records = json.loads(out.getvalue())
+        self.assertEqual([r["company"] for r in records], ["ARS Altmann AG"] * 3 + ["Autokontor Bayern GmbH"])
+        self.assertEqual(records[0]["name"], "Altmann Gruppe - Dresden - Nord")
+        self.assertEqual(records[0]["hours"], "Mo–Fr 08:00-17:00; Sa–So Closed")
+        self.assertEqual(records[3]["name"], "Autokontor Bayern GmbH - München")
+        self.assertEqual(records[3]["hours"], "")
+
+
+class ShardedExportTests(LocationsTestCase):
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        self.other = Company.objects.create(name="Autokontor Bayern GmbH")
+        Site.objects.create(company=self.other, location=self.sites[2].location, name="Lager")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = Path(tmp.name)
+
+    def manifest(self):
+        return json.loads((self.directory / "manifest.json").read_text(encoding="utf-8"))
+
+    def shard(self, entry):
+        return json.loads((self.directory / entry["file"]).read_text(encoding="utf-8"))
+
+    def test_shards_and_manifest(self):
+        with self.assertNumQueries(1):
+            export_shards(self.directory)
+        manifest = self.manifest()
+        self.assertEqual(manifest["count"], 4)
+        self.assertEqual([c["name"] for c in manifest["companies"]], ["ARS Altmann AG", "Autokontor Bayern GmbH"])
+        self.assertEqual([c["count"] for c in manifest["companies"]], [3, 1])
+        self.assertEqual([(r["name"], r["count"]) for r in manifest["regions"]], [("Bayern", 2), ("Sachsen", 2)])
+        records = list(iter_records())
+        self.assertEqual([r for c in manifest["companies"] for r in self.shard(c)], records)
+        self.assertEqual(self.shard(manifest["regions"][0]), [records[2], records[3]])
+
+    def test_only_changed_shards_are_rewritten(self):
+        export_shards(self.directory)
+        before = {c["file"]: c["hash"] for c in self.manifest()["companies"]}
+        report = export_shards(self.directory)
+        self.assertEqual(report.written, [])
+
+        sued = self.sites[1]
+        sued.phone = "0351 1234"
+        sued.save()
+        report = export_shards(self.directory)
+        self.assertEqual(report.written, [f"companies/{sued.company_id}.json", f"regions/{self.sachsen.pk}.json"])
+        after = {c["file"]: c["hash"] for c in self.manifest()["companies"]}
+        self.assertEqual(after[f"companies/{self.other.pk}.json"], before[f"companies/{self.other.pk}.json"])
+
+        other_id = self.other.pk
+        self.other.delete()
+        report = export_shards(self.directory)
+        self.assertEqual(report.removed, [f"companies/{other_id}.json"])
+        self.assertFalse((self.directory / "companies" / f"{other_id}.json").exists())
+
+    def test_command(self):
+        err = io.StringIO()
+        call_command("export_sites", "--shards", str(self.directory), stdout=io.StringIO(), stderr=err)
+        self.assertIn("4 shards written", err.getvalue())
+
+
+class CompactExportTests(LocationsTestCase):
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        group = Group.objects.create(name="Altmann Gruppe")
+        Company.objects.filter(pk=self.sites[0].company_id).update(group=group)
+        Site.objects.create(company=Company.objects.create(name="Autokontor Bayern GmbH"), location=self.sites[2].location)
+
+    def test_dictionary_encoding(self):
+        with self.assertNumQueries(1):
+            document = compact_export()
+        self.assertEqual(document["groups"], ["Altmann Gruppe"])
+        self.assertEqual(document["companies"], [["ARS Altmann AG", 0], ["Autokontor Bayern GmbH", None]])
+        self.assertEqual(document["locations"], ["Dresden", "München"])
+        # three sites share one week, the new site has no hours yet
+        self.assertEqual(document["weeks"], [[[[480, 1020]]] * 5 + [[], []], [None] * 7])
+        self.assertEqual(document["sites"][0], [self.sites[0].pk, 0, 0, "Nord", None, None, None, 0])
+
+    def test_expands_to_export_records(self):
+        records = list(iter_records())
+        expanded = expand_compact(compact_export())
+        self.assertEqual([r["name"] for r in expanded], [r["name"] for r in records])
+        self.assertEqual([r["company"] for r in expanded], [r["company"] for r in records])
+        self.assertEqual(expanded[0]["hours"], Site.objects.get(pk=self.sites[0].pk).hours_data)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command("export_sites", "--format", "compact", stdout=out)
+        self.assertEqual(json.loads(out.getvalue()), compact_export())
+        with self.assertRaises(CommandError):
+            call_command("export_sites", "--format", "msgpack", stdout=io.StringIO())
+
+
+class IncrementalExportTests(LocationsTestCase):
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "sites_data.json"
+
+    def exported(self):
+        return json.loads(self.path.read_text(encoding="utf-8"))
+
+    def test_only_changed_sites_are_rewritten(self):
+        nord, sued, hafen = self.sites
+        report = export_incremental(self.path)
+        self.assertTrue(report.full)
+        self.assertEqual(self.exported(), list(iter_records()))
+
+        report = export_incremental(self.path)
+        self.assertFalse(report.rewritten)
+        self.assertEqual(report.unchanged, 3)
+
+        saturday = sued.default_hours.get(weekday=5)
+        saturday.is_closed, saturday.open_time, saturday.close_time = False, time(8), time(12)
+        saturday.save()
+        hafen_id = hafen.pk
+        hafen.delete()
+        Site.objects.create(company=nord.company, location=nord.location, name="West")
+        report = export_incremental(self.path)
+        self.assertEqual(report.changed, [sued.pk])
+        self.assertEqual(report.removed, [hafen_id])
+        self.assertEqual(len(report.added), 1)
+        self.assertEqual(self.exported(), list(iter_records()))
+
+    def test_sites_committed_after_the_run_are_picked_up(self):
+        nord = self.sites[0]
+        export_incremental(self.path)
+        manifest = json.loads(default_manifest_path(self.path).read_text(encoding="utf-8"))
+        # bumped just before the run, but committed only after its read
+        exported_at = datetime.fromisoformat(manifest["exported_at"])
+        Site.objects.filter(pk=nord.pk).update(name="Nordtor", updated_at=exported_at - timedelta(seconds=1))
+        report = export_incremental(self.path)
+        self.assertEqual(report.changed, [nord.pk])
+        self.assertEqual(report.unchanged, 2)
+        self.assertEqual(self.exported(), list(iter_records()))
+
+    def test_touch_without_content_change(self):
+        export_incremental(self.path)
+        Company.objects.get().save()
+        report = export_incremental(self.path)
+        self.assertFalse(report.rewritten)
+        self.assertEqual(report.unchanged, 3)
+
+    def test_group_rename_is_exported(self):
+        export_incremental(self.path)
+        group = Group.objects.create(name="Altmann")
+        Company.objects.update(group=group)
+        group.name = "Altmann Gruppe"
+        group.save()
+        report = export_incremental(self.path)
+        self.assertEqual(len(report.changed), 3)
+        self.assertTrue(all(r["name"].startswith("Altmann Gruppe - ") for r in self.exported()))
+
+
+class ApiTests(LocationsTestCase):
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        # a mid-sized page: the query count must not depend on it
+        company = self.sites[0].company
+        for n in range(40):
+            Site.objects.create(company=company, location=self.sites[2].location, name=f"Halle {n}")
+
+    def test_site_list_pagination_fields_and_filters(self):
+        url = reverse("locations:site-list")
+        response = self.client.get(url, {"limit": 2, "fields": "id,name,hours"})
+        body = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body["results"][0], {"id": self.sites[0].pk, "name": "Nord", "hours": "Mo–Fr 08:00-17:00; Sa–So Closed"})
+        self.assertIn(f"after={self.sites[1].pk}", body["next"])
+        body = self.client.get(body["next"]).json()
+        self.assertEqual(body["results"][0]["id"], self.sites[2].pk)
+
+        body = self.client.get(url, {"region": self.sachsen.pk, "fields": "id"}).json()
+        self.assertEqual(body, {"results": [{"id": self.sites[0].pk}, {"id": self.sites[1].pk}], "next": None})
+        self.assertEqual(len(self.client.get(url, {"country": "de", "limit": 500}).json()["results"]), 43)
+        self.assertEqual(self.client.get(url, {"fields": "nope"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"limit": 0}).status_code, 400)
+
+    def test_bounded_queries(self):
+        url = reverse("locations:site-list")
+        # cache generations, state for ETag/Last-Modified, page
+        with self.assertNumQueries(3):
+            self.client.get(url, {"limit": 500})
+        with self.assertNumQueries(3):
+            self.client.get(url, {"limit": 5})
+        # generations, state, page, generations of the sites, locations and countries,
+        # then resolve_hours: sites, exceptions, default hours (holidays loaded)
+        self.client.get(reverse("locations:hours-list"))
+        with self.assertNumQueries(9):
+            self.client.get(reverse("locations:hours-list"), {"start": "2025-11-17", "end": "2025-11-30", "limit": 500})
+
+    def test_conditional_get(self):
+        url = reverse("locations:site-detail", args=[self.sites[0].pk])
+        response = self.client.get(url)
+        self.assertEqual(response.json()["company_name"], "ARS Altmann AG")
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304)
+        SiteException.objects.create(site=self.sites[0], date=date(2025, 12, 24))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        url = reverse("locations:site-hours", args=[self.sites[0].pk])
+        response = self.client.get(url, {"date": "2025-11-19"})
+        self.assertEqual(response.json(), {"id": self.sites[0].pk, "hours": {"2025-11-19": {"open": "08:00", "close": "17:00"}}})
+        PublicHoliday.objects.create(country=self.germany, region=self.sachsen, date=date(2025, 11, 19), name="Buß- und Bettag")
+        response = self.client.get(url, {"date": "2025-11-19"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.json()["hours"], {"2025-11-19": None})
+
+    def test_changes_of_other_processes_reach_the_indexes(self):
+        url = reverse("locations:site-hours", args=[self.sites[0].pk])
+        response = self.client.get(url, {"date": "2025-11-19"})
+        # another process adds a holiday: its signals materialize the days and bump the shared generations
+        PublicHoliday.objects.bulk_create([
+            PublicHoliday(country=self.germany, region=self.sachsen, date=date(2025, 11, 19), name="Buß- und Bettag"),
+        ])
+        day_schedule.materialize(Site.objects.filter(location__region=self.sachsen), days={date(2025, 11, 19)})
+        self.assertEqual(self.client.get(url, {"date": "2025-11-19"}, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        for scope in [("country", self.germany.pk), caching.CATALOGUE]:
+            CacheGeneration.objects.update_or_create(scope=caching._generation_key(scope), defaults={"token": "elsewhere"})
+        response = self.client.get(url, {"date": "2025-11-19"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["hours"], {"2025-11-19": None})
+        self.assertTrue(holiday_index.is_holiday(self.germany.pk, self.sachsen.pk, date(2025, 11, 19)))
+
+    def test_companies_and_missing_site(self):
+        body = self.client.get(reverse("locations:company-list")).json()
+        self.assertEqual(body["results"], [{"id": self.sites[0].company_id, "name": "ARS Altmann AG", "group": None, "group_name": None}])
+        self.assertEqual(self.client.get(reverse("locations:site-detail", args=[999])).status_code, 404)
+
+    def test_company_etag_follows_companies_without_sites_and_groups(self):
+        url = reverse("locations:company-list")
+        company = Company.objects.create(name="Leer GmbH")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        company.name = "Leer AG"
+        company.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        group = Group.objects.create(name="Gruppe")
+        etag = self.client.get(url)["ETag"]
+        company.group = group
+        company.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Gruppe", response.content.decode())
+
+
+class OnboardingTests(LocationsTestCase):
+    catalogue = True
+
+    def test_single_site_creates_hours_in_one_insert(self):
+        nord = self.sites[0]
+        # savepoint, site insert, default hours insert, cache generations bump, release
+        with self.assertNumQueries(6):
+            site = Site.objects.create(company=nord.company, location=nord.location, name="West")
+        self.assertEqual(sorted(site.default_hours.values_list("weekday", flat=True)), list(range(7)))
+        self.assertEqual(site.hours_data, [None] * 7)
+
+    def test_create_sites_in_batches(self):
+        nord = self.sites[0]
+        sites = [
+            Site(company=nord.company, location=nord.location, name=f"Halle {n}", email=f"HALLE{n}@Example.com")
+            for n in range(50)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            # savepoint, 2 site batches, 2 default hours batches, release
+            with self.assertNumQueries(6):
+                created = create_sites(sites, batch_size=25)
+        self.assertEqual(DefaultHours.objects.filter(site__in=created).count(), 350)
+        self.assertEqual(created[0].email, "halle0@example.com")
+        self.assertEqual(Site.objects.get(pk=created[0].pk).hours_display, "")
+        self.assertEqual(len(open_site_ids(datetime(2025, 11, 17, 10, 0))), 3)
+
+    def test_onboard_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8") as f:
+            f.write("company,location,region,name,address,zip_code\n")
+            f.write("ARS Altmann AG,Dresden,Sachsen,Nord,,\n")
+            f.write("ARS Altmann AG,Leipzig,Sachsen,,Am Hafen 1,04109\n")
+            f.write("Neue Logistik GmbH,München,Bayern,Nord,,\n")
+        self.addCleanup(Path(f.name).unlink)
+        out = io.StringIO()
+        call_command("onboard_sites", f.name, stdout=out)
+        self.assertEqual(out.getvalue().strip(), "Created 2 sites (1 new companies, 1 new locations); skipped 1 existing.")
+        leipzig = Site.objects.get(location__name="Leipzig")
+        self.assertEqual((leipzig.company.name, leipzig.zip_code, leipzig.default_hours.count()), ("ARS Altmann AG", "04109", 7))
+
+
+def add_sites(country, regions=3, locations_per_region=4, sites_per_location=100):
+    """
+    Bulk-adds regions, locations, companies and sites to a country, plus a
+    regional holiday per region; e.g. the defaults add 1,200 sites.
+    """
+    regions = Region.objects.bulk_create(
+        Region(name=f"Region {country.code} {n}", country=country) for n in range(regions)
+    )
+    locations = Location.objects.bulk_create(
+        Location(name=f"Ort {region.pk}-{n}", region=region)
+        for region in regions for n in range(locations_per_region)
+    )
+    companies = Company.objects.bulk_create(Company(name=f"Spedition {n}") for n in range(10))
+    PublicHoliday.objects.bulk_create(
+        PublicHoliday(country=country, region=region, date=date(2025, 11, 19), name="Feiertag") for region in regions
+    )
+    return create_sites(
+        Site(company=companies[n % len(companies)], location=location, name=f"Halle {n}")
+        for location in locations for n in range(sites_per_location)
+    )
+
+
+class AdminQueryBudgetTests(LocationsTestCase):
+    """
+    Changelists and change forms run the same number of queries with a
+    handful of rows and with more than a thousand.
+    """
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        user = get_user_model().objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client.force_login(user)
+        self.site = self.sites[0]
+        SiteException.objects.create(site=self.site, date=date(2025, 12, 24), reason="Heiligabend")
+        self.urls = [
+            reverse("admin:locations_site_changelist"),
+            reverse("admin:locations_site_changelist") + f"?location__region__id__exact={self.sachsen.pk}",
+            reverse("admin:locations_site_change", args=[self.site.pk]),
+            reverse("admin:locations_site_add"),
+            reverse("admin:locations_location_changelist"),
+            reverse("admin:locations_location_add"),
+            reverse("admin:locations_region_changelist"),
+            reverse("admin:locations_publicholiday_changelist"),
+            reverse("admin:locations_publicholiday_add"),
+            reverse("admin:locations_siteexception_changelist"),
+        ]
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        for url in self.urls:
+            # warm per-process caches (content types) first
+            self.client.get(url)
+        small = {url: self.count_queries(url) for url in self.urls}
+        add_sites(self.germany)
+        add_sites(Country.objects.create(name="Austria", code="AT"))
+        self.assertGreater(Site.objects.count(), 2000)
+        self.assertGreater(Location.objects.count(), 20)
+        for url in self.urls:
+            self.assertEqual(self.count_queries(url), small[url], url)
+            self.assertLess(small[url], 20, url)
+
+    def test_weekday_rows_cannot_be_added(self):
+        response = self.client.get(reverse("admin:locations_site_change", args=[self.site.pk]))
+        hours = next(inline for inline in response.context["inline_admin_formsets"] if inline.opts.model is DefaultHours)
+        self.assertFalse(hours.has_add_permission)
+        self.assertEqual(len(hours.formset.forms), 7)
+
+    def test_autocomplete_filters_and_widgets(self):
+        add_sites(self.germany)
+        Country.objects.create(name="Austria", code="AT")
+        url = reverse("admin:locations_site_changelist")
+        response = self.client.get(url, {"location__region__id__exact": self.sachsen.pk})
+        self.assertContains(response, 'data-field-name="region"')
+        self.assertContains(response, f'<option value="{self.sachsen.pk}" selected>Sachsen, DE</option>', html=True)
+        self.assertContains(response, f"Germany ({Site.objects.count()})")
+        self.assertContains(response, "Austria (0)")
+        self.assertNotContains(response, "Ort ")
+        self.assertEqual(response.context["cl"].result_count, 2)
+
+        response = self.client.get(reverse("admin:locations_site_change", args=[self.site.pk]))
+        self.assertNotContains(response, "Ort ")
+
+        response = self.client.get(reverse("admin:autocomplete"), {
+            "app_label": "locations", "model_name": "site", "field_name": "location", "term": "dres",
+        })
+        self.assertEqual(response.json()["results"], [{"id": str(self.site.location_id), "text": "Dresden (Sachsen, DE)"}])
+
+    def test_indexed_search_keeps_the_ranking(self):
+        for name in ("Aachen Altmann Transporte", "Altmann Logistik GmbH", "Abc Logistik"):
+            Company.objects.create(name=name)
+        url = reverse("admin:locations_company_changelist")
+        ranked = search_index.search_ids("Altmann Logistik", "company")
+        names = dict(Company.objects.values_list("pk", "name"))
+        self.assertEqual(names[ranked[0]], "Altmann Logistik GmbH")
+        response = self.client.get(url, {"q": "Altmann Logistik"})
+        self.assertEqual([company.pk for company in response.context["cl"].result_list], ranked)
+        # sorting by a column still wins
+        response = self.client.get(url, {"q": "Altmann Logistik", "o": "1"})
+        listed = [company.name for company in response.context["cl"].result_list]
+        self.assertEqual(listed, sorted(listed))
+        response = self.client.get(reverse("admin:autocomplete"), {
+            "app_label": "locations", "model_name": "site", "field_name": "company", "term": "Altmann Logistik",
+        })
+        self.assertEqual([int(result["id"]) for result in response.json()["results"]], ranked)
+
+    def test_region_prefix_search_uses_the_index(self):
+        Region.objects.create(name="Sachsen-Anhalt", country=self.germany)
+        response = self.client.get(reverse("admin:locations_region_changelist"), {"q": "SACHS"})
+        self.assertEqual(response.context["cl"].result_count, 2)
+        queryset = RegionAdmin(Region, admin.site).get_search_results(None, Region.objects.all(), "sachs")[0]
+        plan = queryset.explain()
+        self.assertIn("SEARCH", plan)
+        self.assertIn("name_key", plan)
+
+    def test_get_does_not_write(self):
+        self.site.default_hours.filter(weekday=6).delete()
+        url = reverse("admin:locations_site_change", args=[self.site.pk])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        writes = [q["sql"] for q in queries if not q["sql"].lstrip().upper().startswith(("SELECT", "SAVEPOINT", "RELEASE"))]
+        self.assertEqual(writes, [])
+        self.assertEqual(self.site.default_hours.count(), 6)
+
+    def test_save_adds_missing_weekdays(self):
+        self.site.default_hours.filter(weekday=6).delete()
+        ensure_default_hours(self.site)
+        self.assertEqual(sorted(self.site.default_hours.values_list("weekday", flat=True)), list(range(7)))
+        self.site.refresh_from_db()
+        self.assertEqual(self.site.hours_display, "Mo–Fr 08:00-17:00; Sa Closed; So Unknown")
+
+
+class NearestSitesTests(LocationsTestCase):
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        # Dresden Nord, Dresden Süd, München
+        for site, (lat, lon) in zip(self.sites, [(51.09, 13.74), (51.02, 13.73), (48.14, 11.58)]):
+            site.latitude, site.longitude = lat, lon
+            site.save()
+        random.seed(7)
+        extra = add_sites(self.germany, regions=1, locations_per_region=5, sites_per_location=200)
+        for site in extra:
+            site.latitude, site.longitude = random.uniform(47.3, 55.0), random.uniform(5.9, 15.0)
+        Site.objects.bulk_update(extra, ["latitude", "longitude"])
+        self.positions = {pk: (lat, lon) for pk, lat, lon in Site.objects.values_list("pk", "latitude", "longitude")}
+
+    def brute_force(self, lat, lon, k, allowed=None):
+        distances = sorted(
+            (distance_km(lat, lon, site_lat, site_lon), pk)
+            for pk, (site_lat, site_lon) in self.positions.items()
+            if allowed is None or pk in allowed
+        )
+        return [pk for _, pk in distances[:k]]
+
+    def test_matches_brute_force(self):
+        for _ in range(50):
+            lat, lon = random.uniform(46, 56), random.uniform(4, 17)
+            k = random.randint(1, 10)
+            self.assertEqual([pk for pk, _ in nearest_site_ids(lat, lon, k=k)], self.brute_force(lat, lon, k))
+
+    def test_open_at_and_filters(self):
+        nord, sued, hafen = self.sites
+        monday = datetime(2025, 11, 17, 14, 0)
+        # only the three catalogue sites have opening hours
+        self.assertEqual([pk for pk, _ in nearest_site_ids(51.05, 13.74, k=5, at=monday)], [sued.pk, nord.pk, hafen.pk])
+        self.assertEqual([pk for pk, _ in nearest_site_ids(51.05, 13.74, k=5, at=monday, region=self.bayern)], [hafen.pk])
+        self.assertEqual(nearest_site_ids(51.05, 13.74, k=5, at=monday.replace(hour=20)), [])
+        pk, km = nearest_site_ids(51.05, 13.74, k=1, company=nord.company)[0]
+        self.assertEqual(pk, self.brute_force(51.05, 13.74, 1, {nord.pk, sued.pk, hafen.pk})[0])
+
+    def test_updated_when_site_saved(self):
+        nord, sued, hafen = self.sites
+        nearest_site_ids(48.14, 11.58, k=1)
+        hafen.latitude, hafen.longitude = 53.55, 9.99
+        # the update, and the cache generations bump
+        with self.assertNumQueries(3):
+            hafen.save()
+        self.positions[hafen.pk] = (53.55, 9.99)
+        # the grid moves the saved site in place instead of reloading it
+        with self.assertNumQueries(0):
+            nearest = spatial_index.nearest(53.55, 9.99, k=3)
+        self.assertEqual([pk for pk, _ in nearest], self.brute_force(53.55, 9.99, 3))
+
+    def test_api(self):
+        nord, sued, hafen = self.sites
+        url = reverse("locations:site-nearest")
+        body = self.client.get(url, {"lat": 51.05, "lon": 13.74, "k": 2, "at": "2025-11-17T14:00", "fields": "id,name"}).json()
+        self.assertEqual([r["id"] for r in body["results"]], [sued.pk, nord.pk])
+        self.assertAlmostEqual(body["results"][0]["distance_km"], distance_km(51.05, 13.74, 51.02, 13.73), places=2)
+        self.assertEqual(self.client.get(url, {"lat": "x", "lon": 1}).status_code, 400)
+
+
+class SearchTests(LocationsTestCase):
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        nord, sued, hafen = self.sites
+        Site.objects.filter(pk=nord.pk).update(address="Römerstraße 5", zip_code="01099")
+        Site.objects.filter(pk=hafen.pk).update(address="Hafenstr. 12", zip_code="80331")
+
+    def keys(self, query, **kwargs):
+        return [(result.kind, result.pk) for result in search(query, **kwargs)]
+
+    def test_normalize(self):
+        self.assertEqual(normalize("Römerstraße 5"), "roemerstrasse 5")
+        self.assertEqual(normalize("Roemerstr. 5"), "roemerstrasse 5")
+        self.assertEqual(normalize("Café  Crème-Brûlée"), "cafe creme brulee")
+
+    def test_diacritics_typos_and_ranking(self):
+        nord, sued, hafen = self.sites
+        for query in ("Römerstraße", "roemerstrasse", "Roemerstr.", "Romerstrasse", "01099"):
+            self.assertEqual(self.keys(query, kinds=["site"])[:1], [("site", nord.pk)], query)
+        self.assertEqual(self.keys("hafenstrasse 12", kinds=["site"]), [("site", hafen.pk)])
+        self.assertEqual(set(self.keys("munchen")), {("location", hafen.location_id), ("site", hafen.pk)})
+        # company and location names are part of each site's document
+        self.assertEqual(set(self.keys("altmann dres", kinds=["site"])[:2]), {("site", nord.pk), ("site", sued.pk)})
+        self.assertEqual(self.keys("xyzzy"), [])
+
+    def test_updated_incrementally(self):
+        nord, sued, hafen = self.sites
+        self.assertEqual(self.keys("Spedition Krause", kinds=["company", "site"]), [])
+        nord.company.name = "Spedition Krause"
+        nord.company.save()
+        self.assertEqual(self.keys("Spedition Krause", kinds=["company"]), [("company", nord.company_id)])
+        self.assertIn(("site", nord.pk), self.keys("spedition krause nord", kinds=["site"]))
+
+        sued.name = "Südhafen"
+        sued.save()
+        self.assertEqual(self.keys("suedhafen", kinds=["site"])[:1], [("site", sued.pk)])
+        sued_pk = sued.pk
+        sued.delete()
+        self.assertNotIn(("site", sued_pk), self.keys("suedhafen", kinds=["site"]))
+
+    def test_admin_and_api(self):
+        nord, sued, hafen = self.sites
+        user = get_user_model().objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client.force_login(user)
+        response = self.client.get(reverse("admin:locations_site_changelist"), {"q": "Roemerstrasse"})
+        self.assertEqual([site.pk for site in response.context["cl"].result_list], [nord.pk])
+        response = self.client.get(reverse("admin:autocomplete"), {
+            "app_label": "locations", "model_name": "site", "field_name": "location", "term": "Munchen",
+        })
+        self.assertEqual([r["id"] for r in response.json()["results"]], [str(hafen.location_id)])
+
+        url = reverse("locations:search")
+        body = self.client.get(url, {"q": "Römerstrasse", "type": "site"}).json()
+        self.assertEqual(body["results"][0]["id"], nord.pk)
+        self.assertEqual(body["results"][0]["label"], "ARS Altmann AG - Dresden - Nord")
+        self.assertEqual(self.client.get(url, {"q": ""}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"q": "x", "type": "planet"}).status_code, 400)
+
+
+class DayScheduleTests(LocationsTestCase):
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        call_command("materialize_hours", stdout=io.StringIO())
+        start, end = day_schedule.window()
+        # a Monday inside the window
+        self.monday = start + timedelta(days=7 - start.weekday())
+
+    def open_days(self):
+        return {
+            (site_id, day): (open_time, close_time)
+            for site_id, day, open_time, close_time in SiteDaySchedule.objects.filter(open_time__isnull=False)
+            .values_list("site_id", "date", "open_time", "close_time")
+        }
+
+    def assertMatchesResolver(self):
+        expected = {key: hours for key, hours in resolve_hours(None, *day_schedule.window()).items() if hours[0]}
+        self.assertEqual(self.open_days(), expected)
+
+    def test_window_matches_resolver(self):
+        nord, sued, hafen = self.sites
+        self.assertEqual(len(self.open_days()), 3 * len([
+            day for day in (self.monday - timedelta(days=self.monday.weekday()) + timedelta(days=n) for n in range(400))
+            if day.weekday() < 5 and day_schedule.window()[0] <= day <= day_schedule.window()[1]
+        ]))
+        self.assertMatchesResolver()
+        self.assertEqual(day_schedule.hours_on(nord, self.monday), (time(8), time(17)))
+        self.assertEqual(day_schedule.hours_on(nord, self.monday + timedelta(days=5)), (None, None))
+        self.assertEqual(day_schedule.open_site_ids_on(self.monday), {nord.pk, sued.pk, hafen.pk})
+
+    def test_regenerated_incrementally(self):
+        nord, sued, hafen = self.sites
+        tuesday = self.monday + timedelta(days=1)
+        exception = SiteException.objects.create(site=nord, date=self.monday, reason="Inventur")
+        holiday = PublicHoliday.objects.create(country=self.germany, region=self.sachsen, date=tuesday, name="Feiertag")
+        self.assertEqual(day_schedule.open_site_ids_on(self.monday), {sued.pk, hafen.pk})
+        self.assertEqual(day_schedule.open_site_ids_on(tuesday), {hafen.pk})
+        self.assertEqual(
+            SiteDaySchedule.objects.get(site=nord, date=tuesday).source, SiteDaySchedule.HOLIDAY
+        )
+
+        # moved exception and holiday leave no stale rows behind
+        exception.date = self.monday + timedelta(days=2)
+        exception.save()
+        holiday.date = self.monday + timedelta(days=3)
+        holiday.save()
+        self.assertMatchesResolver()
+        self.assertEqual(day_schedule.open_site_ids_on(tuesday), {nord.pk, sued.pk, hafen.pk})
+
+        # hafen moves to Saxony, where the holiday applies
+        hafen.location = nord.location
+        hafen.save()
+        self.assertNotIn(hafen.pk, day_schedule.open_site_ids_on(self.monday + timedelta(days=3)))
+
+        monday_hours = DefaultHours.objects.get(site=sued, weekday=0)
+        monday_hours.open_time = time(10)
+        monday_hours.save()
+        self.assertEqual(day_schedule.hours_on(sued, self.monday), (time(10), time(17)))
+        holiday.delete()
+        self.assertMatchesResolver()
+
+    def test_holiday_changes_regenerate_only_affected_sites_and_days(self):
+        nord, sued, hafen = self.sites
+        tuesday = self.monday + timedelta(days=1)
+        rows = dict(SiteDaySchedule.objects.values_list("pk", "date"))
+        holiday = PublicHoliday.objects.create(country=self.germany, region=self.sachsen, date=tuesday, name="Feiertag")
+        # only the Saxon sites' rows of that day were rewritten
+        rewritten = set(rows) - set(SiteDaySchedule.objects.values_list("pk", flat=True))
+        self.assertEqual(sorted(rows[pk] for pk in rewritten), [tuesday, tuesday])
+        self.assertEqual(SiteDaySchedule.objects.get(site=hafen, date=tuesday).source, SiteDaySchedule.DEFAULT)
+        self.assertEqual(day_schedule.open_site_ids_on(tuesday), {hafen.pk})
+
+        holiday = PublicHoliday.objects.get(pk=holiday.pk)
+        holiday.name = "Umbenannt"
+        with CaptureQueriesContext(connection) as queries:
+            holiday.save()
+        self.assertFalse([q for q in queries if "locations_sitedayschedule" in q["sql"]])
+
+        holiday.date, holiday.region = tuesday + timedelta(days=1), None
+        holiday.save()
+        self.assertEqual(day_schedule.open_site_ids_on(tuesday), {nord.pk, sued.pk, hafen.pk})
+        self.assertEqual(day_schedule.open_site_ids_on(tuesday + timedelta(days=1)), set())
+        self.assertMatchesResolver()
+
+    def test_hours_changes_regenerate_only_their_weekday(self):
+        nord, sued, hafen = self.sites
+        wednesdays = set(SiteDaySchedule.objects.filter(site=sued, date__iso_week_day=3).values_list("pk", flat=True))
+        rows = set(SiteDaySchedule.objects.values_list("pk", flat=True))
+        hours = DefaultHours.objects.get(site=sued, weekday=2)
+        hours.open_time = time(10)
+        with CaptureQueriesContext(connection) as queries:
+            hours.save()
+        # only sued's Wednesdays were rewritten
+        self.assertEqual(rows - set(SiteDaySchedule.objects.values_list("pk", flat=True)), wednesdays)
+        self.assertEqual(len([q for q in queries if q["sql"].startswith("INSERT") and "sitedayschedule" in q["sql"]]), 1)
+        self.assertEqual(day_schedule.hours_on(sued, self.monday + timedelta(days=2)), (time(10), time(17)))
+        self.assertMatchesResolver()
+
+    def test_new_sites_are_resolved_until_materialized(self):
+        nord = self.sites[0]
+        site = Site.objects.create(company=nord.company, location=nord.location, name="Neu")
+        DefaultHours.objects.filter(site=site, weekday=0).update(open_time=time(8), close_time=time(12))
+        self.assertFalse(SiteDaySchedule.objects.filter(site=site).exists())
+        self.assertIn(site.pk, day_schedule.open_site_ids_on(self.monday))
+        self.assertNotIn(site.pk, day_schedule.open_site_ids_on(self.monday + timedelta(days=1)))
+
+    def test_days_not_materialized_fall_back_to_resolver(self):
+        nord = self.sites[0]
+        SiteDaySchedule.objects.all().delete()
+        self.assertEqual(day_schedule.hours_on(nord, self.monday), (time(8), time(17)))
+        self.assertEqual(day_schedule.hours_on(nord, self.monday + timedelta(days=5)), (None, None))
+        self.assertEqual(day_schedule.open_site_ids_on(self.monday), {site.pk for site in self.sites})
+        self.assertEqual(
+            async_to_sync(day_schedule.ahours_on)(nord.pk, self.monday), (time(8), time(17)),
+        )
+
+    def test_extend(self):
+        start, end = day_schedule.window()
+        written = day_schedule.extend(today=start + timedelta(days=3))
+        self.assertEqual(written, 3 * 3)  # closed days get a row too
+        self.assertFalse(SiteDaySchedule.objects.filter(date__lt=start + timedelta(days=3)).exists())
+        self.assertEqual(day_schedule.extend(today=start + timedelta(days=3)), 0)
+
+
+class HolidayGeneratorTests(LocationsTestCase):
+    catalogue = True
+
+    def test_easter(self):
+        self.assertEqual(
+            [easter_sunday(year) for year in (2024, 2025, 2026, 2038)],
+            [date(2024, 3, 31), date(2025, 4, 20), date(2026, 4, 5), date(2038, 4, 25)],
+        )
+
+    def test_generate(self):
+        nord, sued, hafen = self.sites
+        PublicHoliday.objects.create(country=self.germany, date=date(2025, 12, 25), name="Weihnachten")
+        out = io.StringIO()
+        call_command("generate_holidays", "--from", "2025", "--to", "2026", "--country", "DE", stdout=out)
+        self.assertIn("skipped 1 existing", out.getvalue())
+        self.assertIn("DE-BW", out.getvalue())
+        self.assertNotIn("DE-SN", out.getvalue())
+
+        def names(region, year=2025):
+            return dict(PublicHoliday.objects.filter(country=self.germany, region=region, date__year=year)
+                        .values_list("date", "name"))
+
+        national = names(None)
+        self.assertEqual(len(national), 9)
+        self.assertEqual(national[date(2025, 6, 9)], "Pfingstmontag")
+        self.assertEqual(national[date(2025, 12, 25)], "Weihnachten")
+        self.assertEqual(names(self.sachsen), {
+            date(2025, 10, 31): "Reformationstag", date(2025, 11, 19): "Buß- und Bettag",
+        })
+        self.assertEqual(names(self.bayern), {
+            date(2025, 1, 6): "Heilige Drei Könige", date(2025, 6, 19): "Fronleichnam", date(2025, 11, 1): "Allerheiligen",
+        })
+
+        # Fronleichnam closes Bavaria only
+        corpus_christi = date(2025, 6, 19)
+        self.assertEqual(get_site_hours(hafen, corpus_christi), (None, None))
+        self.assertEqual(get_site_hours(nord, corpus_christi), (time(8), time(17)))
+
+        count = PublicHoliday.objects.count()
+        self.assertEqual(generate_holidays([2025, 2026], ["DE"]).created, 0)
+        self.assertEqual(PublicHoliday.objects.count(), count)
+
+    def test_decade_in_one_pass(self):
+        Region.objects.bulk_create(Region(name=name, country=self.germany) for name in ("Baden-Württemberg", "Thüringen"))
+        # a fixed number of queries, including regenerating the day schedules and bumping the cache generations
+        with self.assertNumQueries(17):
+            report = generate_holidays(range(2025, 2035), ["DE"])
+        self.assertEqual(report.missing_regions, [
+            f"DE-{code}" for code in ("BB", "BE", "HB", "HE", "HH", "MV", "NI", "NW", "RP", "SH", "SL", "ST")
+        ])
+        self.assertEqual(report.created, PublicHoliday.objects.count())
+
+
+class TimeZoneTests(LocationsTestCase):
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        portugal = Country.objects.create(name="Portugal", code="PT", time_zone="Europe/Lisbon")
+        lisbon = Location.objects.create(name="Lisboa", region=Region.objects.create(name="Lisboa", country=portugal))
+        self.lisbon = Site.objects.create(company=self.sites[0].company, location=lisbon, name="Porto de Lisboa")
+        monday = self.lisbon.default_hours.get(weekday=0)
+        monday.open_time, monday.close_time = time(22), time(23, 45)
+        monday.save()
+        # Tuesday 00:30 in Berlin, still Monday 23:30 in Lisbon
+        self.at = datetime(2025, 11, 17, 23, 30, tzinfo=dt_timezone.utc)
+
+    def test_today_in_each_zone(self):
+        nord, sued, hafen = self.sites
+        self.assertEqual(today_hours(self.lisbon, self.at), (time(22), time(23, 45)))
+        self.assertEqual(today_hours(nord, self.at), (time(8), time(17)))
+        self.assertTrue(is_open_now(self.lisbon, self.at))
+        self.assertFalse(is_open_now(nord, self.at))
+
+    def test_open_after_midnight_on_previous_day_hours(self):
+        # Monday 22:00-01:00 in Lisbon, asked at Tuesday 00:30 local time
+        DefaultHours.objects.filter(site=self.lisbon, weekday=0).update(close_time=time(1))
+        today_cache.invalidate()
+        at = datetime(2025, 11, 18, 0, 30, tzinfo=dt_timezone.utc)
+        self.assertEqual(today_hours(self.lisbon, at), (None, None))
+        self.assertTrue(is_open_now(self.lisbon, at))
+        self.assertFalse(is_open_now(self.lisbon, at.replace(hour=1)))
+
+    def test_one_pass_per_zone_and_day(self):
+        nord, sued, hafen = self.sites
+        today_hours(nord, self.at)
+        with self.assertNumQueries(0):
+            self.assertEqual([today_hours(site, self.at) for site in (sued, hafen)], [(time(8), time(17))] * 2)
+        SiteException.objects.create(site=sued, date=date(2025, 11, 18), reason="Inventur")
+        self.assertEqual(today_hours(sued, self.at), (None, None))
+
+    def test_open_sites_judged_by_local_clock(self):
+        self.assertEqual(open_site_ids(self.at), {self.lisbon.pk})
+        # naive datetimes are wall-clock time in every zone
+        self.assertEqual(open_site_ids(datetime(2025, 11, 17, 9, 0)), {site.pk for site in self.sites})
+
+    def test_validation(self):
+        with self.assertRaises(ValidationError):
+            Country(name="Mars", code="MA", time_zone="Mars/Olympus_Mons").full_clean()
+
+
+class BenchmarkTests(LocationsTestCase):
+    def test_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / "report.json"
+            call_command("benchmark", "--in-place", "--sizes", "60", "-o", str(output), stdout=io.StringIO())
+            report = json.loads(output.read_text())
+            self.assertEqual([run["sites"] for run in report["runs"]], [60])
+            benchmarks = report["runs"][0]["benchmarks"]
+            self.assertEqual(set(benchmarks["export_to_JSON"]), {"seconds", "queries", "calls"})
+            self.assertEqual(benchmarks["hours_display"]["queries"], 1)
+            self.assertEqual(benchmarks["today_hours.warm"]["queries"], 0)
+            # every run is rolled back
+            self.assertFalse(Site.objects.exists())
+
+            out = io.StringIO()
+            call_command(
+                "benchmark", "--in-place", "--sizes", "60", "-o", str(Path(tmp) / "next.json"),
+                "--baseline", str(output), stdout=out,
+            )
+            # same catalogue, same query counts (timings may jitter)
+            self.assertEqual([line for line in out.getvalue().splitlines() if line.endswith(" queries") and "->" in line], [])
+
+
+class StaticPageTests(LocationsTestCase):
+    catalogue = True
+
+    def test_hours_rows(self):
+        self.assertEqual(
+            hours_rows("Mo–Fr 08:00-17:00; Sa–So Closed; "),
+            [("Mo–Fr", "08:00-17:00"), ("Sa–So", "geschlossen")],
+        )
+        self.assertEqual(hours_rows(""), [])
+
+    def test_page_is_grouped_by_company_and_escaped(self):
+        nord, sued, hafen = self.sites
+        other = Company.objects.create(name="<Bahn & Co>")
+        Site.objects.create(company=other, location=nord.location, name="Ost", phone="0351 12 34")
+        html = "".join(render_page())
+        self.assertEqual(html.count('<h2 class="company-title">'), 2)
+        self.assertLess(html.index("&lt;Bahn &amp; Co&gt;"), html.index(">ARS Altmann AG</h2>"))
+        self.assertEqual(html.count('<div class="tile">'), 4)
+        self.assertIn('<a href="tel:03511234">0351 12 34</a>', html)
+        self.assertIn('<span class="weekday">Sa–So</span><span class="hour-time">geschlossen</span>', html)
+        self.assertIn('href="style.css"', html)
+
+    def test_command_writes_compressed_variants(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / "stations.html"
+            with self.assertNumQueries(1):
+                call_command("render_stations_page", "-o", str(output), stdout=io.StringIO(), stderr=io.StringIO())
+            html = output.read_bytes()
+            self.assertIn("ARS Altmann AG - München - Hafen".encode(), html)
+            self.assertEqual(gzip.decompress((Path(tmp) / "stations.html.gz").read_bytes()), html)
+
+
+class SharedCacheTests(LocationsTestCase):
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        today = date.today()
+        self.monday = today + timedelta(days=7 - today.weekday())
+        self.sunday = self.monday + timedelta(days=6)
+
+    def test_generations_are_stable_until_bumped(self):
+        first = caching.generations([("site", 1), ("country", 1)])
+        self.assertEqual(caching.generations([("site", 1), ("country", 1)]), first)
+        caching.bump(("site", 1))
+        second = caching.generations([("site", 1), ("country", 1)])
+        self.assertNotEqual(second[0], first[0])
+        self.assertEqual(second[1], first[1])
+
+    def test_resolved_hours_are_invalidated_per_site_and_country(self):
+        nord, sued, hafen = self.sites
+        ids = [site.pk for site in self.sites]
+        resolved = caching.cached_resolved_hours(ids, self.monday, self.sunday)
+        self.assertEqual(resolved, resolve_hours(ids, self.monday, self.sunday))
+        # the generations of the sites, their locations, then of the hours
+        with self.assertNumQueries(3):
+            self.assertEqual(caching.cached_resolved_hours(ids, self.monday, self.sunday), resolved)
+
+        SiteException.objects.create(site=nord, date=self.monday, open_time=time(10), close_time=time(12))
+        with self.assertNumQueries(3):
+            caching.cached_resolved_hours([sued.pk, hafen.pk], self.monday, self.sunday)
+        self.assertEqual(
+            caching.cached_resolved_hours([nord.pk], self.monday, self.sunday)[(nord.pk, self.monday)],
+            (time(10), time(12)),
+        )
+
+        PublicHoliday.objects.create(country=self.germany, region=self.sachsen, date=self.monday, name="Test")
+        resolved = caching.cached_resolved_hours(ids, self.monday, self.sunday)
+        self.assertEqual(resolved[(sued.pk, self.monday)], (None, None))
+        self.assertEqual(resolved[(hafen.pk, self.monday)], (time(8), time(17)))
+
+    def test_api_payloads(self):
+        nord = self.sites[0]
+        url = reverse("locations:site-detail", args=[nord.pk])
+        self.assertEqual(self.client.get(url).json()["company_name"], "ARS Altmann AG")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        # only the conditional GET aggregate and the cache generations are left
+        self.assertEqual(len(queries), 5)
+        self.assertEqual(len([q for q in queries if "locations_cachegeneration" in q["sql"]]), 4)
+
+        company = Company.objects.get(pk=nord.company_id)
+        company.name = "Altmann Logistik"
+        company.save()
+        self.assertEqual(self.client.get(url).json()["company_name"], "Altmann Logistik")
+
+        hours_url = reverse("locations:site-hours", args=[nord.pk])
+        params = {"date": self.monday.isoformat()}
+        self.assertEqual(self.client.get(hours_url, params).json()["hours"][self.monday.isoformat()]["open"], "08:00")
+        monday = nord.default_hours.get(weekday=0)
+        monday.open_time = time(9)
+        monday.save()
+        self.assertEqual(self.client.get(hours_url, params).json()["hours"][self.monday.isoformat()]["open"], "09:00")
+
+        self.assertEqual(self.client.get(reverse("locations:site-list"), {"fields": "nope"}).status_code, 400)
+
+    def test_export(self):
+        url = reverse("locations:export")
+        self.assertEqual(self.client.get(url).json(), list(iter_records()))
+        # the cache generations
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        Site.objects.create(company=self.sites[0].company, location=self.sites[0].location, name="West")
+        self.assertEqual(len(self.client.get(url).json()), 4)
+        self.assertEqual(self.client.get(url, {"format": "compact"}).json(), compact_export())
+
+
+class AsyncViewTests(LocationsTestCase):
+    catalogue = True
+
+    def setUp(self):
+        super().setUp()
+        settle, interval = change_feed.settle, change_feed.interval
+        change_feed.reset()
+        change_feed.settle, change_feed.interval = timedelta(0), 0.02
+        self.addCleanup(setattr, change_feed, "settle", settle)
+        self.addCleanup(setattr, change_feed, "interval", interval)
+
+    async def test_status(self):
+        nord = self.sites[0]
+        # make_catalogue writes hours with queryset updates
+        await sync_to_async(day_schedule.materialize)()
+        today = timezone.localdate()
+        monday = today + timedelta(days=7 - today.weekday())
+        url = reverse("locations:site-status", args=[nord.pk])
+        response = await self.async_client.get(url, {"at": f"{monday.isoformat()}T12:00"})
+        self.assertEqual(response.json()["date"], monday.isoformat())
+        self.assertEqual((response.json()["open"], response.json()["is_open"]), ("08:00", True))
+        response = await self.async_client.get(url, {"at": f"{monday.isoformat()}T18:00"})
+        self.assertFalse(response.json()["is_open"])
+        response = await self.async_client.get(url, {"at": f"{(monday + timedelta(days=5)).isoformat()}T12:00"})
+        self.assertEqual(response.json()["open"], None)
+        await SiteDaySchedule.objects.filter(site=nord, date=monday).aupdate(open_time=time(20), close_time=time(2))
+        response = await self.async_client.get(url, {"at": f"{(monday + timedelta(days=1)).isoformat()}T01:00"})
+        self.assertEqual((response.json()["open"], response.json()["is_open"]), ("08:00", True))
+        self.assertEqual((await self.async_client.get(reverse("locations:site-status", args=[0]))).status_code, 404)
+
+    async def touch_later(self, site, delay=0.1):
+        await asyncio.sleep(delay)
+        await Site.objects.filter(pk=site.pk).aupdate(updated_at=timezone.now())
+
+    async def test_long_poll_returns_on_change(self):
+        nord, sued, hafen = self.sites
+        url = reverse("locations:changes")
+        response = await self.async_client.get(url, {"timeout": 0})
+        self.assertEqual(response.json()["changes"], [])
+        cursor = response.json()["cursor"]
+
+        edit = asyncio.ensure_future(self.touch_later(sued))
+        response = await self.async_client.get(url, {"since": cursor, "timeout": 5})
+        await edit
+        self.assertEqual([change["id"] for change in response.json()["changes"]], [sued.pk])
+        self.assertGreater(response.json()["cursor"], cursor)
+
+        response = await self.async_client.get(url, {"since": response.json()["cursor"], "timeout": 0})
+        self.assertEqual(response.json()["changes"], [])
+        self.assertEqual((await self.async_client.get(url, {"timeout": 99})).status_code, 400)
+
+    async def test_old_cursors_are_read_from_the_database(self):
+        nord, sued, hafen = self.sites
+        feed = ChangeFeed(interval=0.02, settle=timedelta(0), buffer_size=1)
+        _, cursor = await feed.wait(timeout=0)
+        await self.touch_later(nord, 0.01)
+        await self.touch_later(hafen, 0.01)
+        changes, _ = await feed.wait(cursor, timeout=5)
+        if len(changes) == 1:  # both edits may have landed in separate polls
+            await feed.wait(changes[0][0], timeout=5)
+            changes, _ = await feed.wait(cursor, timeout=0)
+        self.assertEqual([site_id for _, site_id in changes], [nord.pk, hafen.pk])
+
+    async def test_waiters_on_other_loops_do_not_disturb_each_other(self):
+        nord = self.sites[0]
+        feed = ChangeFeed(interval=0.02, settle=timedelta(0))
+        _, cursor = await feed.wait(timeout=0)
+        waiting = asyncio.ensure_future(feed.wait(cursor, timeout=1))
+        await asyncio.sleep(0.01)
+        # a request served by async_to_sync waits on a loop of its own
+        thread = threading.Thread(target=lambda: asyncio.run(feed.wait(timeout=0)))
+        thread.start()
+        thread.join()
+        await self.touch_later(nord, 0.01)
+        changes, _ = await waiting
+        self.assertEqual([site_id for _, site_id in changes], [nord.pk])
+
+    def test_sites_written_in_long_transactions_are_bumped_on_commit(self):
+        sued = self.sites[1]
+        before = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            hours_changed({sued.pk: {0}})
+            # as if materializing the day schedules had taken a minute
+            Site.objects.filter(pk=sued.pk).update(updated_at=before - timedelta(minutes=1))
+        self.assertGreaterEqual(Site.objects.get(pk=sued.pk).updated_at, before)
+
+    async def test_event_stream(self):
+        hafen = self.sites[2]
+        response = await self.async_client.get(reverse("locations:change-stream"))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = response.streaming_content
+        self.assertEqual(await anext(events), b"retry: 3000\n\n")
+        edit = asyncio.ensure_future(self.touch_later(hafen))
+        event = (await anext(events)).decode()
+        await edit
+        await events.aclose()
+        self.assertIn("event: changes", event)
+        self.assertEqual(json.loads(event.split("data: ")[1])[0]["id"], hafen.pk)
+
+
+class CalendarImportTests(LocationsTestCase):
+    catalogue = True
+
+    ICS = (
+        "BEGIN:VCALENDAR\r\n"
+        "VERSION:2.0\r\n"
+        "BEGIN:VEVENT\r\n"
+        "DTSTART;VALUE=DATE:{start}\r\n"
+        "DTEND;VALUE=DATE:{end}\r\n"
+        "SUMMARY:Betriebs\r\n"
+        " ferien\r\n"
+        "END:VEVENT\r\n"
+        "BEGIN:VEVENT\r\n"
+        "DTSTART:{start}T100000\r\n"
+        "DTEND:{start}T140000\r\n"
+        "SUMMARY:Inventur\\, verkürzt\r\n"
+        "END:VEVENT\r\n"
+        "END:VCALENDAR\r\n"
+    )
+
+    def setUp(self):
+        super().setUp()
+        today = timezone.localdate()
+        self.monday = today + timedelta(days=7 - today.weekday())
+
+    def csv(self, *lines):
+        return io.StringIO("\n".join(lines) + "\n")
+
+    def test_exceptions_from_csv_are_upserted(self):
+        nord, sued, hafen = self.sites
+        SiteException.objects.create(site=nord, date=self.monday, reason="alt")
+        day_schedule.materialize()
+        report = import_calendar(self.csv(
+            "site_id,company,location,name,date,open_time,close_time,reason",
+            f"{nord.pk},,,,{self.monday.isoformat()},10:00,12:00,Inventur",
+            f",ARS Altmann AG,Dresden,Süd,{self.monday.strftime('%d.%m.%Y')},,,Wasserschaden",
+            f",ars altmann ag,münchen,hafen,{self.monday.isoformat()},,,Streik",
+        ), "exceptions")
+        self.assertEqual(report, (3, 3))
+        self.assertEqual(SiteException.objects.count(), 3)
+        self.assertEqual(
+            SiteException.objects.get(site=nord).reason, "Inventur",
+        )
+        # signals skipped, so the import refreshes what they would have
+        self.assertEqual(day_schedule.hours_on(nord, self.monday), (time(10), time(12)))
+        self.assertEqual(day_schedule.hours_on(sued, self.monday), (None, None))
+        self.assertEqual(get_site_hours(hafen, self.monday), (None, None))
+
+    def test_rows_are_read_in_batches_with_a_fixed_number_of_lookups(self):
+        nord = self.sites[0]
+        lines = ["site_id,date,reason"] + [
+            f"{nord.pk},{(self.monday + timedelta(days=n)).isoformat()},Umbau" for n in range(300)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            report = import_calendar(self.csv(*lines), "exceptions", batch_size=100)
+        self.assertEqual(report.written, 300)
+        self.assertEqual(SiteException.objects.count(), 300)
+        self.assertLess(len(queries), 40)
+
+    def test_bad_rows_abort_the_import(self):
+        nord = self.sites[0]
+        with self.assertRaises(CalendarImportError) as raised:
+            import_calendar(self.csv(
+                "site_id,date,open_time,close_time",
+                f"{nord.pk},{self.monday.isoformat()},,",
+                f"0,{self.monday.isoformat()},,",
+                f"{nord.pk},31.02.2025,,",
+                f"{nord.pk},{self.monday.isoformat()},10:00,",
+            ), "exceptions", batch_size=1)
+        self.assertEqual(len(raised.exception.errors), 3)
+        self.assertIn("line 3: unknown site 0", raised.exception.errors)
+        self.assertFalse(SiteException.objects.exists())
+
+    def test_holidays_from_ics(self):
+        start, end = self.monday, self.monday + timedelta(days=3)
+        ics = self.ICS.format(start=start.strftime("%Y%m%d"), end=end.strftime("%Y%m%d"))
+        for _ in range(2):  # importing again overwrites, country-wide rows included
+            report = import_calendar(io.StringIO(ics), "holidays", file_format="ics", country="DE")
+            self.assertEqual(report, (4, 3))
+            self.assertEqual(PublicHoliday.objects.count(), 3)
+        self.assertEqual(
+            list(PublicHoliday.objects.order_by("date").values_list("date", "name", "region")),
+            [(start, "Inventur, verkürzt", None), (start + timedelta(days=1), "Betriebsferien", None),
+             (start + timedelta(days=2), "Betriebsferien", None)],
+        )
+        import_calendar(io.StringIO(ics), "holidays", file_format="ics", country="DE", region="Sachsen")
+        self.assertEqual(PublicHoliday.objects.filter(region=self.sachsen).count(), 3)
+        self.assertEqual(get_site_hours(self.sites[0], start + timedelta(days=1)), (None, None))
+        self.assertEqual(day_schedule.hours_on(self.sites[2], start + timedelta(days=1)), (None, None))
+
+    def test_exceptions_from_ics_for_a_site(self):
+        hafen = self.sites[2]
+        ics = self.ICS.format(start=self.monday.strftime("%Y%m%d"), end=(self.monday + timedelta(days=2)).strftime("%Y%m%d"))
+        import_calendar(io.StringIO(ics), "exceptions", file_format="ics", site=hafen.pk)
+        self.assertEqual(
+            list(hafen.exceptions.order_by("date").values_list("open_time", "close_time", "reason")),
+            [(time(10), time(14), "Inventur, verkürzt"), (None, None, "Betriebsferien")],
+        )
+
+    def test_command_and_admin_upload(self):
+        path = Path(tempfile.mkdtemp()) / "feiertage.csv"
+        self.addCleanup(path.unlink)
+        path.write_text(f"country,region,date,name\nDE,Bayern,{self.monday.isoformat()},Test\n", encoding="utf-8")
+        out = io.StringIO()
+        call_command("import_calendar", "holidays", str(path), stdout=out)
+        self.assertIn("Imported 1 holidays", out.getvalue())
+        self.assertTrue(PublicHoliday.objects.filter(region=self.bayern, name="Test").exists())
+        with self.assertRaises(CommandError):
+            call_command("import_calendar", "exceptions", str(path), stdout=io.StringIO())
+
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "admin@example.com", "admin"))
+        url = reverse("admin:locations_siteexception_import")
+        self.assertContains(self.client.get(reverse("admin:locations_siteexception_changelist")), url)
+        upload = SimpleUploadedFile(
+            "closures.ics", self.ICS.format(start=self.monday.strftime("%Y%m%d"), end="").encode("utf-8"),
+        )
+        response = self.client.post(url, {"file": upload, "site": self.sites[0].pk})
+        self.assertContains(response, "line 3: invalid date", status_code=200)
+        upload = SimpleUploadedFile(
+            "closures.csv", f"site_id,date\n{self.sites[0].pk},{self.monday.isoformat()}\n".encode("utf-8"),
+        )
+        response = self.client.post(url, {"file": upload})
+        self.assertRedirects(response, reverse("admin:locations_siteexception_changelist"))
+        self.assertTrue(SiteException.objects.filter(site=self.sites[0], date=self.monday).exists())
+
+
+class HoursImportTests(LocationsTestCase):
+    catalogue = True
+
+    SHEET = (
+        "company;location;name;Mo-Fr;Sa;So\n"
+        "ARS Altmann AG;Dresden;Nord;08:00-17:00;geschlossen;geschlossen\n"
+        "ARS Altmann AG;Dresden;Süd;7-18 Uhr;8.30–12.00;geschlossen\n"
+        "ARS Altmann AG;Hamburg;Hafen;06:00-22:00;;\n"
+    )
+
+    def setUp(self):
+        super().setUp()
+        today = timezone.localdate()
+        self.monday = today + timedelta(days=7 - today.weekday())
+
+    def sheet(self, text=None):
+        return io.StringIO(text or self.SHEET)
+
+    def test_parse_day(self):
+        self.assertEqual(parse_day("8-17"), (time(8), time(17), False))
+        self.assertEqual(parse_day("08:30 - 16.45 Uhr"), (time(8, 30), time(16, 45), False))
+        self.assertEqual(parse_day("Geschlossen"), (None, None, True))
+        self.assertEqual(parse_day("–"), (None, None, True))
+        self.assertEqual(parse_day("22:00-02:00"), (time(22), time(2), False))
+        self.assertIsNone(parse_day(" "))
+        for value in ("8-12, 13-17", "8-8", "ab 8", "25-26"):
+            with self.assertRaises(ImportRowError):
+                parse_day(value)
+
+    def test_only_differing_days_are_written(self):
+        nord, sued, hafen = self.sites
+        day_schedule.materialize()
+        report = import_hours(self.sheet(), delimiter=";")
+        self.assertEqual((report.rows, report.sites, len(report.unmatched)), (3, 2, 1))
+        # Nord as it was; Süd's weekdays and Saturday changed
+        self.assertEqual(report.changed_sites, [sued.pk])
+        self.assertEqual(len(report.changes), 6)
+        self.assertEqual(report.unchanged, 8)
+        self.assertIn(f"site {sued.pk} (ARS Altmann AG / Dresden / Süd) Sa: Closed -> 08:30-12:00", list(report.lines()))
+        sued.refresh_from_db()
+        self.assertEqual(sued.hours_summary, "Mo–Fr 07:00-18:00; Sa 08:30-12:00; So Closed")
+        # signals skipped, so the import refreshes what they would have
+        self.assertEqual(get_site_hours(sued, self.monday), (time(7), time(18)))
+        self.assertEqual(day_schedule.hours_on(sued, self.monday + timedelta(days=5)), (time(8, 30), time(12)))
+
+        with CaptureQueriesContext(connection) as queries:
+            again = import_hours(self.sheet(), delimiter=";")
+        self.assertEqual((again.changes, again.unchanged), ([], 14))
+        self.assertEqual(len(queries), 2)  # the sites and their hours
+
+    def test_dry_run_and_errors_write_nothing(self):
+        sued = self.sites[1]
+        report = import_hours(self.sheet(), delimiter=";", dry_run=True)
+        self.assertEqual(len(report.changes), 6)
+        self.assertTrue(str(report).startswith("3 rows, 2 sites matched: would change 6 days of 1 sites"))
+        self.assertFalse(DefaultHours.objects.filter(site=sued, open_time=time(7)).exists())
+        with self.assertRaises(ImportFailed) as raised:
+            import_hours(self.sheet(self.SHEET.replace("7-18 Uhr", "7-12, 13-18")), delimiter=";")
+        self.assertEqual(len(raised.exception.errors), 1)
+        self.assertFalse(DefaultHours.objects.filter(site=sued, open_time=time(7)).exists())
+
+    def test_command(self):
+        path = Path(tempfile.mkdtemp()) / "abgabezeiten.csv"
+        self.addCleanup(path.unlink)
+        path.write_text(f"site_id,Montag,Sonntag\n{self.sites[2].pk},9-12,10-14\n", encoding="utf-8")
+        out = io.StringIO()
+        call_command("import_hours", str(path), "--dry-run", stdout=out)
+        self.assertIn("Dry run: 1 rows, 1 sites matched: would change 2 days", out.getvalue())
+        call_command("import_hours", str(path), stdout=io.StringIO())
+        self.sites[2].refresh_from_db()
+        self.assertEqual(
+            self.sites[2].hours_summary, "Mo 09:00-12:00; Di–Fr 08:00-17:00; Sa Closed; So 10:00-14:00",
+        )
+
+
+class StationsSyncTests(LocationsTestCase):
+    catalogue = True
+
+    LINK = "https://maps.app.goo.gl/QLZfWZJQ8hKGa9xu9"
+
+    def setUp(self):
+        super().setUp()
+        Site.objects.filter(pk=self.sites[2].pk).update(address="Lilienthalstraße 2, 29693 Hodenhagen")
+
+    def test_edited_export_round_trips(self):
+        nord, sued, hafen = self.sites
+        records = list(iter_records())
+        self.assertEqual(records[0]["maps_link"], "")
+        with self.assertNumQueries(1):
+            self.assertEqual(sync_stations(records).changes, [])
+
+        records[0]["maps_link"] = self.LINK
+        records[0]["name"] = "renamed in the file"  # display only, ignored
+        records[1]["phone"] = " 0351 123456 "
+        dry = sync_stations(records, dry_run=True)
+        self.assertEqual(len(dry.changes), 2)
+        self.assertFalse(Site.objects.filter(maps_link=self.LINK).exists())
+
+        report = sync_stations(records)
+        self.assertEqual(report.changed_sites, sorted([nord.pk, sued.pk]))
+        nord.refresh_from_db()
+        self.assertEqual((nord.maps_link, nord.name), (self.LINK, "Nord"))
+        self.assertEqual(Site.objects.get(pk=sued.pk).phone, "0351 123456")
+        # the next export carries the link, and syncing it again changes nothing
+        records = list(iter_records())
+        self.assertEqual(records[0]["maps_link"], self.LINK)
+        self.assertEqual(sync_stations(records).changes, [])
+        self.assertEqual(self.client.get(reverse("locations:site-detail", args=[nord.pk])).json()["maps_link"], self.LINK)
+
+    def test_records_without_id_match_by_company_and_address(self):
+        hafen = self.sites[2]
+        report = sync_stations([
+            {"company": "ARS Altmann AG", "name": "ARS Altmann AG - Hodenhagen",
+             "address": "Lilienthalstr. 2, 29693 Hodenhagen", "maps_link": self.LINK, "phone": None, "hours": ""},
+            {"company": "ARS Altmann AG", "address": "Römerstraße 3, 64560 Riedstadt", "maps_link": self.LINK},
+            {"company": "ARS Altmann AG", "address": None},
+        ])
+        self.assertEqual(report.changed_sites, [hafen.pk])
+        self.assertEqual(len(report.skipped), 2)
+        self.assertEqual(Site.objects.get(pk=hafen.pk).maps_link, self.LINK)
+
+    def test_invalid_values_sync_nothing(self):
+        records = list(iter_records())
+        records[0]["maps_link"] = self.LINK
+        records[1]["maps_link"] = "maps.app.goo.gl/abc"
+        with self.assertRaises(ImportFailed):
+            sync_stations(records)
+        self.assertFalse(Site.objects.exclude(maps_link=None).exists())
+
+    def test_command(self):
+        path = Path(tempfile.mkdtemp()) / "stations.json"
+        self.addCleanup(path.unlink)
+        records = list(iter_records())
+        records[2]["maps_link"] = self.LINK
+        path.write_text(json.dumps(records, ensure_ascii=False), encoding="utf-8")
+        out = io.StringIO()
+        call_command("sync_stations", str(path), stdout=out)
+        self.assertIn(f"site {self.sites[2].pk} maps_link: '' -> '{self.LINK}'", out.getvalue())
+        self.assertIn("3 records, 3 sites matched: changed 1 values of 1 sites", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("sync_stations", str(path), "--fields", "name", stdout=io.StringIO())
 
-# Create your tests here.
@@ -0,0 +1,18 @@
+from django.urls import path
+from . import views
+
+app_name = "locations"
+
+urlpatterns = [
+    path("sites/", views.site_list, name="site-list"),
+    path("sites/nearest/", views.site_nearest, name="site-nearest"),
+    path("sites/<int:pk>/", views.site_detail, name="site-detail"),
+    path("sites/<int:pk>/hours/", views.site_hours, name="site-hours"),
+    path("sites/<int:pk>/status/", views.site_status, name="site-status"),
+    path("hours/", views.hours_list, name="hours-list"),
+    path("companies/", views.company_list, name="company-list"),
+    path("search/", views.site_search, name="search"),
+    path("export/", views.site_export, name="export"),
+    path("changes/", views.site_changes, name="changes"),
+    path("changes/stream/", views.site_change_stream, name="change-stream"),
+]
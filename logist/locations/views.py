@@ -1,3 +1,537 @@
-from django.shortcuts import render
+import hashlib
+import io
+import json
+from datetime import date, datetime, timedelta
+from django.db.models import Count, Max
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import condition, require_GET
+from .models import Company, Group, Site
+from .services import day_schedule
+from .services.caching import CATALOGUE, cached_resolved_hours, get_or_compute, site_scopes
+from .services.export import compact_export, iter_records, write_compact, write_json
+from .services.change_feed import change_feed
+from .services.geo import nearest_sites
+from .services.holidays import holiday_index
+from .services.search import KINDS, search
+from .services.today import is_open_within, local_now, zone_name
 
-# Create your views here.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+MAX_HOURS_DAYS = 31
+MAX_NEAREST = 50
+MAX_SEARCH_RESULTS = 50
+DEFAULT_POLL_SECONDS = 25
+MAX_POLL_SECONDS = 55
+HEARTBEAT_SECONDS = 15
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _error(message, status=400):
+    return JsonResponse({"error": message}, status=status)
+
+
+# -----------------------
+# Serialization
+# -----------------------
+def _format_time(t):
+    return t.strftime("%H:%M") if t else None
+
+
+SITE_FIELDS = {
+    "id": lambda s: s.pk,
+    "name": lambda s: s.name,
+    "company": lambda s: s.company_id,
+    "company_name": lambda s: s.company.name if s.company else None,
+    "group": lambda s: s.company.group_id if s.company else None,
+    "location": lambda s: s.location_id,
+    "location_name": lambda s: s.location.name,
+    "region": lambda s: s.location.region_id,
+    "country": lambda s: s.location.region.country_id,
+    "address": lambda s: s.address,
+    "maps_link": lambda s: s.maps_link,
+    "zip_code": lambda s: s.zip_code,
+    "phone": lambda s: s.phone,
+    "email": lambda s: s.email,
+    "hours": lambda s: s.hours_display,
+    "updated_at": lambda s: s.updated_at.isoformat(),
+}
+
+COMPANY_FIELDS = {
+    "id": lambda c: c.pk,
+    "name": lambda c: c.name,
+    "group": lambda c: c.group_id,
+    "group_name": lambda c: c.group.name if c.group else None,
+}
+
+
+def _fields(request, available):
+    """
+    The serializers requested with ?fields=a,b (default: all).
+    """
+    requested = request.GET.get("fields")
+    if not requested:
+        return available
+    names = [name.strip() for name in requested.split(",") if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise BadRequest(f"Unknown field(s): {', '.join(unknown)}")
+    return {name: available[name] for name in names}
+
+
+def _serialize(obj, fields):
+    return {name: get(obj) for name, get in fields.items()}
+
+
+# -----------------------
+# Filtering and keyset pagination
+# -----------------------
+def _int_param(request, name, default=None):
+    value = request.GET.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise BadRequest(f"'{name}' must be an integer.")
+
+
+def _date_param(request, name, default=None):
+    value = request.GET.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise BadRequest(f"'{name}' must be a date (YYYY-MM-DD).")
+
+
+def _float_param(request, name):
+    try:
+        return float(request.GET[name])
+    except (KeyError, ValueError):
+        raise BadRequest(f"'{name}' is required and must be a number.")
+
+
+def _datetime_param(request, name):
+    return _parse_datetime(request.GET.get(name), name)
+
+
+def _parse_datetime(value, name):
+    if value in (None, ""):
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise BadRequest(f"'{name}' must be an ISO 8601 date and time.")
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+def filter_sites(request, queryset=None):
+    """
+    Applies ?country= (id or code), ?region=, ?location=, ?company= and
+    ?group= to a Site queryset.
+    """
+    queryset = Site.objects.all() if queryset is None else queryset
+    country = request.GET.get("country")
+    if country:
+        if country.isdigit():
+            queryset = queryset.filter(location__region__country_id=int(country))
+        else:
+            queryset = queryset.filter(location__region__country__code__iexact=country)
+    for param, lookup in (
+        ("region", "location__region_id"),
+        ("location", "location_id"),
+        ("company", "company_id"),
+        ("group", "company__group_id"),
+    ):
+        value = _int_param(request, param)
+        if value is not None:
+            queryset = queryset.filter(**{lookup: value})
+    return queryset
+
+
+def _page(request, queryset):
+    """
+    Keyset pagination on the primary key: ?after=<last id>&limit=<n>.
+    Returns (objects, next_url).
+    """
+    limit = _int_param(request, "limit", DEFAULT_PAGE_SIZE)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise BadRequest(f"'limit' must be between 1 and {MAX_PAGE_SIZE}.")
+    after = _int_param(request, "after")
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+    objects = list(queryset.order_by("pk")[:limit + 1])
+    next_url = None
+    if len(objects) > limit:
+        objects = objects[:limit]
+        params = request.GET.copy()
+        params["after"] = objects[-1].pk
+        next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+    return objects, next_url
+
+
+# -----------------------
+# Conditional GET
+# -----------------------
+def _site_state(request, *args, pk=None, **kwargs):
+    """
+    (last modified, count) of the sites a request covers, in one query
+    shared by the ETag and Last-Modified checks.
+    """
+    state = getattr(request, "_site_state", None)
+    if state is None:
+        try:
+            queryset = filter_sites(request) if pk is None else Site.objects.filter(pk=pk)
+        except BadRequest:
+            return None, None
+        aggregate = queryset.aggregate(last_modified=Max("updated_at"), count=Count("pk"))
+        state = request._site_state = (aggregate["last_modified"], aggregate["count"])
+    return state
+
+
+def _etag(*parts):
+    return hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=16).hexdigest()
+
+
+def sites_etag(request, *args, **kwargs):
+    last_modified, count = _site_state(request, *args, **kwargs)
+    if last_modified is None:
+        return None
+    return _etag(request.get_full_path(), last_modified.isoformat(), count)
+
+
+def sites_last_modified(request, *args, **kwargs):
+    return _site_state(request, *args, **kwargs)[0]
+
+
+def hours_etag(request, *args, **kwargs):
+    """
+    Resolved hours also depend on the dates (today by default) and on public
+    holidays, which carry no timestamp.
+    """
+    etag = sites_etag(request, *args, **kwargs)
+    if etag is None:
+        return None
+    try:
+        start, end = _date_range(request)
+    except BadRequest:
+        return None
+    return _etag(etag, start, end, holiday_index.fingerprint())
+
+
+def companies_etag(request, *args, **kwargs):
+    """
+    Company and group saves bump their updated_at; the counts cover deletes
+    (a deleted group's companies lose it without being saved).
+    """
+    companies = Company.objects.aggregate(count=Count("pk"), last_modified=Max("updated_at"))
+    groups = Group.objects.aggregate(count=Count("pk"), last_modified=Max("updated_at"))
+    return _etag(
+        request.get_full_path(), companies["count"], companies["last_modified"], groups["count"], groups["last_modified"],
+    )
+
+
+# -----------------------
+# Views
+# -----------------------
+def _site_queryset():
+    return Site.objects.select_related("company", "location__region")
+
+
+def _resolved_hours(site_ids, start, end):
+    resolved = cached_resolved_hours(site_ids, start, end)
+    days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+    results = []
+    for site_id in site_ids:
+        hours = {}
+        for day in days:
+            open_time, close_time = resolved.get((site_id, day), (None, None))
+            hours[day.isoformat()] = (
+                {"open": _format_time(open_time), "close": _format_time(close_time)}
+                if open_time and close_time else None
+            )
+        results.append({"id": site_id, "hours": hours})
+    return results
+
+
+def _cached_response(request, name, scopes, build, parts=()):
+    """
+    The JSON response of build(), cached as encoded bytes per URL (and
+    parts) until one of scopes is bumped; see services/caching.py.
+    BadRequest from build is raised, not cached.
+    """
+    content = get_or_compute(
+        name, (request.build_absolute_uri(), *parts), scopes, lambda: JsonResponse(build()).content,
+    )
+    return HttpResponse(content, content_type="application/json")
+
+
+def _date_range(request):
+    day = _date_param(request, "date")
+    start = _date_param(request, "start", day or timezone.localdate())
+    end = _date_param(request, "end", day or start)
+    if end < start:
+        raise BadRequest("'end' must not be before 'start'.")
+    if (end - start).days >= MAX_HOURS_DAYS:
+        raise BadRequest(f"At most {MAX_HOURS_DAYS} days per request.")
+    return start, end
+
+
+@require_GET
+@condition(etag_func=sites_etag, last_modified_func=sites_last_modified)
+def site_list(request):
+    """
+    GET /api/sites/?country=DE&region=1&company=2&group=3&fields=id,name&after=100&limit=50
+    """
+    def build():
+        fields = _fields(request, SITE_FIELDS)
+        sites, next_url = _page(request, filter_sites(request, _site_queryset()))
+        return {"results": [_serialize(s, fields) for s in sites], "next": next_url}
+
+    try:
+        return _cached_response(request, "site-list", [CATALOGUE], build)
+    except BadRequest as e:
+        return _error(str(e))
+
+
+@require_GET
+@condition(etag_func=sites_etag, last_modified_func=sites_last_modified)
+def site_detail(request, pk):
+    scopes = site_scopes([pk]).get(pk)
+    if scopes is None:
+        return _error("No such site.", status=404)
+
+    def build():
+        fields = _fields(request, SITE_FIELDS)
+        return _serialize(_site_queryset().get(pk=pk), fields)
+
+    try:
+        return _cached_response(request, "site-detail", scopes, build)
+    except BadRequest as e:
+        return _error(str(e))
+
+
+@require_GET
+@condition(etag_func=hours_etag)
+def hours_list(request):
+    """
+    GET /api/hours/?date=2025-11-17 or ?start=...&end=..., with the site
+    filters and pagination of site_list.
+    """
+    def build():
+        sites, next_url = _page(request, filter_sites(request))
+        return {"results": _resolved_hours([site.pk for site in sites], start, end), "next": next_url}
+
+    try:
+        start, end = _date_range(request)
+        return _cached_response(request, "hours-list", [CATALOGUE], build, parts=(start, end))
+    except BadRequest as e:
+        return _error(str(e))
+
+
+@require_GET
+@condition(etag_func=hours_etag)
+def site_hours(request, pk):
+    try:
+        start, end = _date_range(request)
+    except BadRequest as e:
+        return _error(str(e))
+    scopes = site_scopes([pk]).get(pk)
+    if scopes is None:
+        return _error("No such site.", status=404)
+    return _cached_response(
+        request, "site-hours", scopes, lambda: _resolved_hours([pk], start, end)[0], parts=(start, end),
+    )
+
+
+@require_GET
+@condition(etag_func=companies_etag)
+def company_list(request):
+    """
+    GET /api/companies/?group=3&fields=id,name&after=100&limit=50
+    """
+    def build():
+        fields = _fields(request, COMPANY_FIELDS)
+        companies = Company.objects.select_related("group")
+        group = _int_param(request, "group")
+        if group is not None:
+            companies = companies.filter(group_id=group)
+        companies, next_url = _page(request, companies)
+        return {"results": [_serialize(c, fields) for c in companies], "next": next_url}
+
+    try:
+        return _cached_response(request, "company-list", [CATALOGUE], build)
+    except BadRequest as e:
+        return _error(str(e))
+
+
+@require_GET
+def site_nearest(request):
+    """
+    GET /api/sites/nearest/?lat=51.05&lon=13.74&k=5&at=2025-11-18T14:00
+    with optional region, location, company and group ids. Each result
+    carries its distance_km.
+    """
+    try:
+        fields = _fields(request, SITE_FIELDS)
+        lat, lon = _float_param(request, "lat"), _float_param(request, "lon")
+        k = _int_param(request, "k", 5)
+        if not 1 <= k <= MAX_NEAREST:
+            raise BadRequest(f"'k' must be between 1 and {MAX_NEAREST}.")
+        filters = {name: _int_param(request, name) for name in ("country", "region", "location", "company", "group")}
+        nearest = nearest_sites(lat, lon, k=k, at=_datetime_param(request, "at"), **filters)
+    except BadRequest as e:
+        return _error(str(e))
+    return JsonResponse({
+        "results": [dict(_serialize(site, fields), distance_km=round(km, 3)) for site, km in nearest],
+    })
+
+
+@require_GET
+def site_search(request):
+    """
+    GET /api/search/?q=roemerstr&type=site,company&limit=20
+
+    Ranked, typo-tolerant matches over site, company, location and group
+    names (and site addresses and zip codes); type defaults to all kinds.
+    """
+    try:
+        query = request.GET.get("q", "").strip()
+        if not query:
+            raise BadRequest("'q' is required.")
+        kinds = [kind.strip() for kind in request.GET.get("type", "").split(",") if kind.strip()] or KINDS
+        unknown = [kind for kind in kinds if kind not in KINDS]
+        if unknown:
+            raise BadRequest(f"Unknown type(s): {', '.join(unknown)}")
+        limit = _int_param(request, "limit", 20)
+        if not 1 <= limit <= MAX_SEARCH_RESULTS:
+            raise BadRequest(f"'limit' must be between 1 and {MAX_SEARCH_RESULTS}.")
+    except BadRequest as e:
+        return _error(str(e))
+    return JsonResponse({
+        "results": [
+            {"type": result.kind, "id": result.pk, "label": result.label, "score": result.score}
+            for result in search(query, kinds=kinds, limit=limit)
+        ],
+    })
+
+
+def _export_payload(export_format):
+    out = io.StringIO()
+    if export_format == "compact":
+        write_compact(compact_export(), out)
+    else:
+        write_json(iter_records(), out, indent=None)
+    return out.getvalue().encode("utf-8")
+
+
+@require_GET
+def site_export(request):
+    """
+    GET /api/export/?format=json (the records of data/sites_data.json,
+    default) or ?format=compact; cached until any site data changes.
+    """
+    export_format = request.GET.get("format", "json")
+    if export_format not in ("json", "compact"):
+        return _error("'format' must be json or compact.")
+    content = get_or_compute("export", export_format, [CATALOGUE], lambda: _export_payload(export_format))
+    return HttpResponse(content, content_type="application/json")
+
+
+# -----------------------
+# Async views (ASGI): status lookups and the change stream
+# -----------------------
+def _changes_payload(changes):
+    """
+    [{"id", "updated_at"}, ...] with each site once, at its latest change.
+    """
+    latest = {site_id: updated_at for updated_at, site_id in changes}
+    return [{"id": site_id, "updated_at": updated_at.isoformat()} for site_id, updated_at in latest.items()]
+
+
+async def site_status(request, pk):
+    """
+    GET /api/sites/<pk>/status/?at=2025-11-18T14:00
+
+    Whether the site is open now (or at at) by its own clock, counting the
+    previous day's hours that run past midnight, with that local day's hours. Served from the materialized day schedules with the
+    async ORM; no worker thread is held while waiting on the database.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    try:
+        at = _datetime_param(request, "at")
+    except BadRequest as e:
+        return _error(str(e))
+    site = await Site.objects.select_related("location__region__country").filter(pk=pk).afirst()
+    if site is None:
+        return _error("No such site.", status=404)
+    region = site.location.region
+    now = local_now(zone_name(region.time_zone, region.country.time_zone), at)
+    open_time, close_time = await day_schedule.ahours_on(site, now.date())
+    previous = await day_schedule.ahours_on(site, now.date() - timedelta(days=1))
+    return JsonResponse({
+        "id": site.pk,
+        "date": now.date().isoformat(),
+        "open": _format_time(open_time),
+        "close": _format_time(close_time),
+        "is_open": is_open_within(open_time, close_time, now.time(), previous),
+        "updated_at": site.updated_at.isoformat(),
+    })
+
+
+async def site_changes(request):
+    """
+    GET /api/changes/?since=<cursor>&timeout=25
+
+    Long poll: answers as soon as sites changed after since (default: now),
+    or after timeout seconds with no changes. Pass the returned cursor as
+    the next since. Waiting clients share one poller (services/change_feed.py).
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    try:
+        since = _datetime_param(request, "since")
+        timeout = _int_param(request, "timeout", DEFAULT_POLL_SECONDS)
+        if not 0 <= timeout <= MAX_POLL_SECONDS:
+            raise BadRequest(f"'timeout' must be between 0 and {MAX_POLL_SECONDS}.")
+    except BadRequest as e:
+        return _error(str(e))
+    changes, cursor = await change_feed.wait(since, timeout)
+    return JsonResponse({"changes": _changes_payload(changes), "cursor": cursor.isoformat()})
+
+
+async def site_change_stream(request):
+    """
+    GET /api/changes/stream/?since=<cursor>
+
+    The changes of site_changes as server-sent events ("changes" events
+    whose id is the cursor, so EventSource resumes via Last-Event-ID), with
+    a comment line every HEARTBEAT_SECONDS to keep idle connections open.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    try:
+        since = _parse_datetime(request.headers.get("Last-Event-ID") or request.GET.get("since"), "since")
+    except BadRequest as e:
+        return _error(str(e))
+
+    async def events():
+        cursor = since
+        yield "retry: 3000\n\n"
+        while True:
+            changes, cursor = await change_feed.wait(cursor, HEARTBEAT_SECONDS)
+            if changes:
+                yield f"id: {cursor.isoformat()}\nevent: changes\ndata: {json.dumps(_changes_payload(changes))}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # no proxy buffering
+    return response